@@ -2,9 +2,17 @@ from agents import Agent, Runner, OpenAIChatCompletionsModel, AsyncOpenAI, trace
 import agents
 from agents.mcp import MCPServer, MCPServerStreamableHttp
 from agents.items import TResponseInputItem, TResponseOutputItem
+from agents.result import RunResult
 from dotenv import load_dotenv
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Iterable, Optional
+import argparse
 import asyncio
+import json
 import os
+import statistics
+import sys
+import time
 
 # set_tracing_disabled(True)
 
@@ -18,9 +26,13 @@ if not gemini_api_key:
 if not mcp_server_url:
     raise ValueError("MCP_SERVER_URL is not set")
 
+# Any OpenAI-compatible endpoint, e.g. the stub in benchmarks/stub_model.py for load tests
+model_base_url = os.getenv("MODEL_BASE_URL", "https://generativelanguage.googleapis.com/v1beta/openai/")
+model_name = os.getenv("MODEL_NAME", "gemini-2.5-flash")
+
 client = AsyncOpenAI(
     api_key=gemini_api_key,
-    base_url="https://generativelanguage.googleapis.com/v1beta/openai/",
+    base_url=model_base_url,
 )
 
 
@@ -33,20 +45,73 @@ session: SQLiteSession = SQLiteSession("session_1")
 # session = SQLiteSession("session_1", "conversations.db")
 
 
-async def run_agent(mcp_server: MCPServer, instructions: str, session: SQLiteSession | None = None):
+def connect_mcp_server(session_timeout: Optional[float] = None) -> MCPServerStreamableHttp:
+    """session_timeout overrides the SDK's per-request timeout; the load driver raises it for tool calls under load."""
+    options = {} if session_timeout is None else {"client_session_timeout_seconds": session_timeout}
+    return MCPServerStreamableHttp(
+        name="StudyMode StreamableHttp Server",
+        params={"url":f"{mcp_server_url}"},
+        cache_tools_list=True,
+        **options
+        )
+
+
+async def get_instructions(mcp_server: MCPServer) -> str:
+    prompt_result = await mcp_server.get_prompt("prompt-v1")
+    # Extract the actual prompt text from the GetPromptResult object
+    if prompt_result.messages and len(prompt_result.messages) > 0:
+        # Get the first message's content
+        first_message = prompt_result.messages[0]
+        if hasattr(first_message.content, 'text'):
+            return first_message.content.text
+        elif isinstance(first_message.content, str):
+            return first_message.content
+        else:
+            return str(first_message.content)
+    return "No prompt text found"
+
+
+async def run_agent(
+    mcp_server: MCPServer,
+    instructions: str,
+    session: SQLiteSession | None = None,
+    messages: Iterable[str] | None = None,
+    on_turn: Callable[[str, Optional[RunResult], float, Optional[Exception]], None] | None = None,
+):
+    """
+    Chat with the agent, interactively from stdin or through scripted messages.
+
+    With messages, each one is sent in order without printing or tracing, and
+    on_turn(message, result, seconds, error) is called after every turn; a
+    failed turn is reported with result None and the conversation goes on.
+    """
     agent = Agent(
-            name="Assistant", 
+            name="Assistant",
             instructions=instructions,
             model=OpenAIChatCompletionsModel(
-                model="gemini-2.5-flash",
+                model=model_name,
                 openai_client=client,
             ),
             mcp_servers=[mcp_server]
         )
+
+    if messages is not None:
+        for message in messages:
+            start = time.perf_counter()
+            try:
+                result = await Runner.run(agent, message, session=session)
+            except Exception as e:
+                if on_turn:
+                    on_turn(message, None, time.perf_counter() - start, e)
+                continue
+            if on_turn:
+                on_turn(message, result, time.perf_counter() - start, None)
+        return
+
     trace_id = gen_trace_id()
     print(f"\nView trace: https://platform.openai.com/traces/trace?trace_id={trace_id}\n")
-    
-    with trace("StudyMode Clone Workflow", trace_id=trace_id): 
+
+    with trace("StudyMode Clone Workflow", trace_id=trace_id):
         result = await Runner.run(agent, "Hello", session= session)
         print(f"[AGENT]: {result.final_output}\n\n")
 
@@ -56,40 +121,207 @@ async def run_agent(mcp_server: MCPServer, instructions: str, session: SQLiteSes
                 break
             result = await Runner.run(agent, user_input,session= session)
             print(f"\n\n[AGENT]: {result.final_output}")
-            
+
             # print(f"\n\n[HISTORY]: {result.to_input_list()}")
-        
 
 
 
+# --- Headless driver: replay scripted conversations concurrently for load tests ---
+
+@dataclass
+class TurnStats:
+    conversation: str
+    turn: int
+    seconds: float
+    tool_calls: dict[str, int] = field(default_factory=dict)
+    model_requests: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    error: Optional[str] = None
+
+
+def load_conversations(path: str) -> list[dict]:
+    """
+    Read scripted conversations, one JSON object per line:
+
+        {"id": "photosynthesis", "turns": ["Hello", "What is chlorophyll?"]}
+    """
+    conversations = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            conversation = json.loads(line)
+            if not conversation.get("turns"):
+                raise ValueError(f"{path}:{number}: conversation has no turns")
+            conversation.setdefault("id", f"conversation-{number}")
+            conversations.append(conversation)
+    return conversations
+
+
+def turn_stats(conversation: str, turn: int, result: Optional[RunResult], seconds: float,
+               error: Optional[Exception]) -> TurnStats:
+    stats = TurnStats(conversation, turn, seconds)
+    if error is not None:
+        stats.error = f"{type(error).__name__}: {error}"
+        return stats
+    for item in result.new_items:
+        if item.type == "tool_call_item":
+            name = getattr(item.raw_item, "name", "unknown")
+            stats.tool_calls[name] = stats.tool_calls.get(name, 0) + 1
+    usage = result.context_wrapper.usage
+    stats.model_requests = usage.requests
+    stats.input_tokens = usage.input_tokens
+    stats.output_tokens = usage.output_tokens
+    return stats
+
+
+async def drive_conversations(conversations: list[dict], concurrency: int, repeat: int = 1) -> list[TurnStats]:
+    """
+    Run every conversation repeat times, up to concurrency at once.
+
+    Each run gets its own MCP connection and in-memory session, like a chat
+    in the chainlit app; a run that cannot connect counts every turn as failed.
+    """
+    async with connect_mcp_server() as mcp_server:
+        instructions = await get_instructions(mcp_server)
+
+    limit = asyncio.Semaphore(concurrency)
+    stats: list[TurnStats] = []
+
+    async def converse(run: int, conversation: dict):
+        name = f"{conversation['id']}#{run}"
+        turn = 0
+
+        def record(message, result, seconds, error):
+            nonlocal turn
+            turn += 1
+            stats.append(turn_stats(name, turn, result, seconds, error))
+
+        async with limit:
+            try:
+                async with connect_mcp_server(session_timeout=30) as mcp_server:
+                    await run_agent(mcp_server, instructions, SQLiteSession(name),
+                                    messages=conversation["turns"], on_turn=record)
+            except Exception as e:
+                # failed to connect or disconnect: count the turns that never ran
+                for _ in conversation["turns"][turn:]:
+                    record(None, None, 0.0, e)
+
+    await asyncio.gather(*(
+        converse(run, conversation)
+        for run in range(repeat)
+        for conversation in conversations
+    ))
+    return stats
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def summarize(stats: list[TurnStats], elapsed: float) -> dict:
+    """Aggregate per-turn latency, tool calls, tokens and errors."""
+    ok = [turn for turn in stats if turn.error is None]
+    latencies = [turn.seconds * 1000 for turn in ok]
+    by_tool: dict[str, int] = {}
+    for turn in ok:
+        for name, count in turn.tool_calls.items():
+            by_tool[name] = by_tool.get(name, 0) + count
+    by_turn: dict[int, list[float]] = {}
+    for turn in ok:
+        by_turn.setdefault(turn.turn, []).append(turn.seconds * 1000)
+    errors: dict[str, int] = {}
+    for turn in stats:
+        if turn.error:
+            errors[turn.error] = errors.get(turn.error, 0) + 1
+
+    return {
+        "conversations": len({turn.conversation for turn in stats}),
+        "turns": len(stats),
+        "failed_turns": len(stats) - len(ok),
+        "error_rate": round((len(stats) - len(ok)) / len(stats), 4) if stats else 0.0,
+        "elapsed_seconds": round(elapsed, 2),
+        "turns_per_second": round(len(stats) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(statistics.median(latencies), 1),
+            "p95": round(_percentile(latencies, 95), 1),
+            "p99": round(_percentile(latencies, 99), 1),
+            "max": round(max(latencies), 1),
+        } if latencies else None,
+        "latency_p50_ms_by_turn": {str(n): round(statistics.median(v), 1) for n, v in sorted(by_turn.items())},
+        "tool_calls": {
+            "total": sum(by_tool.values()),
+            "per_turn": round(sum(by_tool.values()) / len(ok), 2) if ok else 0.0,
+            "by_tool": by_tool,
+        },
+        "model_requests": sum(turn.model_requests for turn in ok),
+        "tokens": {
+            "input": sum(turn.input_tokens for turn in ok),
+            "output": sum(turn.output_tokens for turn in ok),
+            "input_per_turn": round(statistics.mean(turn.input_tokens for turn in ok), 1) if ok else 0.0,
+            "output_per_turn": round(statistics.mean(turn.output_tokens for turn in ok), 1) if ok else 0.0,
+        },
+        "errors": dict(sorted(errors.items(), key=lambda item: -item[1])[:5]),
+    }
+
+
+async def drive(args: argparse.Namespace) -> int:
+    # hundreds of runs would each export a trace to the OpenAI platform
+    set_tracing_disabled(True)
+    conversations = load_conversations(args.script)
+    start = time.perf_counter()
+    stats = await drive_conversations(conversations, args.concurrency, args.repeat)
+    report = {
+        "model": model_name,
+        "model_base_url": model_base_url,
+        "mcp_server_url": mcp_server_url,
+        "concurrency": args.concurrency,
+        **summarize(stats, time.perf_counter() - start),
+    }
+    if args.turns_output:
+        with open(args.turns_output, "w", encoding="utf-8") as f:
+            for turn in stats:
+                f.write(json.dumps(asdict(turn)) + "\n")
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+        print(f"[INFO] Wrote results to {args.output}")
+    else:
+        print(output)
+
+    if report["error_rate"] > args.max_error_rate:
+        print(f"[ERROR] Error rate {report['error_rate']:.2%} is above {args.max_error_rate:.2%}", file=sys.stderr)
+        return 1
+    return 0
+
+
 async def main():
-    async with MCPServerStreamableHttp(
-        name="StudyMode StreamableHttp Server", 
-        params={"url":f"{mcp_server_url}"},
-        cache_tools_list=True
-        ) as mcp_server:
-        
-        prompt_result = await mcp_server.get_prompt("prompt-v1")
-        # Extract the actual prompt text from the GetPromptResult object
-        if prompt_result.messages and len(prompt_result.messages) > 0:
-            # Get the first message's content
-            first_message = prompt_result.messages[0]
-            if hasattr(first_message.content, 'text'):
-                instruction_text = first_message.content.text
-            elif isinstance(first_message.content, str):
-                instruction_text = first_message.content
-            else:
-                instruction_text = str(first_message.content)
-        else:
-            instruction_text = "No prompt text found"
-        
+    async with connect_mcp_server() as mcp_server:
+        instruction_text = await get_instructions(mcp_server)
+
         # print(instruction_text)
         await run_agent(mcp_server, instructions=instruction_text, session=session)
-        
-        
-        
+
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="StudyMode agent: interactive chat, or a headless load driver with --script")
+    parser.add_argument("--script", help="JSONL file of scripted conversations to replay instead of chatting")
+    parser.add_argument("--concurrency", type=int, default=50, help="Conversations running at once")
+    parser.add_argument("--repeat", type=int, default=1, help="Times each scripted conversation is run")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    parser.add_argument("--turns-output", help="Also write one JSON line per turn to this file")
+    parser.add_argument("--max-error-rate", type=float, default=1.0,
+                        help="Exit non-zero if the share of failed turns is above this (for CI)")
+    args = parser.parse_args()
+
+    if args.script:
+        sys.exit(asyncio.run(drive(args)))
     asyncio.run(main())
-        
-    
-        
\ No newline at end of file
+
+
+
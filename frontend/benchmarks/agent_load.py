@@ -0,0 +1,155 @@
+"""
+Load test of the agent stack with scripted tutoring conversations.
+
+Starts the stub model (benchmarks.stub_model) and the real MCP server on a
+synthetic store (mcp-server's benchmarks.serving_app, with the offline hash
+embeddings), then replays conversations.jsonl through agent.py's headless
+driver: every conversation runs --repeat times, --concurrency at once, each
+with its own MCP connection and session. Needs no API key or network.
+
+Reports per-turn latency, tool calls, tokens and errors. Exits non-zero if
+the error rate or p95 turn latency is above its limit, or if the agent made
+a different number of tool calls than the stub model asked for:
+
+    uv run python -m benchmarks.agent_load --repeat 40 --concurrency 100
+
+Point --mcp-url at a running server to load it instead of a local one, and
+use --mcp-python for an interpreter with the MCP server's dependencies.
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.stub_model import QUESTION, StubModelServer
+
+
+FRONTEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MCP_SERVER_DIR = os.path.join(os.path.dirname(FRONTEND_DIR), "mcp-server")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(base_url: str, process: subprocess.Popen, timeout: float = 120.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"MCP server exited with code {process.returncode}")
+        try:
+            if httpx.get(f"{base_url}/ready", timeout=2.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"{base_url} did not become ready")
+
+
+def start_mcp_server(args: argparse.Namespace, workdir: str) -> tuple[str, subprocess.Popen]:
+    port = free_port()
+    process = subprocess.Popen(
+        [args.mcp_python, "-m", "benchmarks.serving_app", "--port", str(port), "--workers", str(args.mcp_workers),
+         "--persist-dir", os.path.join(workdir, "vector_store"), "--documents", str(args.documents)],
+        cwd=MCP_SERVER_DIR,
+        env={**os.environ, "GEMINI_API_KEY": "offline-benchmark"},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_ready(base_url, process)
+    except Exception:
+        process.terminate()
+        raise
+    return f"{base_url}/mcp", process
+
+
+def expected_tool_calls(script: str, repeat: int) -> int:
+    """Tool calls the stub model requests: one per question turn."""
+    with open(script, encoding="utf-8") as f:
+        turns = [turn for line in f if line.strip() for turn in json.loads(line)["turns"]]
+    return repeat * sum(1 for turn in turns if QUESTION.search(turn.strip()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--script", default=os.path.join(FRONTEND_DIR, "benchmarks", "conversations.jsonl"))
+    parser.add_argument("--repeat", type=int, default=40, help="Runs of each scripted conversation")
+    parser.add_argument("--concurrency", type=int, default=100, help="Conversations running at once")
+    parser.add_argument("--overhead-ms", type=float, default=150.0, help="Stub model latency per request")
+    parser.add_argument("--per-token-ms", type=float, default=2.0, help="Stub model latency per output token")
+    parser.add_argument("--model-error-rate", type=float, default=0.0, help="Share of stub model requests that fail")
+    parser.add_argument("--documents", type=int, default=200, help="Synthetic corpus size for the local MCP server")
+    parser.add_argument("--mcp-workers", type=int, default=1)
+    parser.add_argument("--mcp-url", help="Use a running MCP server instead of starting one")
+    parser.add_argument("--mcp-python", default=sys.executable, help="Interpreter for the local MCP server")
+    parser.add_argument("--max-error-rate", type=float, default=0.0)
+    # loose enough for the whole stack on one CPU; tighten it for a known CI machine
+    parser.add_argument("--p95-budget-ms", type=float, default=20000.0)
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="studymode-agent-load-") as workdir, \
+            StubModelServer(args.overhead_ms, args.per_token_ms, args.model_error_rate) as stub:
+        mcp_url, mcp_process = (args.mcp_url, None) if args.mcp_url else start_mcp_server(args, workdir)
+        try:
+            driver = subprocess.run(
+                [sys.executable, "agent.py", "--script", args.script, "--repeat", str(args.repeat),
+                 "--concurrency", str(args.concurrency), "--output", os.path.join(workdir, "report.json")],
+                cwd=FRONTEND_DIR,
+                env={**os.environ, "GEMINI_API_KEY": "offline-benchmark", "MCP_SERVER_URL": mcp_url,
+                     "MODEL_BASE_URL": stub.base_url, "MODEL_NAME": "stub"},
+                capture_output=True,
+                text=True,
+            )
+            if driver.returncode != 0 or not os.path.exists(os.path.join(workdir, "report.json")):
+                print(driver.stderr[-4000:], file=sys.stderr)
+                print("[ERROR] The conversation driver failed", file=sys.stderr)
+                sys.exit(1)
+            with open(os.path.join(workdir, "report.json"), encoding="utf-8") as f:
+                result = json.load(f)
+        finally:
+            if mcp_process is not None:
+                mcp_process.terminate()
+                mcp_process.wait(timeout=60)
+
+    expected = expected_tool_calls(args.script, args.repeat)
+    checks = {
+        "error_rate": result["error_rate"] <= args.max_error_rate,
+        "p95_latency": result["latency_ms"] is not None and result["latency_ms"]["p95"] <= args.p95_budget_ms,
+    }
+    if args.model_error_rate == 0:
+        # failed turns drop their tool calls, so only compare on a clean run
+        checks["tool_calls"] = result["tool_calls"]["total"] == expected
+    report = {
+        "benchmark": "agent_load",
+        "params": {key: value for key, value in vars(args).items() if key != "mcp_python"},
+        "stub_model_requests": stub.requests,
+        "expected_tool_calls": expected,
+        "result": result,
+        "checks": checks,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+        print(f"[INFO] Wrote results to {args.output}")
+    else:
+        print(output)
+    if not all(checks.values()):
+        print("[ERROR] Agent load expectations not met", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+"""
+Peak memory of ingesting large uploads: streaming vs whole-file.
+
+Generates synthetic text files of the given sizes and ingests each one in a
+fresh subprocess, either through streaming_ingest.ingest_uploads or the way
+uploads used to work: read the file whole, split it in memory and embed and
+upsert every chunk at once. Each run reports the subprocess's peak RSS.
+
+The markdown modes do the same for Markdown files of the same sizes:
+chunk_markdown_file in a worker process, as uploads do, against
+MarkdownChunker.split over the whole text. markdown_no_headings ingests a
+Markdown file without a single heading, i.e. one section as long as the
+file. Their peak RSS includes the worker's.
+
+Embeddings are a cheap offline hash, and by default chunks go to a sink that
+discards them, so the numbers measure the ingest pipeline itself. Pass
+--chroma to write a real snapshot store, whose in-memory index grows with
+the corpus either way.
+
+It also ingests a batch with one non-UTF-8 file, which must be skipped
+while the other files are still published.
+
+Exits non-zero if a streaming or markdown peak grows by more than
+--max-growth-mb between the smallest and largest file, or the bad file is
+not isolated:
+
+    uv run python -m benchmarks.ingest_memory --sizes 10,50,200
+"""
+import argparse
+import functools
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+
+WORDS = (
+    "photosynthesis chlorophyll energy light plant cell membrane protein enzyme "
+    "reaction glucose oxygen carbon dioxide water root leaf stem mitochondria "
+    "nucleus gene evolution species ecosystem population nutrient cycle"
+).split()
+
+
+class HashEmbeddings:
+    """Tiny deterministic embeddings, so the benchmark measures ingestion, not a model."""
+
+    def __init__(self, dimensions: int = 64):
+        self.dimensions = dimensions
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for text in texts:
+            digest = hashlib.blake2b(text.encode(), digest_size=self.dimensions).digest()
+            vectors.append([byte / 255 for byte in digest])
+        return vectors
+
+
+class NullCollection:
+    """Accepts upserts and updates and keeps only a count."""
+
+    def __init__(self):
+        self.chunks = 0
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.chunks += len(ids)
+
+    def update(self, ids, metadatas):
+        pass
+
+    def count(self) -> int:
+        return self.chunks
+
+
+class NullStore:
+    def __init__(self):
+        self._collection = NullCollection()
+
+
+def write_corpus(path: str, megabytes: int, seed: int = 0, markdown: bool = False, headings: bool = True):
+    """
+    Write paragraphs of random words until the file reaches the given size.
+
+    With markdown, some are code blocks, and unless headings is False every
+    few paragraphs start a new section or subsection.
+    """
+    rng = random.Random(seed)
+    target = megabytes * 1024 * 1024
+    written = 0
+    with open(path, "w", encoding="utf-8") as f:
+        while written < target:
+            sentences = [
+                " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 18))).capitalize() + "."
+                for _ in range(rng.randint(2, 8))
+            ]
+            paragraph = " ".join(sentences) + "\n\n"
+            if markdown and headings and rng.random() < 0.25:
+                paragraph = f"{'#' * rng.randint(1, 3)} {rng.choice(WORDS).capitalize()}\n\n{paragraph}"
+            elif markdown and rng.random() < 0.1:
+                paragraph = "```python\n" + "\n".join(f"{word} = {i}" for i, word in enumerate(sentences)) + "\n```\n\n"
+            f.write(paragraph)
+            written += len(paragraph)
+
+
+def open_store_factory(chroma: bool):
+    if not chroma:
+        return lambda version_dir: NullStore()
+
+    from chromadb.config import Settings
+    from langchain_chroma import Chroma
+
+    return lambda version_dir: Chroma(
+        persist_directory=version_dir,
+        collection_name="study_documents",
+        client_settings=Settings(anonymized_telemetry=False),
+    )
+
+
+def run_streaming(path: str, store_dir: str, chroma: bool) -> int:
+    from snapshots import SnapshotStore
+    from streaming_ingest import Upload, ingest_uploads, read_blocks
+
+    upload = Upload(lambda: read_blocks(path), {"filename": os.path.basename(path), "source": f"uploaded/{path}"})
+    added, _, _ = ingest_uploads(SnapshotStore(store_dir), [upload], HashEmbeddings(), open_store_factory(chroma))
+    return added
+
+
+def run_whole_file(path: str, store_dir: str, chroma: bool) -> int:
+    """The upload path before streaming: one Document, split and embedded in memory."""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    from langchain_core.documents import Document
+    from snapshots import SnapshotStore, close_chroma
+
+    with open(path, encoding="utf-8") as f:
+        document = Document(page_content=f.read(), metadata={"source": f"uploaded/{path}"})
+    chunks = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100, add_start_index=True) \
+        .split_documents([document])
+    texts = [chunk.page_content for chunk in chunks]
+    vectors = HashEmbeddings().embed_documents(texts)
+    with SnapshotStore(store_dir).write() as version_dir:
+        collection = open_store_factory(chroma)(version_dir)._collection
+        for start in range(0, len(texts), 5000):  # Chroma caps the batch size
+            end = start + 5000
+            collection.upsert(ids=[f"c:{i}" for i in range(start, min(end, len(texts)))],
+                              embeddings=vectors[start:end], documents=texts[start:end],
+                              metadatas=[chunk.metadata for chunk in chunks[start:end]])
+        close_chroma(version_dir)
+    return len(texts)
+
+
+def run_markdown(path: str, store_dir: str, chroma: bool) -> int:
+    from markdown_chunker import chunk_markdown_file
+    from snapshots import SnapshotStore
+    from streaming_ingest import Upload, ingest_uploads, read_blocks
+
+    source = f"uploaded/{path}"
+    upload = Upload(lambda: read_blocks(path), {"filename": os.path.basename(path), "source": source},
+                    chunker=functools.partial(chunk_markdown_file, path, source))
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        added, _, _ = ingest_uploads(SnapshotStore(store_dir), [upload], HashEmbeddings(),
+                                     open_store_factory(chroma), pool=pool)
+    return added
+
+
+def run_markdown_whole_file(path: str, store_dir: str, chroma: bool) -> int:
+    """Markdown chunked from the whole text in memory, then embedded at once."""
+    from markdown_chunker import MarkdownChunker
+    from snapshots import SnapshotStore, close_chroma
+
+    with open(path, encoding="utf-8") as f:
+        pieces = MarkdownChunker().split(f.read())
+    texts = [text for text, _, _ in pieces]
+    vectors = HashEmbeddings().embed_documents(texts)
+    with SnapshotStore(store_dir).write() as version_dir:
+        collection = open_store_factory(chroma)(version_dir)._collection
+        for start in range(0, len(texts), 5000):  # Chroma caps the batch size
+            end = start + 5000
+            collection.upsert(ids=[f"c:{i}" for i in range(start, min(end, len(texts)))],
+                              embeddings=vectors[start:end], documents=texts[start:end],
+                              metadatas=[{"start_index": index, **extra} for _, index, extra in pieces[start:end]])
+        close_chroma(version_dir)
+    return len(texts)
+
+
+RUNS = {
+    "streaming": run_streaming,
+    "whole_file": run_whole_file,
+    "markdown": run_markdown,
+    "markdown_whole_file": run_markdown_whole_file,
+    "markdown_no_headings": run_markdown,
+}
+
+# corpus each mode ingests: (file suffix, write_corpus options)
+CORPORA = {
+    "streaming": ("txt", {}),
+    "whole_file": ("txt", {}),
+    "markdown": ("md", {"markdown": True}),
+    "markdown_whole_file": ("md", {"markdown": True}),
+    "markdown_no_headings": ("flat.md", {"markdown": True, "headings": False}),
+}
+
+
+def check_bad_upload(workdir: str) -> dict:
+    """One undecodable file among good ones: only it is skipped, the rest are published."""
+    from snapshots import SnapshotStore
+    from streaming_ingest import Upload, ingest_uploads, read_blocks
+
+    paths = []
+    files = [
+        ("good-1.txt", b"Plants make glucose.\n\n" * 50),
+        ("latin-1.txt", "Caf\xe9 notes\n".encode("latin-1")),
+        ("good-2.txt", b"Cells divide.\n\n" * 50),
+    ]
+    for name, data in files:
+        paths.append(os.path.join(workdir, name))
+        with open(paths[-1], "wb") as f:
+            f.write(data)
+    uploads = [Upload(lambda path=path: read_blocks(path), {"filename": os.path.basename(path), "source": path})
+               for path in paths]
+    snapshots = SnapshotStore(os.path.join(workdir, "bad-upload-store"))
+    added, total, failed = ingest_uploads(snapshots, uploads, HashEmbeddings(), open_store_factory(False))
+    _, nothing, all_failed = ingest_uploads(snapshots, uploads[1:2], HashEmbeddings(), open_store_factory(False))
+    published = snapshots.current()
+    return {
+        "added": added,
+        "failed": [upload.metadata["filename"] for upload, _ in failed],
+        "ok": [upload.metadata["filename"] for upload, _ in failed] == ["latin-1.txt"]
+              and added == total and added > 0
+              and nothing is None and len(all_failed) == 1 and snapshots.current() == published,
+    }
+
+
+def child(args: argparse.Namespace):
+    with tempfile.TemporaryDirectory(prefix="studymode-ingest-store-") as store_dir:
+        baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        chunks = RUNS[args.child](args.file, store_dir, args.chroma)
+        # the markdown worker has exited by now, so it counts as a child
+        peak_kb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                      resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+        print(json.dumps({
+            "chunks": chunks,
+            "seconds": round(time.perf_counter() - start, 2),
+            "peak_rss_mb": round(peak_kb / 1024, 1),
+            "startup_rss_mb": round(baseline_kb / 1024, 1),
+        }))
+
+
+def measure(mode: str, path: str, chroma: bool) -> dict:
+    command = [sys.executable, "-m", "benchmarks.ingest_memory", "--child", mode, "--file", path]
+    if chroma:
+        command.append("--chroma")
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,50", help="Comma separated file sizes in MB")
+    parser.add_argument("--modes", default="streaming,whole_file,markdown,markdown_whole_file,markdown_no_headings")
+    parser.add_argument("--chroma", action="store_true", help="Write a real Chroma snapshot")
+    parser.add_argument("--max-growth-mb", type=float, default=32,
+                        help="Allowed streaming and markdown peak RSS growth from the smallest to the largest file")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    modes = args.modes.split(",")
+    results = []
+    with tempfile.TemporaryDirectory(prefix="studymode-ingest-") as workdir:
+        for size in sizes:
+            for suffix, options in dict(CORPORA[mode] for mode in modes).items():
+                path = os.path.join(workdir, f"textbook-{size}mb.{suffix}")
+                write_corpus(path, size, **options)
+                for mode in modes:
+                    if CORPORA[mode][0] == suffix:
+                        results.append({"size_mb": size, "mode": mode, **measure(mode, path, args.chroma)})
+                os.remove(path)
+        bad_upload = check_bad_upload(workdir)
+
+    growth = {}
+    for mode in ("streaming", "markdown", "markdown_no_headings"):
+        runs = [result for result in results if result["mode"] == mode]
+        if runs:
+            growth[mode] = round(runs[-1]["peak_rss_mb"] - runs[0]["peak_rss_mb"], 1)
+    report = {
+        "benchmark": "ingest_memory",
+        "params": {"sizes_mb": sizes, "chroma": args.chroma},
+        "results": results,
+        "streaming_peak_growth_mb": growth.get("streaming", 0.0),
+        "markdown_peak_growth_mb": growth.get("markdown", 0.0),
+        "markdown_no_headings_peak_growth_mb": growth.get("markdown_no_headings", 0.0),
+        "bad_upload": bad_upload,
+    }
+    print(json.dumps(report, indent=2))
+    for mode, mb in growth.items():
+        if mb > args.max_growth_mb:
+            print(f"[ERROR] {mode} peak RSS grew by {mb:.1f} MB (limit {args.max_growth_mb} MB)",
+                  file=sys.stderr)
+            sys.exit(1)
+    if not bad_upload["ok"]:
+        print("[ERROR] A bad upload was not skipped on its own", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
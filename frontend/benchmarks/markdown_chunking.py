@@ -0,0 +1,246 @@
+"""
+Markdown chunking: markdown_chunker against the loaders it replaces.
+
+Generates a fixture set of textbook-style Markdown files (nested headings,
+code listings, tables, lists) and chunks it three ways:
+
+- unstructured: UnstructuredMarkdownLoader(mode="single", strategy="fast")
+  plus RecursiveCharacterTextSplitter(1000, 100), the upload path before
+  streaming ingestion (skipped if unstructured is not installed);
+- text_splitter: the raw source through the same character splitter, as
+  Markdown was ingested in the meantime;
+- markdown_chunker: serially, and as the upload path runs it: in a process
+  pool of default_workers() processes, or inline when there is one CPU.
+
+Every sentence carries its section's key term and every listing and table
+carries begin/end markers, so for each mode the benchmark reports how many
+chunks a section is spread over (what a question about it has to retrieve),
+how many sections a chunk mixes, and how many listings and tables were cut.
+Some listings and tables are longer than a 1000-character chunk, so the
+character splitter has to cut them. The default 400 chapters make a fixture
+of several MB, like a textbook uploaded chapter by chapter; pool_speedup is
+the serial time over the upload path's time, chunks read back included.
+
+Exits non-zero if markdown_chunker cuts a listing or table, the character
+splitter cuts none (the fixture would not test it), markdown_chunker spreads
+sections over more chunks than the character splitter, or it is slower than
+unstructured:
+
+    uv run --with "unstructured[md]" python -m benchmarks.markdown_chunking --files 400
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+from markdown_chunker import MarkdownChunker, chunk_markdown_file, default_workers
+
+
+WORDS = (
+    "cell membrane protein enzyme reaction glucose oxygen energy light gradient "
+    "transport signal receptor pathway molecule structure function process rate"
+).split()
+TERM = re.compile(r"\bterm\d+x\d+\b")
+MARKER = re.compile(r"\b(listing|table)(\d+x\d+)-(begin|end)\b")
+
+
+def _sentence(rng: random.Random, term: str) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 18))]
+    words.insert(rng.randrange(len(words)), term)
+    return " ".join(words).capitalize() + "."
+
+
+def _paragraph(rng: random.Random, term: str) -> str:
+    return " ".join(_sentence(rng, term) for _ in range(rng.randint(2, 6)))
+
+
+def write_fixture(path: str, doc: int, rng: random.Random) -> int:
+    """
+    One textbook chapter: sections and subsections with prose, lists, listings and tables.
+
+    Returns how many listings and tables are longer than 1000 characters.
+    """
+    long_blocks = 0
+    parts = [f"# Chapter {doc}: {rng.choice(WORDS).title()} {rng.choice(WORDS).title()}\n"]
+    section = 0
+    block = 0
+    for major in range(rng.randint(3, 6)):
+        parts.append(f"## {major + 1}. {rng.choice(WORDS).title()} and {rng.choice(WORDS)}\n")
+        for minor in range(rng.randint(1, 4)):
+            section += 1
+            term = f"term{doc}x{section}"
+            parts.append(f"### {major + 1}.{minor + 1} {rng.choice(WORDS).title()}\n")
+            for _ in range(rng.randint(1, 4)):
+                kind = rng.random()
+                block += 1
+                marker = f"{doc}x{block}"
+                if kind < 0.15:
+                    lines = [f"# listing{marker}-begin {term}"]
+                    lines += [f"{rng.choice(WORDS)}_{i} = compute({rng.choice(WORDS)!r}, {i})"
+                              for i in range(rng.randint(3, 80))]
+                    lines.append(f"# listing{marker}-end")
+                    parts.append("```python\n" + "\n".join(lines) + "\n```\n")
+                    long_blocks += len(parts[-1]) > 1000
+                elif kind < 0.25:
+                    rows = [f"| {rng.choice(WORDS)} | {rng.randint(1, 999)} | {rng.choice(WORDS)} |"
+                            for _ in range(rng.randint(2, 60))]
+                    rows[0] = f"| table{marker}-begin {term} | 0 | start |"
+                    rows.append(f"| table{marker}-end | 0 | end |")
+                    parts.append("| Name | Value | Note |\n|------|------:|------|\n" + "\n".join(rows) + "\n")
+                    long_blocks += len(parts[-1]) > 1000
+                elif kind < 0.35:
+                    parts.append("\n".join(f"- {_sentence(rng, term)}" for _ in range(rng.randint(2, 5))) + "\n")
+                else:
+                    parts.append(_paragraph(rng, term) + "\n")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(parts))
+    return long_blocks
+
+
+def quality(chunks: List[str]) -> Dict[str, float]:
+    """How sections, listings and tables were spread over chunks."""
+    chunks_per_term: Dict[str, int] = {}
+    terms_per_chunk = []
+    ends: Dict[str, Dict[str, set]] = {}
+    for index, chunk in enumerate(chunks):
+        terms = set(TERM.findall(chunk))
+        terms_per_chunk.append(len(terms))
+        for term in terms:
+            chunks_per_term[term] = chunks_per_term.get(term, 0) + 1
+        for kind, marker, end in MARKER.findall(chunk):
+            ends.setdefault(f"{kind}{marker}", {"begin": set(), "end": set()})[end].add(index)
+    cut = sum(1 for found in ends.values() if not found["begin"] & found["end"])
+    return {
+        "chunks": len(chunks),
+        "mean_chunk_chars": round(statistics.mean(len(chunk) for chunk in chunks), 1),
+        "chunks_per_section": round(statistics.mean(chunks_per_term.values()), 2),
+        "sections_per_chunk": round(statistics.mean(terms_per_chunk), 2),
+        "blocks_cut": cut,
+        "blocks": len(ends),
+    }
+
+
+def run_unstructured(paths: List[str]) -> dict:
+    start = time.perf_counter()
+    try:
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+        from langchain_community.document_loaders import UnstructuredMarkdownLoader
+        import unstructured  # noqa: F401 - imported lazily by the loader otherwise
+    except ImportError as e:
+        return {"skipped": f"{e} (install unstructured[md] and langchain-community)"}
+    import_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+    chunks = []
+    try:
+        for path in paths:
+            document = UnstructuredMarkdownLoader(path, mode="single", strategy="fast").load()[0]
+            chunks.extend(chunk.page_content for chunk in splitter.split_documents([document]))
+    except Exception as e:
+        # e.g. its spaCy model cannot be downloaded on first use
+        return {"skipped": f"UnstructuredMarkdownLoader failed: {e}"}
+    return {"import_seconds": round(import_seconds, 3), "seconds": round(time.perf_counter() - start, 3),
+            **quality(chunks)}
+
+
+def run_text_splitter(paths: List[str]) -> dict:
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    start = time.perf_counter()
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+    chunks = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            chunks.extend(splitter.split_text(f.read()))
+    return {"seconds": round(time.perf_counter() - start, 3), **quality(chunks)}
+
+
+def run_markdown_chunker(paths: List[str]) -> dict:
+    start = time.perf_counter()
+    chunker = MarkdownChunker()
+    chunks = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            chunks.extend(text for text, _, _ in chunker.split(f.read()))
+    return {"seconds": round(time.perf_counter() - start, 3), **quality(chunks)}
+
+
+def run_markdown_pool(paths: List[str], workers: int) -> dict:
+    sources = [f"uploaded/{os.path.basename(p)}" for p in paths]
+    if workers == 0:
+        start = time.perf_counter()
+        chunks = [text for path, source in zip(paths, sources) for text, _, _ in chunk_markdown_file(path, source)[1]]
+        return {"seconds": round(time.perf_counter() - start, 3), "workers": 0, **quality(chunks)}
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        # start the workers first, as the app's long-lived pool already has
+        list(pool.map(abs, range(workers)))
+        start = time.perf_counter()
+        results = pool.map(chunk_markdown_file, paths, sources)
+        chunks = [text for _, pieces in results for text, _, _ in pieces]
+        seconds = time.perf_counter() - start
+    return {"seconds": round(seconds, 3), "workers": workers, **quality(chunks)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=400, help="Fixture files to generate")
+    parser.add_argument("--workers", type=int, default=default_workers(),
+                        help="Worker processes for the upload path, 0 for inline (default: as the app)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory(prefix="studymode-markdown-") as workdir:
+        paths = []
+        long_blocks = 0
+        for doc in range(args.files):
+            paths.append(os.path.join(workdir, f"chapter-{doc:03d}.md"))
+            long_blocks += write_fixture(paths[-1], doc, rng)
+        fixture_bytes = sum(os.path.getsize(path) for path in paths)
+
+        modes = {
+            "unstructured": run_unstructured(paths),
+            "text_splitter": run_text_splitter(paths),
+            "markdown_chunker": run_markdown_chunker(paths),
+            "markdown_chunker_pool": run_markdown_pool(paths, args.workers),
+        }
+
+    native = modes["markdown_chunker"]
+    checks = {
+        "no_blocks_cut": native["blocks_cut"] == 0 and modes["markdown_chunker_pool"]["blocks_cut"] == 0,
+        "text_splitter_cuts_long_blocks": modes["text_splitter"]["blocks_cut"] > 0,
+        "fewer_chunks_per_section": native["chunks_per_section"] < modes["text_splitter"]["chunks_per_section"],
+    }
+    if "skipped" not in modes["unstructured"]:
+        checks["faster_than_unstructured"] = native["seconds"] < modes["unstructured"]["seconds"]
+    else:
+        print(f"[WARNING] unstructured baseline skipped: {modes['unstructured']['skipped']}", file=sys.stderr)
+
+    report = {
+        "benchmark": "markdown_chunking",
+        "params": vars(args),
+        "fixture_mb": round(fixture_bytes / 1e6, 2),
+        "long_blocks": long_blocks,
+        "modes": modes,
+        "pool_speedup": round(native["seconds"] / modes["markdown_chunker_pool"]["seconds"], 2),
+        "cpus": os.cpu_count(),
+        "checks": checks,
+    }
+    print(json.dumps(report, indent=2))
+    if not all(checks.values()):
+        print("[ERROR] Markdown chunking expectations not met", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
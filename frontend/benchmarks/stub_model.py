@@ -0,0 +1,185 @@
+"""
+Local stand-in for an OpenAI-compatible chat model.
+
+StubModelServer serves POST /v1/chat/completions on 127.0.0.1 with a
+deterministic tutoring policy, so agent.py can be driven without an API key:
+
+- a question from the user gets a doc_search_tool call with the question as
+  the query (or web_search_tool for "latest"/"news" questions, if allowed);
+- other user messages (greetings, thanks) are answered directly;
+- after a tool result, the answer quotes the start of the tool output.
+
+Latency is a fixed overhead per request plus a cost per completion token,
+and error_rate answers that share of requests with a 500. Token usage is
+estimated at four characters per token. Run it standalone to point the
+chainlit app or agent.py at it:
+
+    uv run python -m benchmarks.stub_model --port 8900
+    MODEL_BASE_URL=http://127.0.0.1:8900/v1/ uv run python agent.py
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+
+QUESTION = re.compile(r"\?|^(what|why|how|when|where|who|which|explain|describe|define|compare|tell me)\b", re.I)
+WEB_QUESTION = re.compile(r"\b(latest|news|recent|today|current)\b", re.I)
+
+
+def _text(content) -> str:
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return ""
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class StubModelServer:
+    """
+    Args:
+        overhead_ms: Fixed latency per request (time to first token)
+        per_token_ms: Extra latency per completion token
+        error_rate: Share of requests answered with HTTP 500
+        allow_web: Let web questions call web_search_tool (needs network on the MCP server)
+    """
+
+    def __init__(self, overhead_ms: float = 150.0, per_token_ms: float = 2.0, error_rate: float = 0.0,
+                 allow_web: bool = False, port: int = 0, seed: int = 0):
+        self.overhead = overhead_ms / 1000
+        self.per_token = per_token_ms / 1000
+        self.error_rate = error_rate
+        self.allow_web = allow_web
+        self.requests = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._httpd.daemon_threads = True
+        self._httpd.request_queue_size = 1024
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1/"
+
+    def __enter__(self) -> "StubModelServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def reply(self, body: dict) -> dict:
+        """The chat.completion for one request body."""
+        messages = body.get("messages", [])
+        tools = {tool["function"]["name"] for tool in body.get("tools", []) if tool.get("type") == "function"}
+        last = messages[-1] if messages else {"role": "user", "content": ""}
+        text = _text(last.get("content")).strip()
+
+        message: dict = {"role": "assistant", "content": None}
+        finish_reason = "stop"
+        if last.get("role") == "tool":
+            excerpt = " ".join(text.split()[:60])
+            message["content"] = f"Here is what the sources say: {excerpt} ... Does that answer your question?"
+        elif QUESTION.search(text) and tools & {"doc_search_tool", "web_search_tool"}:
+            if self.allow_web and WEB_QUESTION.search(text) and "web_search_tool" in tools:
+                name, arguments = "web_search_tool", {"query": text}
+            else:
+                name, arguments = "doc_search_tool", {"query": text}
+            if name not in tools:
+                name = next(iter(sorted(tools & {"doc_search_tool", "web_search_tool"})))
+            message["tool_calls"] = [{
+                "id": f"call_{uuid.uuid4().hex[:12]}",
+                "type": "function",
+                "function": {"name": name, "arguments": json.dumps(arguments)},
+            }]
+            finish_reason = "tool_calls"
+        else:
+            message["content"] = "Hi! I'm your study tutor. What topic would you like to work on?"
+
+        prompt_tokens = _tokens(json.dumps(messages)) + _tokens(json.dumps(body.get("tools", [])))
+        completion_tokens = _tokens(message["content"] or json.dumps(message.get("tool_calls")))
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, payload: dict):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+                    return
+                if body.get("stream"):
+                    self._send(400, {"error": {"message": "The stub model does not stream"}})
+                    return
+                with stub._lock:
+                    stub.requests += 1
+                    failed = stub._rng.random() < stub.error_rate
+                    stub.errors += failed
+                if failed:
+                    time.sleep(stub.overhead)
+                    self._send(500, {"error": {"message": "Injected stub failure", "type": "server_error"}})
+                    return
+                payload = stub.reply(body)
+                time.sleep(stub.overhead + stub.per_token * payload["usage"]["completion_tokens"])
+                self._send(200, payload)
+
+        return Handler
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--overhead-ms", type=float, default=150.0)
+    parser.add_argument("--per-token-ms", type=float, default=2.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--allow-web", action="store_true", help="Call web_search_tool for news-style questions")
+    args = parser.parse_args(argv)
+
+    with StubModelServer(args.overhead_ms, args.per_token_ms, args.error_rate, args.allow_web, port=args.port) as stub:
+        print(f"[INFO] Stub model serving at {stub.base_url}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
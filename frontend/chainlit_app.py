@@ -1,8 +1,12 @@
+import asyncio
 import atexit
+import functools
+import multiprocessing
 import os
 import glob
 import shutil
 import time
+from concurrent.futures import ProcessPoolExecutor
 from typing import cast, List
 from datetime import datetime
 
@@ -10,16 +14,17 @@ from openai import AsyncOpenAI
 from openai.types.responses import ResponseTextDeltaEvent, ResponseFunctionToolCall
 from dotenv import load_dotenv
 from chromadb.config import Settings
-from langchain_community.document_loaders import TextLoader, UnstructuredMarkdownLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_chroma import Chroma
 from langchain.schema import Document
 from pydantic import SecretStr
-import hashlib
 import uuid
 
 import chainlit as cl
+from embedding_broker import EmbeddingBroker
+from markdown_chunker import chunk_markdown_file, default_workers
+from snapshots import SnapshotStore, close_chroma
+from streaming_ingest import Upload, ingest_uploads, read_blocks
 from agents.mcp import MCPServerStreamableHttp
 from agents import Agent, OpenAIChatCompletionsModel, Runner, SQLiteSession, gen_trace_id, trace
 
@@ -38,25 +43,42 @@ client = AsyncOpenAI(
     base_url="https://generativelanguage.googleapis.com/v1beta/openai/",
 )
 
-# Global embeddings instance to reuse
-embeddings = GoogleGenerativeAIEmbeddings(
+# Global embeddings instance to reuse; the broker batches concurrent uploads
+embeddings = EmbeddingBroker.from_env(GoogleGenerativeAIEmbeddings(
     model="models/gemini-embedding-001",
     google_api_key=SecretStr(gemini_api_key)
-)
+))
+
+# Snapshot root shared with the MCP server; every write publishes a new version
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", os.path.join("..", "vector_store"))
+snapshots = SnapshotStore(VECTOR_STORE_DIR)
+
+# Markdown uploads are parsed and chunked in worker processes, off the event loop;
+# with no CPU to spare (MARKDOWN_WORKERS=0) they are chunked in the ingest thread
+MARKDOWN_WORKERS = int(os.getenv("MARKDOWN_WORKERS", str(default_workers())))
+markdown_pool = ProcessPoolExecutor(
+    max_workers=MARKDOWN_WORKERS,
+    mp_context=multiprocessing.get_context("spawn"),
+) if MARKDOWN_WORKERS > 0 else None
+
+def open_snapshot(version_dir: str) -> Chroma:
+    """Open the Chroma collection inside a snapshot version directory."""
+    return Chroma(
+        persist_directory=version_dir,
+        embedding_function=embeddings,
+        collection_name="study_documents",
+        client_settings=Settings(anonymized_telemetry=False)
+    )
 
 def reset_vector_store():
-    """Reset the Chroma vector store collection instead of deleting files."""
-    ds_name = os.path.join("..", "vector_store")
-    print(f"[INFO] Resetting vector store at {ds_name}")
+    """Publish an empty snapshot instead of deleting files under running readers."""
+    print(f"[INFO] Resetting vector store at {VECTOR_STORE_DIR}")
 
     try:
-        vector_store = Chroma(
-            persist_directory=ds_name,
-            embedding_function=embeddings,
-            collection_name="study_documents"
-        )
-        vector_store.reset_collection()   # Clears all documents
-        print(f"[INFO] Successfully reset vector store at {ds_name}")
+        with snapshots.write(copy_current=False) as version_dir:
+            open_snapshot(version_dir)
+            close_chroma(version_dir)
+        print(f"[INFO] Successfully reset vector store at {VECTOR_STORE_DIR}")
     except Exception as e:
         print(f"[WARNING] Could not reset vector store: {e}")
 
@@ -193,56 +215,48 @@ async def main(message: cl.Message):
         print(f"Error: {str(e)}")
 
 async def handle_file_uploads(elements):
-    """Handle multiple file uploads efficiently."""
+    """Handle multiple file uploads efficiently, publishing them as one snapshot."""
     processed_files = []
     failed_files = []
+    uploads = []
     
     for element in elements:
         try:
             if element.mime in ["text/plain"]:
-                # Handle text files
-                loader = TextLoader(element.path, encoding="utf-8")
-                document = loader.load()[0]
-                
-                # Add metadata
-                document.metadata.update({
-                    "filename": element.name,
-                    "file_type": "text",
-                    "upload_date": datetime.now().isoformat(),
-                    "file_size": os.path.getsize(element.path),
-                    "source": f"uploaded/{element.name}"
-                })
-                
-                await add_document_to_vector_store(document)
-                processed_files.append(element.name)
-            
+                file_type = "text"
             elif element.name.endswith('.md') or element.mime == "text/markdown":
-                # Handle Markdown files with UnstructuredMarkdownLoader
-                loader = UnstructuredMarkdownLoader(
-                    element.path,
-                    mode="single",
-                    strategy="fast",
-                )
-                document = loader.load()[0]
-                
-                # Add metadata
-                document.metadata.update({
+                file_type = "markdown"
+            else:
+                failed_files.append(f"{element.name} (unsupported type: {element.mime}). Supported: .txt and .md files only")
+                continue
+
+            source = f"uploaded/{element.name}"
+            # Text files are read in blocks while they are ingested, never loaded whole;
+            # Markdown is chunked by section in the worker pool (see markdown_chunker.py)
+            uploads.append(Upload(
+                open_blocks=lambda path=element.path: read_blocks(path),
+                metadata={
                     "filename": element.name,
-                    "file_type": "markdown",
+                    "file_type": file_type,
                     "upload_date": datetime.now().isoformat(),
                     "file_size": os.path.getsize(element.path),
-                    "source": f"uploaded/{element.name}"
-                })
-                
-                await add_document_to_vector_store(document)
-                processed_files.append(element.name)
-                
-                
-            else:
-                failed_files.append(f"{element.name} (unsupported type: {element.mime}). Supported: .txt and .md files only")
+                    "source": source
+                },
+                chunker=functools.partial(chunk_markdown_file, element.path, source) if file_type == "markdown" else None,
+            ))
+            processed_files.append(element.name)
                 
         except Exception as e:
             failed_files.append(f"{element.name} (error: {str(e)})")
+
+    if uploads:
+        try:
+            for upload, error in await add_uploads_to_vector_store(uploads):
+                processed_files.remove(upload.metadata["filename"])
+                failed_files.append(f"{upload.metadata['filename']} (error: {str(error)})")
+        except Exception as e:
+            failed_files.extend(f"{name} (error: {str(e)})" for name in processed_files)
+            processed_files = []
     
     # Send feedback to user
     if processed_files:
@@ -260,50 +274,31 @@ async def add_document_to_vector_store(document: Document):
     await add_documents_to_vector_store([document])
 
 async def add_documents_to_vector_store(documents: List[Document]):
-    """Add multiple documents to the existing vector store without replacing it."""
+    """Add in-memory documents to the store as a new snapshot without replacing it."""
+    await add_uploads_to_vector_store([
+        Upload(open_blocks=lambda text=document.page_content: [text], metadata=dict(document.metadata))
+        for document in documents
+    ])
+
+async def add_uploads_to_vector_store(uploads: List[Upload]) -> List[tuple[Upload, Exception]]:
+    """
+    Stream uploads into the store as one new snapshot without replacing it.
+
+    Chunking, embedding and upserting run in fixed-size batches in a worker
+    thread (see streaming_ingest.py), under the store's single-writer lock
+    (see snapshots.py), so memory stays flat for large files, the event loop
+    keeps serving, and the MCP server only ever sees complete versions.
+
+    Returns the uploads that were skipped (unreadable or unchunkable) with
+    their errors; the others are still published.
+    """
     try:
-        # Split documents into chunks
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-        chunks = text_splitter.split_documents(documents)
-        
-        # Add unique IDs to prevent duplicates
-        for chunk in chunks:
-            # Create a hash of the content for deduplication
-            content_hash = hashlib.md5(chunk.page_content.encode()).hexdigest()[:8]
-            chunk.metadata["chunk_id"] = f"{chunk.metadata.get('filename', 'unknown')}_{content_hash}"
-        
-        ds_name = os.path.join("..", "vector_store")
-        
-        # Create directory if it doesn't exist
-        # os.makedirs(os.path.dirname(ds_name), exist_ok=True)
-       
-        
-        # Load existing vector store or create new one
-        try:
-            vector_store = Chroma(
-                persist_directory=ds_name,
-                embedding_function=embeddings,
-                collection_name="study_documents"
-            )
-            
-            # Add new documents to existing store
-            await vector_store.aadd_documents(chunks)
-            print(f"[INFO] Added {len(chunks)} chunks to existing vector store")
-            
-        except Exception as e:
-            # If loading fails, create a new vector store
-            print(f"[INFO] Creating new vector store: {str(e)}")
-            vector_store = await Chroma.afrom_documents(
-                documents=chunks,
-                embedding=embeddings,
-                persist_directory=ds_name,
-                collection_name="study_documents"
-            )
-            print(f"[INFO] Created new vector store with {len(chunks)} chunks")
-        
-        # Get total count
-        total_chunks = vector_store._collection.count()
-        print(f"[INFO] Vector store now contains {total_chunks} total chunks")
+        added, total_chunks, failed = await asyncio.to_thread(
+            ingest_uploads, snapshots, uploads, embeddings, open_snapshot, pool=markdown_pool
+        )
+        if total_chunks is not None:
+            print(f"[INFO] Added {added} chunks; vector store now contains {total_chunks} total chunks")
+        return failed
         
     except Exception as e:
         print(f"[ERROR] Failed to add documents to vector store: {str(e)}")
@@ -0,0 +1,482 @@
+"""
+Structure-aware chunking of Markdown uploads.
+
+Markdown used to go through UnstructuredMarkdownLoader, which is slow to
+import and run and flattens the document, before the generic character
+splitter cut it every 1000 characters regardless of headings, code or
+tables. This module parses the Markdown itself, line by line:
+
+- sections follow the heading hierarchy (ATX "#" and setext headings); a
+  chunk never spans two sections, except that small neighboring sections
+  are packed together when both fit in one chunk;
+- fenced code blocks and tables are kept whole (up to MAX_ATOMIC_CHARS);
+- paragraphs longer than a chunk fall back to the character splitter;
+- each chunk records its section path ("Cells > Mitochondria") in metadata.
+
+Chunk text is sliced verbatim from the source, so start_index is exact and
+the MCP server can stitch neighboring chunks back together. Parsing is a
+stream over lines: a section is chunked as soon as the next one starts, or
+block by block once it is longer than a chunk, so memory is bounded by the
+chunk being filled, not by the section or the file. Everything here
+is plain Python with no third-party imports on the common path, so it is
+cheap to run in worker processes (see chunk_markdown_file).
+"""
+import contextlib
+import hashlib
+import json
+import os
+import re
+import tempfile
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 100
+# Code blocks and tables up to this size are one chunk even if over CHUNK_SIZE;
+# larger ones are cut on line boundaries to stay within embedding input limits
+MAX_ATOMIC_CHARS = 4000
+# chunk text a worker returns directly; beyond this it spools to a temporary file
+SPOOL_CHARS = 1 << 20
+SECTION_SEPARATOR = " > "
+
+_ATX_HEADING = re.compile(r" {0,3}(#{1,6})(?:[ \t]+(.*?))?(?:[ \t]+#+)?[ \t]*$")
+_SETEXT_UNDERLINE = re.compile(r" {0,3}(=+|-+)[ \t]*$")
+_FENCE = re.compile(r" {0,3}(`{3,}|~{3,})")
+_TABLE_DELIMITER = re.compile(r" {0,3}\|?[ \t]*:?-+:?[ \t]*(\|[ \t]*:?-+:?[ \t]*)*\|?[ \t]*$")
+_LIST_ITEM = re.compile(r" {0,3}([-+*]|\d{1,9}[.)])[ \t]")
+
+# (chunk text, start_index, extra metadata)
+Piece = Tuple[str, int, dict]
+
+
+@dataclass
+class Block:
+    kind: str        # "heading", "text", "code", "table" or "front_matter"
+    start: int       # offsets into the source text
+    end: int
+    level: int = 0   # heading level
+    title: str = ""  # heading text
+
+
+@dataclass
+class Section:
+    path: List[str]
+    blocks: List[Block] = field(default_factory=list)
+    # a later part of a long section, see iter_sections(open_after=...)
+    continued: bool = False
+
+    @property
+    def start(self) -> int:
+        return self.blocks[0].start
+
+    @property
+    def end(self) -> int:
+        return self.blocks[-1].end
+
+
+def parse_blocks(text: str) -> List[Block]:
+    """Split Markdown source into headings, code blocks, tables and text runs."""
+    return list(iter_blocks(text.splitlines(keepends=True)))
+
+
+def iter_blocks(lines: Iterable[str]) -> Iterator[Block]:
+    """parse_blocks() over source lines (with their line endings), yielding each block once it is complete."""
+    current: Optional[Block] = None
+    # text lines of the current block, needed to detect setext headings and tables
+    current_lines: List[str] = []
+    fence = ""
+    offset = 0
+    lines = iter(lines)
+
+    def close():
+        nonlocal current, current_lines
+        if current is not None:
+            yield current
+        current, current_lines = None, []
+
+    # YAML front matter is metadata, not a thematic break plus a setext heading
+    head = [line for line in [next(lines, None)] if line is not None]
+    if head and head[0].rstrip() == "---":
+        for line in lines:
+            head.append(line)
+            if line.rstrip() in ("---", "..."):
+                offset = sum(len(line) for line in head)
+                yield Block("front_matter", 0, offset)
+                head = []
+                break
+
+    for line in _chain(head, lines):
+        start, offset = offset, offset + len(line)
+        stripped = line.rstrip("\r\n")
+
+        if fence:
+            current.end = offset
+            closing = _FENCE.match(stripped)
+            if closing and closing.group(1)[0] == fence[0] and len(closing.group(1)) >= len(fence) \
+                    and not stripped.strip()[len(closing.group(1)):].strip():
+                fence = ""
+                yield from close()
+            continue
+
+        if not stripped.strip():
+            yield from close()
+            continue
+
+        opening = _FENCE.match(stripped)
+        if opening and not (opening.group(1)[0] == "`" and "`" in stripped.strip()[len(opening.group(1)):]):
+            yield from close()
+            fence = opening.group(1)
+            current = Block("code", start, offset)
+            continue
+
+        heading = _ATX_HEADING.match(stripped)
+        if heading:
+            yield from close()
+            yield Block("heading", start, offset, len(heading.group(1)), (heading.group(2) or "").strip())
+            continue
+
+        if current is not None and current.kind == "text":
+            underline = _SETEXT_UNDERLINE.match(stripped)
+            if underline and not _LIST_ITEM.match(current_lines[0]):
+                title = " ".join(line.strip() for line in current_lines)
+                yield Block("heading", current.start, offset, 1 if underline.group(1)[0] == "=" else 2, title)
+                current, current_lines = None, []
+                continue
+            if len(current_lines) == 1 and "|" in current_lines[0] and "|" in stripped \
+                    and _TABLE_DELIMITER.match(stripped):
+                current.kind = "table"
+                current.end = offset
+                continue
+
+        if current is not None and current.kind == "table":
+            if "|" in stripped:
+                current.end = offset
+                continue
+            yield from close()
+
+        if current is None:
+            current = Block("text", start, offset)
+        current.end = offset
+        current_lines.append(stripped)
+
+    yield from close()
+
+
+def _chain(first: List[str], rest: Iterator[str]) -> Iterator[str]:
+    yield from first
+    yield from rest
+
+
+def parse_sections(text: str) -> List[Section]:
+    """Group blocks into sections, each keyed by its heading path."""
+    return list(iter_sections(iter_blocks(text.splitlines(keepends=True))))
+
+
+def iter_sections(blocks: Iterable[Block], open_after: Optional[int] = None) -> Iterator[Section]:
+    """
+    parse_sections() over a stream of blocks, yielding each section once the next one starts.
+
+    With open_after, a section with content that spans more than open_after
+    characters is yielded before it ends, then each further block as a
+    continued part, so a long section is never held whole.
+    """
+    headings: List[Tuple[int, str]] = []
+    current: Optional[Section] = None
+    for block in blocks:
+        if block.kind != "heading":
+            if current is None:
+                current = Section([], [])
+            current.blocks.append(block)
+            if open_after is not None and (current.continued or current.end - current.start > open_after):
+                yield current
+                current = Section(current.path, [], continued=True)
+            continue
+        while headings and headings[-1][0] >= block.level:
+            headings.pop()
+        headings.append((block.level, block.title))
+        section = Section([title for _, title in headings], [block])
+        # a heading directly followed by a subheading has no text of its own;
+        # it opens its first subsection's chunk instead of becoming a chunk
+        if current is not None and all(b.kind == "heading" for b in current.blocks) and not current.continued \
+                and len(section.path) > len(current.path) and section.path[:len(current.path)] == current.path:
+            section.blocks = current.blocks + section.blocks
+        elif current is not None and current.blocks:
+            yield current
+        current = section
+    if current is not None and current.blocks:
+        yield current
+
+
+class MarkdownChunker:
+    """
+    Chunk Markdown by section, keeping code blocks and tables whole.
+
+    Args:
+        chunk_size: Target chunk length in characters
+        chunk_overlap: Overlap used only when a long paragraph has to be split
+        max_atomic_chars: Longest code block or table kept in one chunk
+    """
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP,
+                 max_atomic_chars: int = MAX_ATOMIC_CHARS):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.max_atomic_chars = max(max_atomic_chars, chunk_size)
+        self._text_splitter = None
+
+    def split(self, text: str) -> List[Piece]:
+        """Return (chunk text, start_index, {"section", "section_level"}) in document order."""
+        return list(self.iter_split(text.splitlines(keepends=True)))
+
+    def iter_split(self, lines: Iterable[str]) -> Iterator[Piece]:
+        """
+        split() over source lines (with their line endings), e.g. an open file.
+
+        Small sections are chunked when the next one starts; a long one block
+        by block, keeping only the chunk still being filled.
+        """
+        window = _Window()
+
+        def read():
+            for line in lines:
+                window.append(line)
+                yield line
+
+        # span of whole small sections being packed together, and their paths
+        packed: Optional[List] = None
+        # the long section being packed block by block
+        packer: Optional[_Packer] = None
+        pieces: List[Piece] = []
+        for section in iter_sections(iter_blocks(read()), open_after=self.chunk_size):
+            if not section.continued and packer is not None:
+                self._emit_spans(window, packer.finish(), packer.path, pieces)
+                packer = None
+            if section.continued or section.end - section.start > self.chunk_size:
+                self._emit(window, packed, pieces)
+                packed = None
+                packer = packer or _Packer(self, window, section.path)
+                for block in section.blocks:
+                    self._emit_spans(window, packer.add(block), section.path, pieces)
+            elif packed is not None and section.end - packed[0] <= self.chunk_size:
+                packed[1] = section.end
+                packed[2] = _common_path(packed[2], section.path)
+            else:
+                self._emit(window, packed, pieces)
+                packed = [section.start, section.end, section.path]
+            yield from pieces
+            pieces.clear()
+            # later chunks start at the packed span or the open chunk, or after this section
+            if packed is not None:
+                window.drop_before(packed[0])
+            elif packer is not None and packer.start is not None:
+                window.drop_before(packer.start)
+            else:
+                window.drop_before(section.end)
+        if packer is not None:
+            self._emit_spans(window, packer.finish(), packer.path, pieces)
+        self._emit(window, packed, pieces)
+        yield from pieces
+
+    def _emit_spans(self, text: "_Window", spans: List[Tuple[int, int]], path: List[str], pieces: List[Piece]):
+        for start, end in spans:
+            self._emit(text, [start, end, path], pieces)
+
+    def _split_lines(self, text: "_Window", start: int, end: int) -> List[Tuple[int, int]]:
+        """Cut an oversized code block or table on line boundaries, without overlap."""
+        spans = []
+        span_start = position = start
+        for line in text[start:end].splitlines(keepends=True):
+            if position > span_start and position + len(line) - span_start > self.chunk_size:
+                spans.append((span_start, position))
+                span_start = position
+            position += len(line)
+        spans.append((span_start, end))
+        return spans
+
+    def _split_text(self, text: "_Window", start: int, end: int) -> List[Tuple[int, int]]:
+        """Cut an oversized paragraph with the character splitter the text path uses."""
+        if self._text_splitter is None:
+            from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+            self._text_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap)
+        spans = []
+        previous_end = start
+        for chunk in self._text_splitter.split_text(text[start:end]):
+            # a chunk either overlaps the previous one and runs past its end, or
+            # follows it after whitespace; repeated strings take the first such place
+            found = text.find(chunk, max(start, previous_end - self.chunk_overlap), end)
+            while found >= 0 and (found + len(chunk) <= previous_end
+                                  or found > previous_end and text[previous_end:found].strip()):
+                found = text.find(chunk, found + 1, end)
+            if found < 0:
+                continue
+            spans.append((found, found + len(chunk)))
+            previous_end = found + len(chunk)
+        return spans
+
+    def _emit(self, text: "_Window", span: Optional[list], pieces: List[Piece]):
+        if span is None:
+            return
+        start, end, path = span
+        raw = text[start:end]
+        chunk = raw.strip()
+        if chunk:
+            start_index = start + len(raw) - len(raw.lstrip())
+            pieces.append((chunk, start_index, {
+                "section": SECTION_SEPARATOR.join(path),
+                "section_level": len(path),
+            }))
+
+
+class _Packer:
+    """Greedily packs one long section's blocks into (start, end) spans, as they arrive."""
+
+    def __init__(self, chunker: MarkdownChunker, text: "_Window", path: List[str]):
+        self.chunker = chunker
+        self.text = text
+        self.path = path
+        self.start: Optional[int] = None  # the span being filled
+        self.end = 0
+        self.headings_only = True  # the span so far holds only headings
+
+    def add(self, block: Block) -> List[Tuple[int, int]]:
+        """Add the next block; returns the spans it completes."""
+        chunker = self.chunker
+        spans: List[Tuple[int, int]] = []
+        size = block.end - block.start
+        atomic = block.kind in ("code", "table")
+        oversized = size > (chunker.max_atomic_chars if atomic else chunker.chunk_size)
+        if oversized:
+            # leading headings go along with the first cut of the block
+            if self.start is not None and not self.headings_only:
+                spans.append((self.start, self.end))
+                self.start = None
+            cut_from = block.start if self.start is None else self.start
+            cut = chunker._split_lines if atomic else chunker._split_text
+            spans.extend(cut(self.text, cut_from, block.end))
+            self.start = None
+            return spans
+        # headings stay with the block after them unless that makes the chunk too long to embed
+        if self.start is not None and block.end - self.start > chunker.chunk_size \
+                and (not self.headings_only or block.end - self.start > chunker.max_atomic_chars):
+            spans.append((self.start, self.end))
+            self.start = None
+        if self.start is None:
+            self.start, self.headings_only = block.start, True
+        self.end = block.end
+        self.headings_only = self.headings_only and block.kind == "heading"
+        return spans
+
+    def finish(self) -> List[Tuple[int, int]]:
+        """The span still being filled, if any."""
+        spans = [(self.start, self.end)] if self.start is not None else []
+        self.start = None
+        return spans
+
+
+class _Window:
+    """The part of a streamed document still needed, sliced by offsets into the whole document."""
+
+    def __init__(self):
+        self.base = 0
+        self.text = ""
+        self._pending: List[str] = []
+
+    def append(self, line: str):
+        self._pending.append(line)
+
+    def _text(self) -> str:
+        if self._pending:
+            self.text += "".join(self._pending)
+            self._pending = []
+        return self.text
+
+    def __getitem__(self, span: slice) -> str:
+        return self._text()[span.start - self.base:span.stop - self.base]
+
+    def find(self, sub: str, start: int, end: int) -> int:
+        found = self._text().find(sub, start - self.base, end - self.base)
+        return found + self.base if found >= 0 else -1
+
+    def drop_before(self, offset: int):
+        self.text = self._text()[offset - self.base:]
+        self.base = offset
+
+
+def default_workers() -> int:
+    """Chunking worker processes: up to 4, leaving a CPU for the app; 0 (one CPU) means chunk inline."""
+    return min(4, (os.cpu_count() or 1) - 1)
+
+
+def _common_path(a: List[str], b: List[str]) -> List[str]:
+    common = []
+    for left, right in zip(a, b):
+        if left != right:
+            break
+        common.append(left)
+    return common
+
+
+class SpooledPieces:
+    """
+    Chunks a worker process wrote to a temporary JSONL file.
+
+    Picklable and small, so the pool returns it instead of every chunk;
+    iterating reads the chunks back one at a time and deletes the file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def __iter__(self) -> Iterator[Piece]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    text, start_index, extra = json.loads(line)
+                    yield text, start_index, extra
+        finally:
+            self.discard()
+
+    def discard(self):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.path)
+
+
+def chunk_markdown_file(path: str, source: str, chunk_size: int = CHUNK_SIZE,
+                        chunk_overlap: int = CHUNK_OVERLAP) -> Tuple[str, Iterable[Piece]]:
+    """
+    Read and chunk one Markdown file as a stream; picklable, for a process pool.
+
+    Returns the document id (hashed from source and text like
+    streaming_ingest.document_id) and the chunks: a list, or SpooledPieces
+    once they exceed SPOOL_CHARS.
+    """
+    digest = hashlib.md5(f"{source}\0".encode())
+
+    def read(f):
+        for line in f:
+            digest.update(line.encode())
+            yield from line.splitlines(keepends=True)
+
+    pieces: List[Piece] = []
+    chars = 0
+    spool = None
+    try:
+        with open(path, encoding="utf-8") as f, contextlib.ExitStack() as stack:
+            for piece in MarkdownChunker(chunk_size, chunk_overlap).iter_split(read(f)):
+                pieces.append(piece)
+                chars += len(piece[0])
+                if chars <= SPOOL_CHARS:
+                    continue
+                if spool is None:
+                    fd, spool = tempfile.mkstemp(prefix="studymode-markdown-", suffix=".jsonl")
+                    out = stack.enter_context(open(fd, "w", encoding="utf-8"))
+                out.writelines(json.dumps(piece) + "\n" for piece in pieces)
+                pieces.clear()
+    except BaseException:
+        if spool is not None:
+            os.remove(spool)
+        raise
+    return digest.hexdigest()[:16], pieces if spool is None else SpooledPieces(spool)
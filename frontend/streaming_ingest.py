@@ -0,0 +1,322 @@
+"""
+Streaming, bounded-memory ingestion of uploaded files.
+
+Uploads used to be loaded whole into one Document and split in memory, so a
+large file cost several times its size in RAM and stalled the event loop.
+Here a file is read in blocks, chunked by StreamingSplitter (same output as
+the RecursiveCharacterTextSplitter the app used, see its docstring), and the
+chunks are embedded and upserted in fixed-size batches. Peak memory depends
+on the block and batch sizes, not on the file size.
+
+Uploads with their own chunker (Markdown, see markdown_chunker.py) are
+chunked in a worker pool instead, a few files ahead of the embedding loop.
+
+Chunks keep the id scheme of the in-memory path ("doc_id:chunk_index", with
+doc_id hashed from source and full text); chunk_count is only known at the
+end of the stream and is written back in batches before the snapshot is
+published.
+"""
+import functools
+import hashlib
+import re
+from collections import deque
+from concurrent.futures import Executor, Future
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from langchain_text_splitters.character import _split_text_with_regex
+
+from snapshots import SnapshotStore, close_chroma
+
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 100
+BLOCK_CHARS = 1 << 20       # characters read from disk at a time
+MAX_PIECE_CHARS = 1 << 22   # longest paragraph held before it is split as is
+BATCH_SIZE = 256            # chunks per embedding call and upsert
+PREFETCH_FILES = 4          # uploads chunked ahead in the worker pool
+
+# (chunk text, start_index, extra metadata)
+Piece = Tuple[str, int, dict]
+
+
+def read_blocks(path: str, encoding: str = "utf-8", block_chars: int = BLOCK_CHARS) -> Iterator[str]:
+    """Yield a text file in blocks, decoded the way TextLoader reads it."""
+    with open(path, encoding=encoding) as f:
+        while True:
+            block = f.read(block_chars)
+            if not block:
+                return
+            yield block
+
+
+def document_id(source: str, blocks: Iterable[str]) -> str:
+    """Same id as hashing f"{source}\\0{text}" in one piece, without holding the text."""
+    digest = hashlib.md5(f"{source}\0".encode())
+    for block in blocks:
+        digest.update(block.encode())
+    return digest.hexdigest()[:16]
+
+
+class StreamingSplitter:
+    """
+    RecursiveCharacterTextSplitter over a stream of text blocks.
+
+    The recursive splitter cuts on the first separator ("\\n\\n") and greedily
+    merges the pieces left to right, so its chunks only depend on text it
+    has already seen. This splitter cuts paragraphs as blocks arrive and
+    runs the same merge as a generator, giving identical chunks and
+    start_index values with memory bounded by max_piece_chars. The only
+    difference: a single paragraph longer than max_piece_chars is cut at
+    that length before being split further.
+    """
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP,
+                 max_piece_chars: int = MAX_PIECE_CHARS):
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.max_piece_chars = max(max_piece_chars, chunk_size)
+        # the in-memory splitter handles pieces that need a finer separator
+        self._splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        self._finer_separators = self._splitter._separators[1:]
+        self._paragraph_break = re.compile("\n\n")
+
+    def split(self, blocks: Iterable[str]) -> Iterator[tuple[str, int]]:
+        """Yield (chunk text, start_index) pairs."""
+        self._current: List[str] = []
+        self._total = 0
+        # consumed text from history_start on, for the start_index lookups
+        # TextSplitter.create_documents does on the full text
+        history = ""
+        history_start = 0
+        index = 0
+        previous_chunk_len = 0
+        pieces = self._pieces(blocks)
+        while True:
+            piece = next(pieces, None)
+            if piece is not None:
+                history += piece
+            for chunk in self._chunks(piece) if piece is not None else self._flush():
+                offset = max(0, index + previous_chunk_len - self.chunk_overlap)
+                found = history.find(chunk, max(0, offset - history_start))
+                index = found + history_start if found >= 0 else -1
+                previous_chunk_len = len(chunk)
+                yield chunk, index
+            if piece is None:
+                return
+            # the next chunk starts at or after index - chunk_overlap
+            keep_from = max(0, index - self.chunk_overlap)
+            if keep_from > history_start:
+                history = history[keep_from - history_start:]
+                history_start = keep_from
+
+    def _pieces(self, blocks: Iterable[str]) -> Iterator[str]:
+        """Cut the stream into "\\n\\n"-separated pieces, exactly as the splitter's regex split would."""
+        buffer = ""
+        for block in blocks:
+            buffer += block
+            # pieces before the last separator match are final; the last may still grow
+            cut = 0
+            for match in self._paragraph_break.finditer(buffer):
+                cut = match.start()
+            if cut > 0:
+                yield from _split_text_with_regex(buffer[:cut], "\n\n", keep_separator=True)
+                buffer = buffer[cut:]
+            while len(buffer) > self.max_piece_chars:
+                yield buffer[:self.max_piece_chars]
+                buffer = buffer[self.max_piece_chars:]
+        if buffer:
+            yield from _split_text_with_regex(buffer, "\n\n", keep_separator=True)
+
+    def _chunks(self, piece: str) -> Iterator[str]:
+        if len(piece) < self.chunk_size:
+            yield from self._merge(piece)
+            return
+        # a long paragraph ends the current run of merged pieces
+        yield from self._flush()
+        yield from self._splitter._split_text(piece, self._finer_separators)
+
+    def _merge(self, split: str) -> Iterator[str]:
+        """One step of TextSplitter._merge_splits with separator "" (keep_separator)."""
+        length = len(split)
+        if self._total + length > self.chunk_size and self._current:
+            chunk = "".join(self._current).strip()
+            if chunk:
+                yield chunk
+            while self._total > self.chunk_overlap or (self._total + length > self.chunk_size and self._total > 0):
+                self._total -= len(self._current[0])
+                self._current = self._current[1:]
+        self._current.append(split)
+        self._total += length
+
+    def _flush(self) -> Iterator[str]:
+        chunk = "".join(self._current).strip()
+        self._current, self._total = [], 0
+        if chunk:
+            yield chunk
+
+
+@dataclass
+class Upload:
+    """
+    One file to ingest: a way to (re)open its text blocks, and its metadata.
+
+    chunker, if set, replaces the streaming splitter: a picklable callable
+    returning (doc_id, pieces), run in the worker pool. pieces may be
+    spooled to disk (see markdown_chunker.SpooledPieces).
+    """
+    open_blocks: Callable[[], Iterable[str]]
+    metadata: dict
+    chunker: Optional[Callable[[], Tuple[str, Iterable[Piece]]]] = None
+
+
+def iter_chunks(upload: Upload, doc_id: str, pieces: Iterable[Piece]) -> Iterator[tuple[str, Document]]:
+    """
+    Yield (vector store id, chunk Document) for one upload, in document order.
+
+    Ids are "doc_id:chunk_index" so the MCP server can fetch a hit's
+    neighbors by id (see mcp-server/retrieval.py); keep the two schemes in sync
+    (mcp-server benchmarks.copies checks).
+    """
+    filename = upload.metadata.get("filename", "unknown")
+    for chunk_index, (text, start_index, extra) in enumerate(pieces):
+        metadata = {
+            **upload.metadata,
+            **extra,
+            "doc_id": doc_id,
+            "chunk_index": chunk_index,
+            "start_index": start_index,
+            # content hash kept from the earlier upload path
+            "chunk_id": f"{filename}_{hashlib.md5(text.encode()).hexdigest()[:8]}",
+        }
+        yield f"{doc_id}:{chunk_index}", Document(page_content=text, metadata=metadata)
+
+
+def _split_upload(upload: Upload, splitter: StreamingSplitter) -> Tuple[str, Iterable[Piece]]:
+    # first pass: the id hashes the whole text, and every chunk id contains it;
+    # it also decodes the whole file, so a bad file fails here, before any upsert
+    doc_id = document_id(upload.metadata.get("source", "unknown"), upload.open_blocks())
+    return doc_id, ((text, start_index, {}) for text, start_index in splitter.split(upload.open_blocks()))
+
+
+def _chunked_uploads(
+    uploads: List[Upload], splitter: StreamingSplitter, pool: Optional[Executor]
+) -> Iterator[Tuple[Upload, Callable[[], Tuple[str, Iterable[Piece]]]]]:
+    """
+    Yield (upload, chunk) where chunk() returns (doc_id, pieces) or raises for a bad file.
+
+    Keeps PREFETCH_FILES chunker uploads in flight in the pool.
+    """
+    queued = deque(upload for upload in uploads if upload.chunker is not None)
+    in_flight = {}
+
+    def submit_next():
+        if queued and pool is not None:
+            upload = queued.popleft()
+            in_flight[id(upload)] = pool.submit(upload.chunker)
+
+    for _ in range(PREFETCH_FILES):
+        submit_next()
+    try:
+        for upload in uploads:
+            if upload.chunker is None:
+                yield upload, functools.partial(_split_upload, upload, splitter)
+                continue
+            future = in_flight.pop(id(upload), None)
+            submit_next()
+            yield upload, future.result if future is not None else upload.chunker
+    finally:
+        # the ingest was aborted: drop what was chunked ahead for nothing
+        for future in in_flight.values():
+            future.cancel()
+            future.add_done_callback(_discard_pieces)
+
+
+def _discard_pieces(future: Future):
+    if not future.cancelled() and future.exception() is None:
+        _, pieces = future.result()
+        discard = getattr(pieces, "discard", None)
+        if discard is not None:
+            discard()
+
+
+def _batches(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class _NothingIngested(Exception):
+    """Every upload failed: discard the new version instead of publishing a copy."""
+
+
+def ingest_uploads(
+    snapshots: SnapshotStore,
+    uploads: List[Upload],
+    embeddings: Any,
+    open_store: Callable[[str], Any],
+    batch_size: int = BATCH_SIZE,
+    splitter: Optional[StreamingSplitter] = None,
+    pool: Optional[Executor] = None,
+) -> tuple[int, Optional[int], List[Tuple[Upload, Exception]]]:
+    """
+    Stream uploads into one new snapshot.
+
+    Holds the snapshot writer lock for the whole ingest (other uploads wait;
+    readers keep using the published version). Blocking: call it from a
+    worker thread. Uploads with a chunker run it in pool, or inline if None.
+
+    A file that cannot be read or chunked (e.g. not UTF-8) is skipped and
+    the rest are still published; errors while embedding or writing abort
+    the whole snapshot, as they would hit every file.
+
+    Returns:
+        (chunks added, total chunks in the new snapshot or None if every
+        upload failed and nothing was published, [(upload, error)] skipped)
+    """
+    splitter = splitter or StreamingSplitter()
+    added = 0
+    failed: List[Tuple[Upload, Exception]] = []
+    try:
+        with snapshots.write() as version_dir:
+            collection = open_store(version_dir)._collection
+            try:
+                for upload, chunk in _chunked_uploads(uploads, splitter, pool):
+                    name = upload.metadata.get("filename", "upload")
+                    try:
+                        doc_id, pieces = chunk()
+                    except Exception as e:
+                        print(f"[ERROR] Skipped {name}: {str(e)}")
+                        failed.append((upload, e))
+                        continue
+                    chunk_count = 0
+                    for batch in _batches(iter_chunks(upload, doc_id, pieces), batch_size):
+                        texts = [doc.page_content for _, doc in batch]
+                        collection.upsert(
+                            ids=[id_ for id_, _ in batch],
+                            embeddings=embeddings.embed_documents(texts),
+                            documents=texts,
+                            metadatas=[doc.metadata for _, doc in batch],
+                        )
+                        chunk_count += len(batch)
+                    for start in range(0, chunk_count, batch_size):
+                        ids = [f"{doc_id}:{i}" for i in range(start, min(start + batch_size, chunk_count))]
+                        collection.update(ids=ids, metadatas=[{"chunk_count": chunk_count}] * len(ids))
+                    added += chunk_count
+                    print(f"[INFO] Streamed {chunk_count} chunks from {name}")
+                if len(failed) == len(uploads):
+                    raise _NothingIngested()
+                total = collection.count()
+            finally:
+                close_chroma(version_dir)
+    except _NothingIngested:
+        return 0, None, failed
+    return added, total, failed
@@ -0,0 +1,122 @@
+"""
+Drift check for the code the frontend copies from the MCP server.
+
+The two services build from separate Docker contexts, so frontend/ keeps its
+own snapshots.py and embedding_broker.py, and its upload path re-implements
+the document and chunk id scheme of ingest.py and retrieval.py. Checks that:
+
+- each copied module is identical to the original below its module
+  docstring (which says where the other copy lives);
+- streaming_ingest.document_id and markdown_chunker.chunk_markdown_file give
+  an uploaded file the id ingest.document_id gives it, for text read in
+  several blocks;
+- streaming_ingest.iter_chunks gives chunks the ids retrieval.chunk_id
+  does, so neighbor expansion finds uploaded chunks.
+
+Exits non-zero if any copy has drifted:
+
+    uv run python -m benchmarks.copies
+"""
+import ast
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+
+# ingest.py refuses to import without a key; nothing is embedded here
+os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+
+from ingest import document_id
+from retrieval import chunk_id
+
+
+MCP_SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FRONTEND_DIR = os.path.join(os.path.dirname(MCP_SERVER_DIR), "frontend")
+COPIED_MODULES = ("snapshots.py", "embedding_broker.py")
+
+SAMPLE = "# Cells\n\nThe mitochondria is the powerhouse of the cell. Ünïcödé ✓\n\n" * 200
+
+
+def body(path: str) -> list[str]:
+    """Source lines after the module docstring."""
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+    tree = ast.parse(source)
+    start = 0
+    if ast.get_docstring(tree) is not None:
+        start = tree.body[0].end_lineno
+    return source.splitlines()[start:]
+
+
+def compare_copy(name: str) -> dict:
+    original = body(os.path.join(MCP_SERVER_DIR, name))
+    copy = body(os.path.join(FRONTEND_DIR, name))
+    differing = next((i for i, (a, b) in enumerate(zip(original, copy)) if a != b), None)
+    if differing is None and len(original) != len(copy):
+        differing = min(len(original), len(copy))
+    result = {"module": name, "ok": differing is None}
+    if differing is not None:
+        # line numbers are counted from the end of the docstring
+        result["first_difference"] = {
+            "line": differing + 1,
+            "mcp-server": original[differing] if differing < len(original) else None,
+            "frontend": copy[differing] if differing < len(copy) else None,
+        }
+    return result
+
+
+def load_frontend(module: str):
+    """Import a frontend module under its own name, so it does not shadow the server's."""
+    spec = importlib.util.spec_from_file_location(f"frontend_{module}", os.path.join(FRONTEND_DIR, f"{module}.py"))
+    loaded = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(loaded)
+    return loaded
+
+
+def check_ids(workdir: str) -> dict:
+    # streaming_ingest's "from snapshots import" resolves to the server's
+    # module, which compare_copy has just checked against the frontend's
+    streaming_ingest = load_frontend("streaming_ingest")
+    markdown_chunker = load_frontend("markdown_chunker")
+
+    source = "uploaded/cells.md"
+    path = os.path.join(workdir, "cells.md")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(SAMPLE)
+    expected = document_id(source, SAMPLE)
+
+    blocks = list(streaming_ingest.read_blocks(path, block_chars=1000))
+    streamed = streaming_ingest.document_id(source, blocks)
+    markdown, pieces = markdown_chunker.chunk_markdown_file(path, source)
+    pieces = list(pieces)
+
+    upload = streaming_ingest.Upload(open_blocks=lambda: blocks, metadata={"source": source, "filename": "cells.md"})
+    ids = [vector_id for vector_id, _ in streaming_ingest.iter_chunks(upload, expected, pieces)]
+    return {
+        "blocks": len(blocks),
+        "chunks": len(pieces),
+        "streaming_document_id": streamed == expected,
+        "markdown_document_id": markdown == expected,
+        "chunk_ids": ids == [chunk_id(expected, i) for i in range(len(pieces))],
+    }
+
+
+def main():
+    copies = [compare_copy(name) for name in COPIED_MODULES]
+    with tempfile.TemporaryDirectory(prefix="studymode-copies-") as workdir:
+        ids = check_ids(workdir)
+    checks = {
+        **{f"{copy['module']}_in_sync": copy["ok"] for copy in copies},
+        "document_ids_match": ids["streaming_document_id"] and ids["markdown_document_id"] and ids["blocks"] > 1,
+        "chunk_ids_match": ids["chunk_ids"] and ids["chunks"] > 1,
+    }
+    report = {"benchmark": "copies", "copies": copies, "ids": ids, "checks": checks}
+    print(json.dumps(report, indent=2))
+    if not all(checks.values()):
+        print("[ERROR] Frontend copies have drifted from the MCP server", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import os
+import random
+from dataclasses import dataclass
+from typing import List
+
+
+@dataclass
+class BenchQuery:
+    text: str
+    source: str
+
+
+def _make_vocabulary(rng: random.Random, size: int) -> List[str]:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(letters) for _ in range(rng.randint(4, 9))))
+    return sorted(words)
+
+
+def generate_corpus(
+    output_dir: str,
+    num_documents: int,
+    sentences_per_document: int = 40,
+    queries: int = 200,
+    seed: int = 0,
+) -> List[BenchQuery]:
+    """
+    Write num_documents synthetic .txt files into output_dir and return queries
+    with their expected source file.
+
+    Every document draws most of its words from a private topic vocabulary plus
+    a shared pool of filler words, so a query sampled from one sentence has a
+    single correct document while still competing with lexical noise.
+    """
+    rng = random.Random(seed)
+    shared = _make_vocabulary(rng, 300)
+    os.makedirs(output_dir, exist_ok=True)
+
+    sentences_by_source: dict[str, List[str]] = {}
+    for doc_index in range(num_documents):
+        topic = _make_vocabulary(rng, 25)
+        sentences = []
+        for _ in range(sentences_per_document):
+            words = [
+                rng.choice(topic) if rng.random() < 0.6 else rng.choice(shared)
+                for _ in range(rng.randint(10, 20))
+            ]
+            sentences.append(" ".join(words).capitalize() + ".")
+
+        path = os.path.join(output_dir, f"doc_{doc_index:06d}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(sentences))
+        sentences_by_source[path] = sentences
+
+    sources = sorted(sentences_by_source)
+    bench_queries = []
+    for _ in range(queries):
+        source = rng.choice(sources)
+        words = rng.choice(sentences_by_source[source]).rstrip(".").lower().split()
+        start = rng.randint(0, max(0, len(words) - 6))
+        bench_queries.append(BenchQuery(text=" ".join(words[start:start + 6]), source=source))
+
+    return bench_queries
@@ -0,0 +1,184 @@
+"""
+Load test for EmbeddingBroker against a local stub embedding endpoint.
+
+Runs the same concurrent query workload twice, once calling the stub client
+directly and once through the broker. It can also run a background bulk
+ingestion stream. For each mode it reports throughput, query latency, the
+number of upstream requests and how many the stub rejected with 429.
+
+A third mode sends concurrent doc_search_tool calls through the FastMCP
+server, with the broker in place of the Gemini client, and exits non-zero
+unless their query embeddings shared upstream requests:
+
+    uv run python -m benchmarks.embedding_load --callers 64 --queries 20 --bulk-docs 2000 --tool-calls 40
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.retrieval import percentile
+from benchmarks.stub_embeddings import StubEmbeddingServer, StubEmbeddings
+from embedding_broker import EmbeddingBroker
+
+
+def run_mode(mode: str, args: argparse.Namespace) -> dict:
+    with StubEmbeddingServer(
+        request_overhead_ms=args.overhead_ms,
+        per_text_ms=args.per_text_ms,
+        max_concurrent=args.max_concurrent,
+    ) as stub:
+        client = StubEmbeddings(stub.url)
+        embeddings = EmbeddingBroker(client, max_wait_ms=args.wait_ms) if mode == "broker" else client
+
+        latencies: list[float] = []
+        errors = 0
+        lock = threading.Lock()
+
+        def caller(worker: int):
+            nonlocal errors
+            for i in range(args.queries):
+                start = time.perf_counter()
+                try:
+                    embeddings.embed_query(f"student {worker} question {i} about photosynthesis")
+                    ok = True
+                except Exception:
+                    ok = False
+                with lock:
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    errors += 0 if ok else 1
+
+        def ingest():
+            docs = [f"textbook paragraph {i}" for i in range(args.bulk_docs)]
+            for start in range(0, len(docs), 100):
+                try:
+                    embeddings.embed_documents(docs[start:start + 100])
+                except Exception:
+                    pass
+
+        threads = [threading.Thread(target=caller, args=(worker,)) for worker in range(args.callers)]
+        bulk = threading.Thread(target=ingest) if args.bulk_docs else None
+        start = time.perf_counter()
+        if bulk:
+            bulk.start()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        query_seconds = time.perf_counter() - start
+        if bulk:
+            bulk.join()
+        if mode == "broker":
+            embeddings.close()
+
+        total = args.callers * args.queries
+        return {
+            "mode": mode,
+            "queries": total,
+            "errors": errors,
+            "query_throughput_per_sec": round(total / query_seconds, 1),
+            "latency_p50_ms": round(statistics.median(latencies), 2),
+            "latency_p99_ms": round(percentile(latencies, 99), 2),
+            "upstream_requests": stub.requests,
+            "upstream_rejected_429": stub.rejected,
+        }
+
+
+def run_mcp_tool(args: argparse.Namespace) -> dict:
+    """Concurrent doc_search_tool calls through FastMCP, as the agent makes them."""
+    os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+    # hash embeddings score on their own scale; keep any deployment threshold off
+    os.environ.setdefault("RETRIEVAL_SCORE_THRESHOLD", "0")
+    import server
+    from benchmarks.corpus import generate_corpus
+    from benchmarks.fake_embeddings import HashEmbeddings
+    from ingest import build_vector_store
+
+    with StubEmbeddingServer(
+        request_overhead_ms=args.overhead_ms,
+        per_text_ms=args.per_text_ms,
+        max_concurrent=args.max_concurrent,
+    ) as stub, tempfile.TemporaryDirectory(prefix="studymode-embedding-load-") as workdir:
+        generate_corpus(os.path.join(workdir, "kb"), 20, queries=0)
+        # the stub embeds with the same hash model, so stored and query vectors match
+        build_vector_store(os.path.join(workdir, "kb"), persist_directory=os.path.join(workdir, "vs"),
+                           embeddings=HashEmbeddings(dimensions=256))
+        server.PERSIST_DIR = os.path.join(workdir, "vs")
+        server._embeddings = EmbeddingBroker(StubEmbeddings(stub.url), max_wait_ms=args.wait_ms)
+        server.get_vector_store()
+        stub.requests = 0
+
+        latencies: list[float] = []
+
+        async def call(i: int) -> bool:
+            start = time.perf_counter()
+            result = await server.mcp.call_tool(
+                "doc_search_tool", {"query": f"student {i} question about photosynthesis"})
+            latencies.append((time.perf_counter() - start) * 1000)
+            return "Error:" not in str(result)
+
+        async def call_all() -> list[bool]:
+            return await asyncio.gather(*(call(i) for i in range(args.tool_calls)))
+
+        start = time.perf_counter()
+        ok = asyncio.run(call_all())
+        seconds = time.perf_counter() - start
+        server._embeddings.close()
+
+        return {
+            "mode": "mcp_tool",
+            "queries": args.tool_calls,
+            "errors": ok.count(False),
+            "query_throughput_per_sec": round(args.tool_calls / seconds, 1),
+            "latency_p50_ms": round(statistics.median(latencies), 2),
+            "latency_p99_ms": round(percentile(latencies, 99), 2),
+            "upstream_requests": stub.requests,
+            "upstream_rejected_429": stub.rejected,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--callers", type=int, default=64, help="Concurrent query callers")
+    parser.add_argument("--queries", type=int, default=20, help="Queries per caller")
+    parser.add_argument("--bulk-docs", type=int, default=0, help="Documents ingested in the background")
+    parser.add_argument("--wait-ms", type=float, default=5.0, help="Broker batching window")
+    parser.add_argument("--overhead-ms", type=float, default=40.0, help="Stub per-request overhead")
+    parser.add_argument("--per-text-ms", type=float, default=0.2, help="Stub cost per text")
+    parser.add_argument("--max-concurrent", type=int, default=8, help="Stub concurrent request cap (429 beyond)")
+    parser.add_argument("--tool-calls", type=int, default=40, help="Concurrent doc_search_tool calls (0 to skip)")
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    results = [run_mode(mode, args) for mode in ("direct", "broker")]
+    checks = {}
+    if args.tool_calls:
+        results.append(run_mcp_tool(args))
+        # one upstream request per call would mean the tool calls ran one at a time
+        checks["mcp_tool_calls_batched"] = results[-1]["errors"] == 0 \
+            and results[-1]["upstream_requests"] <= args.tool_calls // 2
+    report = {
+        "benchmark": "embedding_load",
+        "params": vars(args),
+        "results": results,
+        "checks": checks,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+        print(f"[INFO] Wrote results to {args.output}")
+    else:
+        print(output)
+    if not all(checks.values()):
+        print("[ERROR] Concurrent doc_search_tool calls were not batched", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import hashlib
+import re
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+class HashEmbeddings(Embeddings):
+    """
+    Deterministic, offline stand-in for GoogleGenerativeAIEmbeddings.
+
+    Each token is hashed into a signed bucket of a fixed-size vector (feature
+    hashing) and the result is L2-normalised, so texts that share words end up
+    close together and recall numbers stay meaningful without any API calls.
+    """
+
+    def __init__(self, dimensions: int = 256):
+        self.dimensions = dimensions
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in TOKEN_RE.findall(text.lower()):
+            digest = hashlib.blake2b(token.encode(), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+            sign = 1.0 if digest[4] & 1 else -1.0
+            vector[bucket] += sign
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
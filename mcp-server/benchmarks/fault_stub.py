@@ -0,0 +1,84 @@
+"""
+Fault-injecting HTTP stub for resilience checks.
+
+Serves GET and POST on 127.0.0.1 with a base latency. A seeded fraction of
+requests can be slowed down or answered with 500, and the whole stub can be
+switched "down" (connections closed without a response). Paths in
+stall_once are slow on their first request only, like a stalled replica,
+so a hedged second request is fast. The settings are plain attributes, so
+a test can change them between phases.
+"""
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FaultStub:
+    def __init__(self, base_ms: float = 20.0, slow_rate: float = 0.0, slow_ms: float = 1000.0,
+                 error_rate: float = 0.0, seed: int = 0):
+        self.base_ms = base_ms
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.error_rate = error_rate
+        self.down = False
+        self.stall_once: set = set()
+        self.requests = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _plan(self, path: str) -> tuple[float, bool, bool]:
+        with self._lock:
+            self.requests += 1
+            slow = self._rng.random() < self.slow_rate
+            if path in self.stall_once:
+                self.stall_once.discard(path)
+                slow = True
+            fail = self._rng.random() < self.error_rate
+            return (self.slow_ms if slow else self.base_ms) / 1000, fail, self.down
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _serve(self):
+                delay, fail, down = stub._plan(self.path)
+                if down:
+                    self.close_connection = True
+                    self.connection.close()
+                    return
+                time.sleep(delay)
+                status = 500 if fail else 200
+                payload = (
+                    b"injected failure" if fail else
+                    f"<html><body><p>Content of {self.path}</p></body></html>".encode()
+                )
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self._serve()
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                self._serve()
+
+        return Handler
@@ -0,0 +1,149 @@
+"""
+research_tool against calling doc_search_tool then web_search_tool.
+
+Serves the web side from the local stub in benchmarks.singleflight and the
+documents from a synthetic store with hash embeddings plus a simulated
+embedding round trip. Checks that:
+
+- research_tool answers faster than the two tools run back to back;
+- with a web side slower than the budget, it returns the document results
+  and a partial-results note once the budget expires;
+- duplicate URLs and passages are merged.
+
+Exits non-zero if any expectation fails:
+
+    uv run python -m benchmarks.research --queries 20 --web-ms 300 --embed-ms 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+# hash embeddings score on their own scale; keep any deployment threshold off
+os.environ.setdefault("RETRIEVAL_SCORE_THRESHOLD", "0")
+
+import server
+from benchmarks.corpus import generate_corpus
+from benchmarks.fake_embeddings import HashEmbeddings
+from benchmarks.singleflight import StubWeb, make_clients
+from ingest import build_vector_store
+from langchain_core.documents import Document
+from research import research
+from utils import SearchResult
+
+
+class SlowEmbeddings(HashEmbeddings):
+    """Hash embeddings that take as long as a remote embedding call."""
+
+    def __init__(self, delay_ms: float):
+        super().__init__()
+        self.delay = delay_ms / 1000
+
+    def embed_query(self, text):
+        time.sleep(self.delay)
+        return super().embed_query(text)
+
+
+async def timed(coro) -> tuple[float, str]:
+    start = time.perf_counter()
+    answer = await coro
+    return (time.perf_counter() - start) * 1000, answer
+
+
+async def compare(queries: list[str]) -> dict:
+    sequential, combined = [], []
+    for i, query in enumerate(queries):
+        # distinct queries so no call is served from an in-flight duplicate
+        doc_ms, _ = await timed(server.doc_search_tool(f"{query} a{i}"))
+        web_ms, _ = await timed(server.web_search_tool(f"{query} a{i}"))
+        sequential.append(doc_ms + web_ms)
+        research_ms, answer = await timed(server.research_tool(f"{query} b{i}"))
+        combined.append(research_ms)
+    return {
+        "sequential_p50_ms": round(statistics.median(sequential), 1),
+        "research_tool_p50_ms": round(statistics.median(combined), 1),
+        "sample_has_both_sides": "[D1]" in answer and "[W1]" in answer,
+    }
+
+
+async def check_dedupe() -> dict:
+    docs = [Document(page_content="Plants turn light into sugar.", metadata={"source": "kb/a.txt", "page_title": "a"})]
+    results = [
+        SearchResult("One", "https://Example.com/page#top", "Photosynthesis basics", 1),
+        SearchResult("Two", "https://example.com/page", "Duplicate URL", 2),
+        SearchResult("Three", "https://other.example/", "plants turn  light into sugar.", 3),
+    ]
+
+    async def search_docs(query):
+        return docs
+
+    async def search_web(query, n):
+        return results
+
+    async def fetch_page(url):
+        return "Error: offline"
+
+    result = await research("photosynthesis", search_docs, search_web, fetch_page, budget=1.0)
+    kinds = [source.kind for source in result.sources]
+    return {"sources": kinds, "ok": kinds == ["doc", "web"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--web-ms", type=float, default=300, help="Stub web latency per request")
+    parser.add_argument("--embed-ms", type=float, default=200, help="Simulated query embedding latency")
+    parser.add_argument("--budget", type=float, default=1.0, help="Budget for the slow-web check")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="studymode-research-") as workdir:
+        bench_queries = generate_corpus(os.path.join(workdir, "kb"), 50, queries=args.queries)
+        build_vector_store(os.path.join(workdir, "kb"), persist_directory=os.path.join(workdir, "vs"),
+                           embeddings=HashEmbeddings())
+        server.PERSIST_DIR = os.path.join(workdir, "vs")
+        server._embeddings = SlowEmbeddings(args.embed_ms)
+        queries = [query.text for query in bench_queries]
+
+        stub = StubWeb(args.web_ms)
+        try:
+            server.searcher, server.fetcher = make_clients(stub, "research")
+            speed = asyncio.run(compare(queries))
+        finally:
+            stub.close()
+
+        slow_stub = StubWeb(args.budget * 3000)
+        try:
+            server.searcher, server.fetcher = make_clients(slow_stub, "research-slow")
+            server.RESEARCH_BUDGET_SECONDS = args.budget
+            slow_ms, answer = asyncio.run(timed(server.research_tool(queries[0])))
+        finally:
+            slow_stub.close()
+        slow = {
+            "latency_ms": round(slow_ms, 1),
+            "budget_ms": args.budget * 1000,
+            "has_documents": "[D1]" in answer,
+            "partial_note": "did not finish" in answer,
+        }
+
+    dedupe = asyncio.run(check_dedupe())
+    checks = {
+        "faster_than_sequential": speed["research_tool_p50_ms"] < speed["sequential_p50_ms"],
+        "both_sides_merged": speed["sample_has_both_sides"],
+        "partial_within_budget": slow_ms < args.budget * 1000 + 300 and slow["has_documents"] and slow["partial_note"],
+        "deduplicated": dedupe["ok"],
+    }
+    report = {"benchmark": "research", "params": vars(args), "speed": speed, "slow_web": slow,
+              "dedupe": dedupe, "checks": checks}
+    print(json.dumps(report, indent=2))
+    if not all(checks.values()):
+        print("[ERROR] Research expectations not met", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
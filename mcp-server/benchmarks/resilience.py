@@ -0,0 +1,269 @@
+"""
+Resilience checks against a local fault-injecting stub.
+
+- hedging: a few requests stall (take far longer than the rest) with and
+  without hedged second requests; hedging must cut the stalled requests'
+  latency while staying within the retry budget.
+- outage: the upstream fails every request; once the breaker opens, calls
+  must fail fast and a page fetched earlier must be served from the cache.
+- recovery: after the reset timeout, a healthy upstream closes the breaker.
+- cancelled_trial: a half-open trial call that is cancelled (as research_tool
+  cancels work at its deadline) must not leave the breaker stuck half-open.
+- deadline: with the upstream hanging, a call must give up at its deadline
+  and serve the cached page, instead of spending every attempt's timeout.
+- embeddings: with the embedding upstream down, doc_search falls back to
+  keyword search over the store.
+
+Exits non-zero if any expectation fails:
+
+    uv run python -m benchmarks.resilience
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+
+os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+
+from benchmarks.fault_stub import FaultStub
+from benchmarks.retrieval import percentile
+from resilience import CircuitBreaker, CircuitOpenError, Dependency
+from utils import RateLimiter, WebContentFetcher
+
+
+def make_fetcher(stub: FaultStub, **dependency_options) -> WebContentFetcher:
+    fetcher = WebContentFetcher()
+    fetcher.rate_limiter = RateLimiter(requests_per_minute=100_000)
+    host = stub.base_url.split("//")[1].split(":")[0]
+    fetcher.dependencies[host] = Dependency(f"web_fetch:{host}", **dependency_options)
+    return fetcher
+
+
+async def timed_fetches(fetcher: WebContentFetcher, urls: list[str], concurrency: int) -> tuple[list[float], list[str]]:
+    latencies: list[float] = []
+    answers: list[str] = []
+    pending = iter(urls)
+
+    async def worker():
+        for url in pending:
+            start = time.perf_counter()
+            answers.append(await fetcher.fetch_and_parse(url))
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, answers
+
+
+async def check_hedging(args: argparse.Namespace) -> dict:
+    # every 20th page stalls on its first request, after enough fast ones for a p95;
+    # requests run one at a time so client-side queueing does not blur the latencies
+    stalled = {i for i in range(40, args.requests, 20)}
+    results = {}
+    for hedge in (False, True):
+        stub = FaultStub(base_ms=20, slow_ms=800, seed=args.seed)
+        stub.stall_once = {f"/page/{i}" for i in stalled}
+        try:
+            fetcher = make_fetcher(stub, hedge=hedge, timeout=5.0)
+            urls = [f"{stub.base_url}/page/{i}" for i in range(args.requests)]
+            latencies, _ = await timed_fetches(fetcher, urls, 1)
+            slow = [latency for i, latency in enumerate(latencies) if i in stalled]
+            results["hedged" if hedge else "plain"] = {
+                "p50_ms": round(statistics.median(latencies), 1),
+                "p99_ms": round(percentile(latencies, 99), 1),
+                "stalled_max_ms": round(max(slow), 1),
+                "upstream_requests": stub.requests,
+            }
+        finally:
+            stub.close()
+
+    extra = results["hedged"]["upstream_requests"] - args.requests
+    return {
+        "check": "hedging",
+        "stalled_requests": len(stalled),
+        **results,
+        "ok": results["hedged"]["stalled_max_ms"] < 800 / 2 <= results["plain"]["stalled_max_ms"]
+              and extra <= max(3, 0.2 * args.requests) + 3,
+    }
+
+
+async def check_outage_and_recovery(args: argparse.Namespace) -> list[dict]:
+    stub = FaultStub(base_ms=20)
+    try:
+        breaker = CircuitBreaker(failure_threshold=5, reset_timeout=1.0)
+        fetcher = make_fetcher(stub, timeout=2.0, breaker=breaker)
+        cached_url = f"{stub.base_url}/lesson"
+        good = await fetcher.fetch_and_parse(cached_url)
+
+        stub.error_rate = 1.0
+        before = stub.requests
+        urls = [f"{stub.base_url}/other/{i}" for i in range(args.requests)]
+        latencies, _ = await timed_fetches(fetcher, urls, 1)
+        outage_requests = stub.requests - before
+        open_latencies = latencies[len(latencies) // 2:]
+        fallback = await fetcher.fetch_and_parse(cached_url)
+        outage = {
+            "check": "outage",
+            "breaker_state": breaker.state,
+            "upstream_requests": outage_requests,
+            "calls": len(urls),
+            "open_p50_ms": round(statistics.median(open_latencies), 3),
+            "served_cached": fallback == good,
+            "ok": breaker.state == "open"
+                  and outage_requests < len(urls)
+                  and statistics.median(open_latencies) < 5
+                  and fallback == good,
+        }
+
+        stub.error_rate = 0.0
+        await asyncio.sleep(breaker.reset_timeout + 0.1)
+        recovered = await fetcher.fetch_and_parse(f"{stub.base_url}/after")
+        recovery = {
+            "check": "recovery",
+            "breaker_state": breaker.state,
+            "ok": breaker.state == "closed" and not recovered.startswith("Error"),
+        }
+        return [outage, recovery]
+    finally:
+        stub.close()
+
+
+async def check_cancelled_trial(args: argparse.Namespace) -> dict:
+    stub = FaultStub(base_ms=20)
+    try:
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.2)
+        dependency = Dependency("cancelled_trial", timeout=5.0, max_attempts=1, breaker=breaker)
+        async with httpx.AsyncClient() as client:
+            async def get() -> str:
+                response = await client.get(f"{stub.base_url}/page")
+                response.raise_for_status()
+                return response.text
+
+            stub.error_rate = 1.0
+            try:
+                await dependency.call(get)
+            except httpx.HTTPStatusError:
+                pass
+            opened = breaker.state == "open"
+
+            # the upstream is healthy again but slow, and the trial's caller gives up
+            stub.error_rate, stub.base_ms = 0.0, 500
+            await asyncio.sleep(breaker.reset_timeout + 0.05)
+            trial = asyncio.ensure_future(dependency.call(get))
+            await asyncio.sleep(0.1)
+            trial.cancel()
+            try:
+                await trial
+            except asyncio.CancelledError:
+                pass
+
+            stub.base_ms = 20
+            try:
+                await dependency.call(get)
+                next_call = "ok"
+            except CircuitOpenError:
+                next_call = "circuit_open"
+        return {
+            "check": "cancelled_trial",
+            "opened": opened,
+            "next_call": next_call,
+            "breaker_state": breaker.state,
+            "ok": opened and next_call == "ok" and breaker.state == "closed",
+        }
+    finally:
+        stub.close()
+
+
+async def check_deadline(args: argparse.Namespace) -> dict:
+    results = {}
+    for deadline in (None, 1.0):
+        stub = FaultStub(base_ms=20)
+        try:
+            fetcher = make_fetcher(stub, timeout=0.6, max_attempts=4, backoff=0.05, deadline=deadline)
+            url = f"{stub.base_url}/lesson"
+            good = await fetcher.fetch_and_parse(url)
+            stub.base_ms = 5000  # hangs past every attempt's timeout
+            start = time.perf_counter()
+            answer = await fetcher.fetch_and_parse(url)
+            results["deadline" if deadline else "no_deadline"] = {
+                "seconds": round(time.perf_counter() - start, 2),
+                "served_cached": answer == good,
+            }
+        finally:
+            stub.close()
+    return {
+        "check": "deadline",
+        **results,
+        "ok": results["deadline"]["seconds"] < 1.0 + 0.3 < results["no_deadline"]["seconds"]
+              and results["deadline"]["served_cached"],
+    }
+
+
+def check_embeddings_fallback(args: argparse.Namespace) -> dict:
+    from benchmarks.corpus import generate_corpus
+    from benchmarks.fake_embeddings import HashEmbeddings
+    from benchmarks.stub_embeddings import StubEmbeddings
+    from embedding_broker import EmbeddingBroker
+    from ingest import build_vector_store
+    from retrieval import RetrievalConfig
+    import server
+
+    stub = FaultStub(base_ms=5)
+    stub.down = True
+    try:
+        with tempfile.TemporaryDirectory(prefix="studymode-resilience-") as workdir:
+            queries = generate_corpus(os.path.join(workdir, "kb"), 50, queries=20, seed=args.seed)
+            vector_store = build_vector_store(
+                os.path.join(workdir, "kb"), persist_directory=os.path.join(workdir, "vs"),
+                embeddings=HashEmbeddings(),
+            )
+            breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+            dependency = Dependency("gemini_embeddings", timeout=1.0, breaker=breaker)
+            # the store's query embeddings now come from an upstream that is down
+            vector_store._embedding_function = EmbeddingBroker(StubEmbeddings(f"{stub.base_url}/embed"), dependency=dependency)
+
+            hits = 0
+            latencies = []
+            for query in queries:
+                start = time.perf_counter()
+                docs = server.search_documents(vector_store, query.text, RetrievalConfig())
+                latencies.append((time.perf_counter() - start) * 1000)
+                if any(os.path.abspath(doc.metadata["source"]) == os.path.abspath(query.source) for doc in docs):
+                    hits += 1
+            return {
+                "check": "embeddings",
+                "breaker_state": breaker.state,
+                "keyword_recall_at_3": round(hits / len(queries), 3),
+                "open_p50_ms": round(statistics.median(latencies[len(latencies) // 2:]), 3),
+                "ok": breaker.state == "open" and hits > 0,
+            }
+    finally:
+        stub.close()
+
+
+async def run(args: argparse.Namespace) -> list[dict]:
+    return [await check_hedging(args), *await check_outage_and_recovery(args), await check_cancelled_trial(args),
+            await check_deadline(args)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per check")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    results.append(check_embeddings_fallback(args))
+    print(json.dumps({"benchmark": "resilience", "results": results}, indent=2))
+    if not all(result["ok"] for result in results):
+        print("[ERROR] Resilience expectations not met", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
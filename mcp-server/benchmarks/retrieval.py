@@ -0,0 +1,257 @@
+"""
+Offline retrieval and ingestion benchmark.
+
+Builds a vector store from synthetic corpora of several sizes with a
+deterministic hash embedding model, then measures ingest throughput, index
+size on disk, query latency, recall@k and tokens per query through the same
+code paths the server uses (build_vector_store and search_documents). The
+retrieval options default to plain top-k; pass --mmr-lambda, --score-threshold,
+--token-budget and --neighbors to evaluate adaptive retrieval settings
+(max_tokens_per_query shows whether neighbor windows stay within the budget).
+
+Off-topic queries (words that appear nowhere in the corpus) are run too:
+off_topic_empty_rate is how often doc_search_tool would correctly answer
+"No relevant documents found". threshold_sweep shows, for each candidate
+--score-threshold, the recall kept on real queries against that rate, which
+is how RetrievalConfig.score_threshold is calibrated. The hash embeddings
+score on a different scale from gemini-embedding-001; to calibrate for the
+real model, run against a real knowledge base with questions in JSONL
+({"query": "...", "source": "cells.md"}, source null for off-topic ones):
+
+    uv run python -m benchmarks.retrieval --sizes 100,1000 --output bench.json
+    uv run python -m benchmarks.retrieval --embeddings gemini --knowledge-base knowledge-base --questions questions.jsonl
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from dataclasses import replace
+from typing import List, Optional
+
+# server.py and ingest.py refuse to import without a key; no request is ever
+# made with it because the benchmark injects its own embedding model.
+os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+
+from benchmarks.corpus import BenchQuery, _make_vocabulary, generate_corpus
+from benchmarks.fake_embeddings import HashEmbeddings
+from retrieval import RetrievalConfig, estimate_tokens
+from server import search_documents
+from ingest import build_vector_store
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def off_topic_queries(count: int, seed: int) -> List[BenchQuery]:
+    """Six-word queries from a vocabulary of longer words the corpus never uses."""
+    import random
+
+    rng = random.Random(seed + 1)
+    vocabulary = [word + "q" * 10 for word in _make_vocabulary(rng, 200)]
+    return [BenchQuery(" ".join(rng.choice(vocabulary) for _ in range(6)), "") for _ in range(count)]
+
+
+def load_questions(path: str, knowledge_base: str) -> List[BenchQuery]:
+    """JSONL questions for a real knowledge base; a null source marks an off-topic question."""
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                source = os.path.join(knowledge_base, item["source"]) if item.get("source") else ""
+                questions.append(BenchQuery(item["query"], source))
+    return questions
+
+
+def make_embeddings(args: argparse.Namespace):
+    if args.embeddings == "gemini":
+        from server import get_embeddings
+
+        return get_embeddings()
+    return HashEmbeddings(dimensions=args.dimensions)
+
+
+def threshold_sweep(scored: List[tuple], thresholds: List[float]) -> List[dict]:
+    """
+    Recall and empty-result rates per threshold, from one unthresholded search per query.
+
+    scored holds (is_off_topic, [(relevance_score, is_expected_source), ...]).
+    Exact for plain top-k; with MMR the kept set is the same but its order may differ.
+    """
+    on_topic = [hits for off, hits in scored if not off]
+    off_topic = [hits for off, hits in scored if off]
+    sweep = []
+    for threshold in thresholds:
+        kept = lambda hits: [expected for score, expected in hits if score >= threshold]
+        sweep.append({
+            "score_threshold": threshold,
+            "recall": round(sum(any(kept(hits)) for hits in on_topic) / len(on_topic), 4) if on_topic else None,
+            "empty_result_rate": round(sum(not kept(hits) for hits in on_topic) / len(on_topic), 4) if on_topic else None,
+            "off_topic_empty_rate": round(sum(not kept(hits) for hits in off_topic) / len(off_topic), 4) if off_topic else None,
+        })
+    return sweep
+
+
+def is_source(doc, source: str) -> bool:
+    return bool(source) and os.path.abspath(doc.metadata.get("source", "")) == os.path.abspath(source)
+
+
+def run_size(num_documents: Optional[int], args: argparse.Namespace) -> dict:
+    embeddings = make_embeddings(args)
+    config = RetrievalConfig(
+        k=args.k,
+        fetch_k=max(args.fetch_k, args.k),
+        score_threshold=args.score_threshold,
+        mmr_lambda=args.mmr_lambda,
+        token_budget=args.token_budget,
+        neighbors=args.neighbors,
+    )
+
+    with tempfile.TemporaryDirectory(prefix="studymode-bench-") as workdir:
+        persist_dir = os.path.join(workdir, "vector_store")
+        if args.knowledge_base:
+            corpus_dir = args.knowledge_base
+            questions = load_questions(args.questions, args.knowledge_base)
+            queries = [query for query in questions if query.source]
+            off_topic = [query for query in questions if not query.source]
+        else:
+            corpus_dir = os.path.join(workdir, "knowledge-base")
+            queries = generate_corpus(
+                corpus_dir, num_documents, queries=args.queries, seed=args.seed
+            )
+            off_topic = off_topic_queries(args.off_topic, args.seed)
+
+        start = time.perf_counter()
+        vector_store = build_vector_store(
+            corpus_dir, persist_directory=persist_dir, embeddings=embeddings
+        )
+        ingest_seconds = time.perf_counter() - start
+        chunks = vector_store._collection.count()
+
+        # Reuse the store build_vector_store returned: Chroma allows one client
+        # per directory per process, and that one has its own settings.
+        reader = vector_store
+        # warm up the reader so the first query does not pay for index loading
+        search_documents(reader, queries[0].text, config)
+
+        latencies = []
+        hits = 0
+        empty = 0
+        tokens = 0
+        max_tokens = 0
+        for query in queries:
+            start = time.perf_counter()
+            docs = search_documents(reader, query.text, config)
+            latencies.append((time.perf_counter() - start) * 1000)
+            empty += 0 if docs else 1
+            query_tokens = sum(estimate_tokens(doc.page_content) for doc in docs)
+            tokens += query_tokens
+            max_tokens = max(max_tokens, query_tokens)
+            if any(is_source(doc, query.source) for doc in docs):
+                hits += 1
+        off_topic_empty = sum(not search_documents(reader, query.text, config) for query in off_topic)
+
+        unthresholded = replace(config, score_threshold=0.0)
+        scored = [
+            (not query.source, [(doc.metadata["relevance_score"], is_source(doc, query.source))
+                                for doc in search_documents(reader, query.text, unthresholded)])
+            for query in queries + off_topic
+        ]
+
+        return {
+            "documents": num_documents if num_documents is not None else len(os.listdir(corpus_dir)),
+            "chunks": chunks,
+            "ingest_seconds": round(ingest_seconds, 4),
+            "ingest_chunks_per_sec": round(chunks / ingest_seconds, 2) if ingest_seconds else None,
+            "index_bytes": directory_size(persist_dir),
+            "query_p50_ms": round(statistics.median(latencies), 3),
+            "query_p99_ms": round(percentile(latencies, 99), 3),
+            f"recall_at_{args.k}": round(hits / len(queries), 4),
+            "empty_result_rate": round(empty / len(queries), 4),
+            "off_topic_empty_rate": round(off_topic_empty / len(off_topic), 4) if off_topic else None,
+            "avg_tokens_per_query": round(tokens / len(queries), 1),
+            "max_tokens_per_query": max_tokens,
+            "threshold_sweep": threshold_sweep(scored, [float(t) for t in args.thresholds.split(",")]),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,1000,5000", help="Comma separated corpus sizes (documents)")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per corpus size")
+    parser.add_argument("--k", type=int, default=3, help="Number of chunks retrieved per query")
+    parser.add_argument("--fetch-k", type=int, default=12, help="Candidates considered for MMR")
+    parser.add_argument("--score-threshold", type=float, default=0.0, help="Minimum cosine similarity (0 disables)")
+    parser.add_argument("--mmr-lambda", type=float, default=1.0, help="MMR trade-off (1.0 = plain top-k)")
+    parser.add_argument("--token-budget", type=int, default=0, help="Token budget per query (0 disables)")
+    parser.add_argument("--neighbors", type=int, default=0, help="Adjacent chunks added on each side of a hit")
+    parser.add_argument("--dimensions", type=int, default=256, help="Fake embedding dimensions")
+    parser.add_argument("--off-topic", type=int, default=50, help="Off-topic queries per corpus size")
+    parser.add_argument("--thresholds", default="0.1,0.2,0.3,0.4,0.5,0.6,0.7,0.8",
+                        help="Comma separated score thresholds for threshold_sweep")
+    parser.add_argument("--embeddings", choices=("hash", "gemini"), default="hash",
+                        help="gemini calls gemini-embedding-001 (needs a real GEMINI_API_KEY)")
+    parser.add_argument("--knowledge-base", help="Real corpus directory instead of synthetic ones (needs --questions)")
+    parser.add_argument("--questions", help="JSONL questions for --knowledge-base")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout")
+    args = parser.parse_args()
+    if bool(args.knowledge_base) != bool(args.questions):
+        parser.error("--knowledge-base and --questions go together")
+
+    sizes = [None] if args.knowledge_base else [int(size) for size in args.sizes.split(",")]
+    results = [run_size(size, args) for size in sizes]
+    report = {
+        "benchmark": "retrieval",
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "params": {
+            "queries": args.queries,
+            "k": args.k,
+            "fetch_k": args.fetch_k,
+            "score_threshold": args.score_threshold,
+            "mmr_lambda": args.mmr_lambda,
+            "token_budget": args.token_budget,
+            "neighbors": args.neighbors,
+            "dimensions": args.dimensions,
+            "embeddings": args.embeddings,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+        print(f"[INFO] Wrote results to {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
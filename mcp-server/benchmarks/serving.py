@@ -0,0 +1,186 @@
+"""
+Multi-worker serving benchmark with a local load generator.
+
+Builds a synthetic store with the offline hash embeddings, then for each
+worker count starts the production serving mode (server.serve with the
+shared memory-mapped index), drives doc_search_tool over MCP streamable
+HTTP at a fixed concurrency and records throughput, latency percentiles and
+the proportional set size (PSS) of the whole process tree.
+
+    uv run python -m benchmarks.serving --workers 1,2,4 --output serving.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+
+import httpx
+
+from benchmarks.corpus import generate_corpus
+from benchmarks.fake_embeddings import HashEmbeddings
+from benchmarks.retrieval import git_revision, percentile
+from ingest import build_vector_store
+
+
+MCP_HEADERS = {
+    "Accept": "application/json, text/event-stream",
+    "Content-Type": "application/json",
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def process_tree_pss_kb(pid: int) -> int | None:
+    """Sum PSS over pid and its descendants (Linux only)."""
+    total = 0
+    pending = [pid]
+    try:
+        while pending:
+            current = pending.pop()
+            with open(f"/proc/{current}/smaps_rollup") as f:
+                for line in f:
+                    if line.startswith("Pss:"):
+                        total += int(line.split()[1])
+                        break
+            with open(f"/proc/{current}/task/{current}/children") as f:
+                pending.extend(int(child) for child in f.read().split())
+    except OSError:
+        return None
+    return total
+
+
+async def wait_ready(client: httpx.AsyncClient, base_url: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            response = await client.get(f"{base_url}/ready")
+            if response.status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise TimeoutError(f"{base_url} did not become ready")
+
+
+async def call_tool(client: httpx.AsyncClient, base_url: str, request_id: int, query: str) -> bool:
+    payload = {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "method": "tools/call",
+        "params": {"name": "doc_search_tool", "arguments": {"query": query}},
+    }
+    response = await client.post(f"{base_url}/mcp", json=payload, headers=MCP_HEADERS)
+    return response.status_code == 200 and '"result"' in response.text
+
+
+async def generate_load(base_url: str, queries: list[str], requests: int, concurrency: int) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async with httpx.AsyncClient(timeout=60.0) as client:
+        await wait_ready(client, base_url)
+
+        async def user():
+            nonlocal errors
+            for request_id in counter:
+                start = time.perf_counter()
+                try:
+                    ok = await call_tool(client, base_url, request_id, queries[request_id % len(queries)])
+                except httpx.HTTPError:
+                    ok = False
+                latencies.append((time.perf_counter() - start) * 1000)
+                errors += 0 if ok else 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": round(requests / elapsed, 2),
+        "latency_p50_ms": round(statistics.median(latencies), 2),
+        "latency_p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+
+def run_workers(workers: int, persist_dir: str, queries: list[str], args: argparse.Namespace) -> dict:
+    port = free_port()
+    env = dict(os.environ)
+    env["BENCH_DIMENSIONS"] = str(args.dimensions)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.serving_app", "--port", str(port),
+         "--workers", str(workers), "--persist-dir", persist_dir],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        result = asyncio.run(generate_load(f"http://127.0.0.1:{port}", queries, args.requests, args.concurrency))
+        result["pss_kb"] = process_tree_pss_kb(process.pid)
+    finally:
+        process.terminate()
+        process.wait(timeout=60)
+    return {"workers": workers, **result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="Comma separated worker counts")
+    parser.add_argument("--documents", type=int, default=2000, help="Synthetic corpus size")
+    parser.add_argument("--requests", type=int, default=2000, help="Tool calls per worker count")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent simulated clients")
+    parser.add_argument("--dimensions", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="studymode-serving-") as workdir:
+        corpus_dir = os.path.join(workdir, "knowledge-base")
+        persist_dir = os.path.join(workdir, "vector_store")
+        bench_queries = generate_corpus(corpus_dir, args.documents, queries=500, seed=args.seed)
+        build_vector_store(corpus_dir, persist_directory=persist_dir,
+                           embeddings=HashEmbeddings(dimensions=args.dimensions))
+        queries = [query.text for query in bench_queries]
+
+        results = [run_workers(int(n), persist_dir, queries, args) for n in args.workers.split(",")]
+
+    report = {
+        "benchmark": "serving",
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "params": {
+            "documents": args.documents,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "dimensions": args.dimensions,
+        },
+        "results": results,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+        print(f"[INFO] Wrote results to {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
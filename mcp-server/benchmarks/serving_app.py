@@ -0,0 +1,53 @@
+"""
+server.mcp_app wired to the offline hash embeddings, for benchmarks.serving.
+
+Every uvicorn worker imports this module, so each one swaps in the fake
+embedding model before the first tool call. With --documents it first fills
+an empty persist directory with a synthetic corpus, for load tests that
+only need a realistic server (e.g. frontend/benchmarks/agent_load.py).
+"""
+import argparse
+import os
+
+os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+# hash embeddings score on their own scale; keep any deployment threshold off
+os.environ.setdefault("RETRIEVAL_SCORE_THRESHOLD", "0")
+
+import server
+from benchmarks.fake_embeddings import HashEmbeddings
+
+server._embeddings = HashEmbeddings(dimensions=int(os.getenv("BENCH_DIMENSIONS", "256")))
+app = server.mcp_app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--persist-dir", required=True)
+    parser.add_argument("--documents", type=int, default=0,
+                        help="Build a synthetic store of this many documents if none is published yet")
+    args = parser.parse_args()
+
+    if args.documents:
+        import tempfile
+
+        from benchmarks.corpus import generate_corpus
+        from ingest import build_vector_store
+        from snapshots import SnapshotStore, close_chroma
+
+        snapshots = SnapshotStore(args.persist_dir)
+        if snapshots.current() is None:
+            with tempfile.TemporaryDirectory(prefix="studymode-corpus-") as corpus_dir:
+                generate_corpus(corpus_dir, args.documents, queries=1)
+                build_vector_store(corpus_dir, persist_directory=args.persist_dir, embeddings=server._embeddings)
+            close_chroma(snapshots.version_path(snapshots.current()))
+
+    server.PERSIST_DIR = args.persist_dir
+    server.serve(
+        "benchmarks.serving_app:app",
+        host="127.0.0.1",
+        port=args.port,
+        workers=args.workers,
+        shared_index=True,
+    )
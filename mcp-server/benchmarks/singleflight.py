@@ -0,0 +1,162 @@
+"""
+Stress check for single-flight web search and page fetch.
+
+Starts a local stub that serves a DuckDuckGo-style results page and a slow
+article page, then fires N concurrent identical web searches (search + fetch,
+like web_search_tool). It also runs an error case, where the page answers
+500, and a cancellation case, where half the callers are cancelled mid-flight.
+Each case must produce exactly one upstream request per distinct query and
+URL, and every remaining caller must get the same answer. The exit code is 1
+otherwise, so this can run in CI:
+
+    uv run python -m benchmarks.singleflight --callers 200
+"""
+import argparse
+import asyncio
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from resilience import Dependency
+from utils import DuckDuckGoSearcher, RateLimiter, WebContentFetcher
+
+
+class StubWeb:
+    """Counts requests per path; every response is delayed so callers overlap."""
+
+    def __init__(self, delay_ms: float):
+        self.delay = delay_ms / 1000
+        self.hits: Counter = Counter()
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status: int, body: str):
+                payload = body.encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with stub._lock:
+                    stub.hits[("POST", self.path)] += 1
+                time.sleep(stub.delay)
+                # the query picks which article the single result links to
+                article = "broken" if "broken" in self.headers.get("X-Bench-Case", "") else "article"
+                self._reply(200, (
+                    '<div class="result"><h2 class="result__title">'
+                    f'<a href="{stub.base_url}/{article}">Photosynthesis</a></h2>'
+                    '<a class="result__snippet">How plants make food</a></div>'
+                ))
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.hits[("GET", self.path)] += 1
+                time.sleep(stub.delay)
+                if self.path == "/broken":
+                    self._reply(500, "upstream failure")
+                else:
+                    self._reply(200, "<html><body><p>Plants turn light into sugar.</p></body></html>")
+
+        return Handler
+
+
+async def web_search(searcher: DuckDuckGoSearcher, fetcher: WebContentFetcher, query: str) -> str:
+    results = await searcher.search(query, 1)
+    return await fetcher.fetch_and_parse(results[0].link)
+
+
+def make_clients(stub: StubWeb, case: str) -> tuple[DuckDuckGoSearcher, WebContentFetcher]:
+    searcher = DuckDuckGoSearcher()
+    searcher.BASE_URL = f"{stub.base_url}/html"
+    searcher.HEADERS = {**DuckDuckGoSearcher.HEADERS, "X-Bench-Case": case}
+    fetcher = WebContentFetcher()
+    # keep the stress run from being throttled by the per-minute limits
+    searcher.rate_limiter = RateLimiter(requests_per_minute=10_000)
+    fetcher.rate_limiter = RateLimiter(requests_per_minute=10_000)
+    # no retries: each logical call is one upstream request, so the counts
+    # measure coalescing alone (retries are covered by benchmarks.resilience)
+    searcher.dependency = Dependency("duckduckgo", timeout=10.0, max_attempts=1)
+    host = stub.base_url.split("//")[1].split(":")[0]
+    fetcher.dependencies[host] = Dependency(f"web_fetch:{host}", timeout=10.0, max_attempts=1)
+    return searcher, fetcher
+
+
+async def run_case(case: str, callers: int, delay_ms: float) -> dict:
+    stub = StubWeb(delay_ms)
+    try:
+        searcher, fetcher = make_clients(stub, case)
+        # spacing and case differences must still share one request
+        queries = ["What is photosynthesis", "  what is PHOTOSYNTHESIS "]
+        tasks = [
+            asyncio.create_task(web_search(searcher, fetcher, queries[i % 2]))
+            for i in range(callers)
+        ]
+        cancelled = []
+        if case == "cancel":
+            await asyncio.sleep(delay_ms / 2000)
+            cancelled = tasks[::2]
+            for task in cancelled:
+                task.cancel()
+        outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+        answers = {
+            repr(outcome) for task, outcome in zip(tasks, outcomes) if task not in cancelled
+        }
+        return {
+            "case": case,
+            "callers": callers,
+            "cancelled": len(cancelled),
+            "upstream_requests": {f"{method} {path}": count for (method, path), count in stub.hits.items()},
+            "distinct_answers": len(answers),
+            "in_flight_after": searcher.single_flight.in_flight() + fetcher.single_flight.in_flight(),
+            "ok": all(count == 1 for count in stub.hits.values())
+                  and len(stub.hits) == 2
+                  and len(answers) == 1
+                  and searcher.single_flight.in_flight() + fetcher.single_flight.in_flight() == 0,
+        }
+    finally:
+        stub.close()
+
+
+async def run(args: argparse.Namespace) -> list[dict]:
+    return [await run_case(case, args.callers, args.delay_ms) for case in ("success", "broken", "cancel")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--callers", type=int, default=200, help="Concurrent identical web searches")
+    parser.add_argument("--delay-ms", type=float, default=300.0, help="Stub response delay")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(json.dumps({"benchmark": "singleflight", "results": results}, indent=2))
+    if not all(result["ok"] for result in results):
+        print("[ERROR] Concurrent identical calls were not coalesced into one request", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Snapshot publishing under concurrent writers and hot-reloading readers.
+
+Writer processes append chunks the way the frontend upload path does (one
+new snapshot per batch, under the single-writer lock) while reader
+processes search through server.py's reload path. Checks that:
+
+- every version a reader opened holds exactly the chunk count its writer
+  published, i.e. no reader ever saw a partially written index;
+- no appended chunk was lost between concurrent writers;
+- readers hot-reload to the final version without a restart, while a
+  second thread in each reader searches concurrently;
+- a version leased by a reader survives garbage collection, and is
+  collected once released;
+- a version the server still held when a newer one was published is
+  collected as soon as the server releases it, without another write.
+
+Exits non-zero if any expectation fails:
+
+    uv run python -m benchmarks.snapshots --writers 3 --writes 5 --readers 2
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+
+from benchmarks.corpus import generate_corpus
+from benchmarks.fake_embeddings import HashEmbeddings
+from snapshots import VERSIONS_DIR, SnapshotStore, close_chroma
+
+
+def write_batches(root: str, writer: int, writes: int, chunks_per_write: int, results):
+    """Append batches of chunks, each as its own snapshot, and report (version, count) pairs."""
+    from chromadb.config import Settings
+    from langchain_chroma import Chroma
+
+    embeddings = HashEmbeddings()
+    snapshots = SnapshotStore(root)
+    published = []
+    for write in range(writes):
+        texts = [f"writer {writer} batch {write} note {i} about snapshot isolation" for i in range(chunks_per_write)]
+        ids = [f"w{writer}-b{write}:{i}" for i in range(chunks_per_write)]
+        vectors = embeddings.embed_documents(texts)
+        with snapshots.write() as version_dir:
+            vector_store = Chroma(
+                persist_directory=version_dir,
+                embedding_function=embeddings,
+                collection_name="study_documents",
+                client_settings=Settings(anonymized_telemetry=False),
+            )
+            try:
+                vector_store._collection.upsert(ids=ids, embeddings=vectors, documents=texts,
+                                                metadatas=[{"source": f"writer-{writer}"}] * len(texts))
+                count = vector_store._collection.count()
+            finally:
+                close_chroma(version_dir)
+        published.append((os.path.basename(version_dir), count))
+    results.put(("writer", published))
+
+
+def read_continuously(root: str, stop, results):
+    """Search through server.py's snapshot reload path until told to stop."""
+    import server
+
+    server.PERSIST_DIR = root
+    server._embeddings = HashEmbeddings()
+    observed: dict[str, int] = {}
+    errors = []
+    searches = 0
+
+    def search_alongside():
+        # searches racing the reloads below must never get a closed generation
+        while not stop.is_set():
+            try:
+                with server.vector_store_in_use() as vector_store:
+                    server.search_documents(vector_store, "snapshot reload race")
+            except Exception as e:
+                errors.append(f"concurrent search: {e!r}")
+
+    server.get_vector_store()
+    searcher = threading.Thread(target=search_alongside)
+    searcher.start()
+    while not stop.is_set():
+        try:
+            server.reload_vector_store()
+            with server.vector_store_in_use() as vector_store:
+                count = vector_store._collection.count()
+                version = server._generation.lease.version
+                server.search_documents(vector_store, "snapshot isolation note")
+            if observed.setdefault(version, count) != count:
+                errors.append(f"{version} changed from {observed[version]} to {count} chunks")
+            searches += 1
+        except Exception as e:
+            errors.append(repr(e))
+        time.sleep(0.01)
+    searcher.join()
+    # one last poll: the final version must be picked up without a restart
+    server.reload_vector_store()
+    final = server._generation.lease.version
+    server._generation.retire()
+    results.put(("reader", {"observed": observed, "errors": errors, "searches": searches, "final": final}))
+
+
+def check_release_collects(root: str) -> bool:
+    """The server holds the current version across a publish, then reloads: the old one must go right away."""
+    import server
+
+    server.PERSIST_DIR = root
+    server._embeddings = HashEmbeddings()
+    server.get_vector_store()
+    held = server._generation.lease.version
+    with SnapshotStore(root).write() as version_dir:
+        close_chroma(version_dir)
+    kept = held in os.listdir(os.path.join(root, VERSIONS_DIR))
+    server.reload_vector_store()
+    remaining = sorted(os.listdir(os.path.join(root, VERSIONS_DIR)))
+    server._generation.retire()
+    return kept and remaining == [SnapshotStore(root).current()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=3)
+    parser.add_argument("--writes", type=int, default=5, help="Snapshots published per writer")
+    parser.add_argument("--chunks", type=int, default=20, help="Chunks appended per snapshot")
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--documents", type=int, default=50, help="Initial synthetic corpus size")
+    args = parser.parse_args()
+
+    from ingest import build_vector_store
+
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory(prefix="studymode-snapshots-") as workdir:
+        root = os.path.join(workdir, "vector_store")
+        generate_corpus(os.path.join(workdir, "kb"), args.documents, queries=1)
+        initial_store = build_vector_store(os.path.join(workdir, "kb"), persist_directory=root, embeddings=HashEmbeddings())
+        initial_count = initial_store._collection.count()
+        snapshots = SnapshotStore(root)
+        first_version = snapshots.current()
+        close_chroma(snapshots.version_path(first_version))
+
+        # Hold the initial version like a long-running reader would
+        held = snapshots.acquire()
+
+        results = context.Queue()
+        stop = context.Event()
+        readers = [context.Process(target=read_continuously, args=(root, stop, results)) for _ in range(args.readers)]
+        writers = [
+            context.Process(target=write_batches, args=(root, writer, args.writes, args.chunks, results))
+            for writer in range(args.writers)
+        ]
+        start = time.perf_counter()
+        for process in readers + writers:
+            process.start()
+        for process in writers:
+            process.join()
+        write_seconds = time.perf_counter() - start
+        time.sleep(0.5)
+        stop.set()
+
+        published: dict[str, int] = {}
+        reader_results = []
+        for _ in range(len(readers) + len(writers)):
+            kind, payload = results.get(timeout=120)
+            if kind == "writer":
+                published.update(payload)
+            else:
+                reader_results.append(payload)
+        for process in readers:
+            process.join()
+
+        final_version = snapshots.current()
+        held_survived = os.path.isdir(held.path)
+        held.release()
+        snapshots.collect_garbage()
+        remaining = sorted(os.listdir(os.path.join(root, VERSIONS_DIR)))
+
+        expected_final = initial_count + args.writers * args.writes * args.chunks
+        published[first_version] = initial_count
+        mismatches = [
+            f"{version}: read {count}, published {published.get(version)}"
+            for reader in reader_results for version, count in reader["observed"].items()
+            if published.get(version) != count
+        ]
+        checks = {
+            "consistent_reads": not mismatches and not any(reader["errors"] for reader in reader_results),
+            "no_lost_writes": published[final_version] == expected_final,
+            "readers_reloaded": all(reader["final"] == final_version for reader in reader_results),
+            "leased_version_kept": held_survived,
+            "garbage_collected": remaining == [final_version],
+            "collected_on_release": check_release_collects(root),
+        }
+        report = {
+            "benchmark": "snapshots",
+            "params": vars(args),
+            "snapshots_published": len(published) - 1,
+            "write_seconds": round(write_seconds, 2),
+            "final_chunks": published[final_version],
+            "expected_chunks": expected_final,
+            "reader_searches": sum(reader["searches"] for reader in reader_results),
+            "versions_seen_by_readers": len({v for reader in reader_results for v in reader["observed"]}),
+            "reader_errors": [e for reader in reader_results for e in reader["errors"]][:5] + mismatches[:5],
+            "checks": checks,
+        }
+    print(json.dumps(report, indent=2))
+    if not all(checks.values()):
+        print("[ERROR] Snapshot expectations not met", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
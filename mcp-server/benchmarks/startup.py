@@ -0,0 +1,105 @@
+"""
+Import-time profile of the serving entry point.
+
+Imports server.py in a fresh interpreter with ``-X importtime``, reports the
+slowest top-level imports and fails (exit code 1) if any ingestion-only or
+lazily loaded dependency is imported at startup, or if the total import time
+exceeds the budget. Run it in CI to catch startup regressions:
+
+    uv run python -m benchmarks.startup --budget-ms 1500
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Modules that must only load on first use (or never, for ingestion code)
+LAZY_MODULES = [
+    "langchain_chroma",
+    "chromadb",
+    "langchain_google_genai",
+    "langchain_community",
+    "langchain_text_splitters",
+    "bs4",
+    "ingest",
+    "snapshots",
+    "retrieval",
+    "research",
+    "shared_index",
+    "embedding_broker",
+    "lexical_index",
+]
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def profile_imports(module: str = "server") -> list[dict]:
+    env = dict(os.environ)
+    env.setdefault("GEMINI_API_KEY", "offline-benchmark")
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SERVER_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    entries = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # nesting is shown as two extra spaces per level after the separator
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append({
+            "module": name.strip(),
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+            "depth": depth,
+        })
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=None, help="Fail if importing server takes longer than this")
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest direct imports of server.py to report")
+    args = parser.parse_args()
+
+    entries = profile_imports()
+    # -X importtime prints children before their parent, so the direct
+    # imports of server.py are the depth 1 lines just above its own line.
+    server_at = max(i for i, entry in enumerate(entries) if entry["module"] == "server" and entry["depth"] == 0)
+    first = server_at
+    while first > 0 and entries[first - 1]["depth"] > 0:
+        first -= 1
+    direct = [entry for entry in entries[first:server_at] if entry["depth"] == 1]
+    total_ms = entries[server_at]["cumulative_ms"]
+    imported = {entry["module"] for entry in entries}
+    eager = sorted(
+        name for name in imported
+        if any(name == lazy or name.startswith(lazy + ".") for lazy in LAZY_MODULES)
+    )
+
+    report = {
+        "benchmark": "startup",
+        "total_import_ms": round(total_ms, 1),
+        "slowest": sorted(direct, key=lambda e: e["cumulative_ms"], reverse=True)[:args.top],
+        "eager_heavy_imports": eager,
+    }
+    print(json.dumps(report, indent=2))
+
+    failed = False
+    if eager:
+        print(f"[ERROR] Heavy modules imported at startup: {', '.join(eager)}", file=sys.stderr)
+        failed = True
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        print(f"[ERROR] Import time {total_ms:.0f}ms exceeds budget {args.budget_ms:.0f}ms", file=sys.stderr)
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
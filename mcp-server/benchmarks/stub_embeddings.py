@@ -0,0 +1,94 @@
+"""
+Local stand-in for a batched embedding API.
+
+StubEmbeddingServer serves POST /embed on 127.0.0.1 with a fixed per-request
+overhead, a small per-text cost and a cap on concurrent requests (beyond
+which it answers 429, like a rate-limited provider). StubEmbeddings is the
+matching LangChain client.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+import httpx
+from langchain_core.embeddings import Embeddings
+
+from benchmarks.fake_embeddings import HashEmbeddings
+
+
+class StubEmbeddingServer:
+    def __init__(self, request_overhead_ms: float = 40.0, per_text_ms: float = 0.2,
+                 max_concurrent: int = 8, dimensions: int = 256):
+        self.request_overhead = request_overhead_ms / 1000
+        self.per_text = per_text_ms / 1000
+        self.max_concurrent = max_concurrent
+        self.model = HashEmbeddings(dimensions=dimensions)
+        self.requests = 0
+        self.rejected = 0
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/embed"
+
+    def __enter__(self) -> "StubEmbeddingServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with stub._lock:
+                    stub.requests += 1
+                if not stub._slots.acquire(blocking=False):
+                    with stub._lock:
+                        stub.rejected += 1
+                    self.send_response(429)
+                    self.end_headers()
+                    return
+                try:
+                    texts = body["texts"]
+                    time.sleep(stub.request_overhead + stub.per_text * len(texts))
+                    payload = json.dumps({"embeddings": stub.model.embed_documents(texts)}).encode()
+                finally:
+                    stub._slots.release()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        return Handler
+
+
+class StubEmbeddings(Embeddings):
+    """HTTP client for StubEmbeddingServer, with Gemini's task_type keyword."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self._client = httpx.Client(timeout=30.0)
+
+    def embed_documents(self, texts: List[str], task_type: Optional[str] = None) -> List[List[float]]:
+        response = self._client.post(self.url, json={"texts": texts, "task_type": task_type})
+        response.raise_for_status()
+        return response.json()["embeddings"]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text], task_type="RETRIEVAL_QUERY")[0]
@@ -0,0 +1,215 @@
+"""
+In-process micro-batching for embedding calls.
+
+Concurrent doc_search_tool queries and ingestion batches each used to call
+the embedding API on their own. EmbeddingBroker wraps the real embeddings
+client, collects requests for a few milliseconds (or until max_batch_size
+texts are waiting), sends them as one batched call and fans the vectors back
+out to the waiting callers. Queries are always batched before documents, and
+the queue is bounded per priority.
+
+frontend/embedding_broker.py is a copy for the upload path; keep them in sync (benchmarks.copies checks).
+"""
+import asyncio
+import inspect
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+
+QUERY = 0     # interactive retrieval, served first
+DOCUMENT = 1  # bulk ingestion
+
+
+class EmbeddingQueueFull(RuntimeError):
+    """Raised when an interactive query arrives and the query queue is full."""
+
+
+class _Request:
+    def __init__(self, size: int):
+        self.vectors: List[Optional[List[float]]] = [None] * size
+        self.remaining = size
+        self.future: Future = Future()
+        # a large request can be split over batches finished by different threads
+        self._lock = threading.Lock()
+
+    def resolve(self, index: int, vector: List[float]):
+        with self._lock:
+            self.vectors[index] = vector
+            self.remaining -= 1
+            done = self.remaining == 0
+        if done and not self.future.done():
+            self.future.set_result(self.vectors)
+
+    def fail(self, error: BaseException):
+        if not self.future.done():
+            self.future.set_exception(error)
+
+
+class EmbeddingBroker(Embeddings):
+    """
+    Embeddings wrapper that coalesces concurrent calls into batches.
+
+    Args:
+        inner: The real embeddings client (e.g. GoogleGenerativeAIEmbeddings)
+        max_batch_size: Most texts sent in one upstream call
+        max_wait_ms: How long the first request in a batch waits for company
+        max_queue: Most texts waiting per priority. Queries beyond it fail
+            with EmbeddingQueueFull; document callers block until there is room.
+        concurrency: Upstream batch calls allowed in flight at once
+        dependency: Optional resilience policy every upstream call runs under:
+            any object with call_sync(fn). The MCP server passes its
+            resilience.Dependency (circuit breaker and retry budget); the
+            upload path has none.
+    """
+
+    def __init__(
+        self,
+        inner: Embeddings,
+        max_batch_size: int = 100,
+        max_wait_ms: float = 5.0,
+        max_queue: int = 2000,
+        concurrency: int = 2,
+        dependency=None,
+    ):
+        self.inner = inner
+        self.dependency = dependency
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue = max_queue
+        self.concurrency = concurrency
+        self._queues: dict[int, deque] = {QUERY: deque(), DOCUMENT: deque()}
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._closed = False
+        # Gemini distinguishes query and document embeddings by task type
+        self._has_task_type = "task_type" in inspect.signature(inner.embed_documents).parameters
+
+    @classmethod
+    def from_env(cls, inner: Embeddings, dependency=None) -> "EmbeddingBroker":
+        """Build a broker configured by EMBEDDING_* environment variables."""
+        return cls(
+            inner,
+            dependency=dependency,
+            max_batch_size=int(os.getenv("EMBEDDING_MAX_BATCH", "100")),
+            max_wait_ms=float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5")),
+            max_queue=int(os.getenv("EMBEDDING_MAX_QUEUE", "2000")),
+            concurrency=int(os.getenv("EMBEDDING_CONCURRENCY", "2")),
+        )
+
+    # Embeddings interface
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.submit(DOCUMENT, texts).result()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.submit(QUERY, [text]).result()[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        # submit() can block on a full document queue, so keep it off the loop
+        future = await asyncio.to_thread(self.submit, DOCUMENT, texts)
+        return await asyncio.wrap_future(future)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await asyncio.wrap_future(self.submit(QUERY, [text])))[0]
+
+    # Broker
+
+    def submit(self, priority: int, texts: List[str]) -> Future:
+        """Queue texts and return a Future of their vectors, in order."""
+        request = _Request(len(texts))
+        if not texts:
+            request.future.set_result([])
+            return request.future
+
+        queue = self._queues[priority]
+        with self._cond:
+            self._ensure_started()
+            if priority == QUERY and len(queue) + len(texts) > self.max_queue:
+                raise EmbeddingQueueFull(f"{len(queue)} queries already waiting for embeddings")
+            for index, text in enumerate(texts):
+                while len(queue) >= self.max_queue:
+                    self._cond.wait()
+                queue.append((request, index, text))
+                self._cond.notify_all()
+        return request.future
+
+    def close(self):
+        """Stop the batching threads once the queues are drained."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+    def _ensure_started(self):
+        if not self._threads:
+            for i in range(self.concurrency):
+                thread = threading.Thread(target=self._run, name=f"embedding-broker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _next_batch(self) -> Optional[tuple[int, list]]:
+        """Wait for a batch to fill (or its window to expire) and take it off the queue."""
+        with self._cond:
+            while True:
+                while not self._queues[QUERY] and not self._queues[DOCUMENT]:
+                    if self._closed:
+                        return None
+                    self._cond.wait()
+
+                priority = QUERY if self._queues[QUERY] else DOCUMENT
+                queue = self._queues[priority]
+                deadline = time.monotonic() + self.max_wait
+                preempted = False
+                while len(queue) < self.max_batch_size and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                    if priority == DOCUMENT and self._queues[QUERY]:
+                        preempted = True
+                        break
+                if preempted:
+                    continue
+                if not queue:
+                    # another batching thread took these items
+                    continue
+
+                batch = [queue.popleft() for _ in range(min(self.max_batch_size, len(queue)))]
+                self._cond.notify_all()
+                return priority, batch
+
+    def _embed(self, priority: int, texts: List[str]) -> List[List[float]]:
+        if self.dependency is not None:
+            return self.dependency.call_sync(lambda: self._embed_once(priority, texts))
+        return self._embed_once(priority, texts)
+
+    def _embed_once(self, priority: int, texts: List[str]) -> List[List[float]]:
+        if priority == QUERY:
+            if self._has_task_type:
+                return self.inner.embed_documents(texts, task_type="RETRIEVAL_QUERY")
+            return [self.inner.embed_query(text) for text in texts]
+        return self.inner.embed_documents(texts)
+
+    def _run(self):
+        while True:
+            next_batch = self._next_batch()
+            if next_batch is None:
+                return
+            priority, batch = next_batch
+            try:
+                vectors = self._embed(priority, [text for _, _, text in batch])
+                if len(vectors) != len(batch):
+                    raise RuntimeError(f"Expected {len(batch)} embeddings, got {len(vectors)}")
+            except Exception as e:
+                for request, _, _ in batch:
+                    request.fail(e)
+                continue
+            for (request, index, _), vector in zip(batch, vectors):
+                request.resolve(index, vector)
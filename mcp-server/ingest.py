@@ -0,0 +1,128 @@
+"""
+Offline ingestion: builds the knowledge base vector store.
+
+Kept out of utils.py so the serving path never imports the document loaders
+and text splitters.
+"""
+import hashlib
+import os, glob
+from typing import Any, List, Optional
+
+from chromadb.config import Settings
+from dotenv import load_dotenv
+from langchain_community.document_loaders import TextLoader, DirectoryLoader
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from langchain_chroma import Chroma
+
+from embedding_broker import EmbeddingBroker
+from retrieval import chunk_id
+from snapshots import SnapshotStore, close_chroma
+
+
+load_dotenv()
+
+gemini_api_key = os.getenv("GEMINI_API_KEY")
+if not gemini_api_key:
+    raise ValueError("GEMINI_API_KEY is not set")
+
+
+COLLECTION_NAME = "study_documents"
+
+
+def assign_chunk_positions(chunks: List[Any]) -> List[str]:
+    """
+    Record each chunk's document id and ordinal and return its vector store id.
+
+    The id scheme doc_id:chunk_index plus chunk_count in the metadata is the
+    adjacency index: chunk i's neighbors are doc_id:i-1 and doc_id:i+1.
+    Chunks must be in document order and carry the "doc_id" (see
+    document_id()) that the splitter copied from their source document.
+    """
+    counts: dict[str, int] = {}
+    for chunk in chunks:
+        doc_id = chunk.metadata["doc_id"]
+        chunk.metadata["chunk_index"] = counts.get(doc_id, 0)
+        counts[doc_id] = counts.get(doc_id, 0) + 1
+    for chunk in chunks:
+        chunk.metadata["chunk_count"] = counts[chunk.metadata["doc_id"]]
+    return [chunk_id(chunk.metadata["doc_id"], chunk.metadata["chunk_index"]) for chunk in chunks]
+
+
+def document_id(source: str, text: str) -> str:
+    """Stable id for a document version: same source and content, same id."""
+    return hashlib.md5(f"{source}\0{text}".encode()).hexdigest()[:16]
+
+
+def build_vector_store(
+    input_dir: str = "knowledge-base/",
+    persist_directory: Optional[str] = None,
+    embeddings: Optional[Any] = None,
+):
+    """
+    Load every .txt file under input_dir, split it into chunks and publish
+    them as a new snapshot of the store. Returns the published store, opened
+    for reading.
+
+    The new version replaces the current one atomically; running servers
+    switch to it on their next poll (see snapshots.py).
+
+    Args:
+        input_dir: Glob of knowledge base folders to ingest
+        persist_directory: Snapshot root (default: $VECTOR_STORE_DIR or ../vector_store,
+            the directory the server and frontend use)
+        embeddings: Embedding model to use (default: Gemini embeddings)
+    """
+    # load docs
+    documents = []
+    folders = glob.glob(input_dir)
+    for folder in folders:
+        docs_loader = DirectoryLoader(folder, glob="**/*.txt", loader_cls=TextLoader, loader_kwargs={"encoding": "utf-8"})
+        docs_folder = docs_loader.load()
+        for doc in docs_folder:
+            file_name = os.path.basename(doc.metadata["source"])
+            doc.metadata["page_title"] = os.path.splitext(file_name)[0]
+            doc.metadata["doc_id"] = document_id(doc.metadata["source"], doc.page_content)
+            documents.append(doc)
+
+    print(f"[INFO] Loaded {len(documents)} documents")
+
+    # split
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=900, chunk_overlap=100, add_start_index=True)
+    chunks = text_splitter.split_documents(documents)
+    ids = assign_chunk_positions(chunks)
+
+    if embeddings is None:
+        embeddings = EmbeddingBroker.from_env(GoogleGenerativeAIEmbeddings(
+            model="models/gemini-embedding-001",
+            google_api_key=gemini_api_key
+        ))
+
+    ds_name = persist_directory or os.getenv("VECTOR_STORE_DIR", os.path.join("..", "vector_store"))
+
+    with SnapshotStore(ds_name).write(copy_current=False) as version_dir:
+        try:
+            vector_store = Chroma.from_documents(
+                documents=chunks,
+                embedding=embeddings,
+                ids=ids,
+                persist_directory=version_dir,
+                collection_name=COLLECTION_NAME,
+                client_settings=Settings(anonymized_telemetry=False)
+            )
+            count = vector_store._collection.count()
+        finally:
+            # flush and release the files before the version is published
+            close_chroma(version_dir)
+    print(f"Vector store created with {count} chunks")
+    # reopened from the published files for callers that search it right away
+    return Chroma(
+        persist_directory=version_dir,
+        embedding_function=embeddings,
+        collection_name=COLLECTION_NAME,
+        client_settings=Settings(anonymized_telemetry=False)
+    )
+
+
+if __name__ == "__main__":
+    build_vector_store()
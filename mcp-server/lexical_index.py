@@ -0,0 +1,66 @@
+"""
+Keyword (BM25) search over the chunks in the vector store.
+
+Used by doc_search_tool when the embeddings API is unavailable: it needs no
+embedding call, so the tool can still answer from the knowledge base while
+the Gemini breaker is open.
+"""
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Any, List
+
+from langchain_core.documents import Document
+
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+class LexicalIndex:
+    def __init__(self, texts: List[str], metadatas: List[dict], k1: float = 1.5, b: float = 0.75):
+        self.texts = texts
+        self.metadatas = metadatas
+        self.k1 = k1
+        self.b = b
+        self.postings: dict[str, List[tuple[int, int]]] = defaultdict(list)
+        self.lengths: List[int] = []
+        for row, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            self.lengths.append(sum(counts.values()))
+            for term, count in counts.items():
+                self.postings[term].append((row, count))
+        self.average_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+    @classmethod
+    def from_vector_store(cls, vector_store: Any) -> "LexicalIndex":
+        """Build from the Chroma collection or a SharedIndex."""
+        if hasattr(vector_store, "text"):
+            rows = range(len(vector_store))
+            return cls([vector_store.text(row) for row in rows], [dict(vector_store.metadatas[row]) for row in rows])
+        data = vector_store._collection.get(include=["documents", "metadatas"])
+        return cls(data["documents"] or [], [meta or {} for meta in (data["metadatas"] or [])])
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def search(self, query: str, k: int = 3) -> List[Document]:
+        scores: dict[int, float] = defaultdict(float)
+        total = len(self.texts)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for row, count in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[row] / self.average_length)
+                scores[row] += idf * count * (self.k1 + 1) / (count + norm)
+
+        best = sorted(scores, key=scores.get, reverse=True)[:k]
+        return [
+            Document(page_content=self.texts[row], metadata={**self.metadatas[row], "lexical_score": round(scores[row], 4)})
+            for row in best
+        ]
@@ -0,0 +1,167 @@
+"""
+Combined knowledge base and web research under one latency budget.
+
+Answering from both the knowledge base and the web used to take two tool
+calls (doc_search_tool, then web_search_tool), each costing the agent a
+model round trip. research(), behind research_tool in server.py, runs the
+document search and the web search + page fetches concurrently and
+returns whatever has arrived when both finish or the budget runs out: web
+results arrive as snippets first and are upgraded to page text as pages are
+fetched, so a slow page still leaves its snippet. Sources are deduplicated
+and numbered for citation ([D1] documents, [W1] web).
+"""
+import asyncio
+import hashlib
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, List
+
+from utils import SearchResult, normalize_url
+
+
+@dataclass
+class Source:
+    kind: str        # "doc" or "web"
+    title: str
+    location: str    # document source path or URL
+    text: str
+
+
+@dataclass
+class ResearchResult:
+    query: str
+    sources: List[Source]
+    # sides that had not finished when the budget ran out: "documents", "web"
+    unfinished: List[str] = field(default_factory=list)
+    # sides that raised instead of answering
+    failed: List[str] = field(default_factory=list)
+    elapsed: float = 0.0
+
+
+def _fingerprint(text: str) -> str:
+    return hashlib.md5(" ".join(text.lower().split()).encode()).hexdigest()
+
+
+def dedupe(sources: List[Source]) -> List[Source]:
+    """Drop repeated URLs or document passages, and identical text from either side."""
+    seen = set()
+    unique = []
+    for source in sources:
+        keys = {("text", _fingerprint(source.text))}
+        if source.kind == "web":
+            keys.add(("url", normalize_url(source.location)))
+        if keys & seen:
+            continue
+        seen |= keys
+        unique.append(source)
+    return unique
+
+
+async def research(
+    query: str,
+    search_docs: Callable[[str], Awaitable[List[Any]]],
+    search_web: Callable[[str, int], Awaitable[List[SearchResult]]],
+    fetch_page: Callable[[str], Awaitable[str]],
+    budget: float,
+    web_results: int = 3,
+    web_pages: int = 2,
+    page_chars: int = 2000,
+) -> ResearchResult:
+    """
+    Search documents and the web concurrently; return what is ready by the deadline.
+
+    Args:
+        query: The user's question
+        search_docs: Async document search returning LangChain Documents
+        search_web: Async web search returning SearchResults
+        fetch_page: Async page fetch returning page text (or an "Error: ..." string)
+        budget: Seconds until partial results are returned
+        web_results: Web search results to keep
+        web_pages: Top results whose pages are fetched to replace the snippet
+        page_chars: Longest page text kept per web source
+    """
+    started = time.monotonic()
+    web_sources: List[Source] = []
+
+    async def docs_side() -> List[Source]:
+        return [
+            Source(
+                "doc",
+                doc.metadata.get("page_title", "unknown title"),
+                doc.metadata.get("source", "unknown source"),
+                doc.page_content,
+            )
+            for doc in await search_docs(query)
+        ]
+
+    async def fetch_into(source: Source):
+        text = await fetch_page(source.location)
+        if text and not text.startswith("Error:"):
+            source.text = text[:page_chars] + ("... [content truncated]" if len(text) > page_chars else "")
+
+    async def web_side():
+        results = await search_web(query, web_results)
+        # snippets are usable immediately; pages replace them as they arrive
+        web_sources.extend(Source("web", r.title, r.link, r.snippet) for r in results[:web_results])
+        await asyncio.gather(*(fetch_into(source) for source in web_sources[:web_pages]), return_exceptions=True)
+
+    docs_task = asyncio.ensure_future(docs_side())
+    web_task = asyncio.ensure_future(web_side())
+    done, pending = await asyncio.wait({docs_task, web_task}, timeout=budget)
+    for task in pending:
+        task.cancel()
+
+    doc_sources: List[Source] = []
+    unfinished, failed = [], []
+    for side, task in (("documents", docs_task), ("web", web_task)):
+        if task in pending:
+            unfinished.append(side)
+        elif task.exception() is not None:
+            failed.append(side)
+    if "documents" not in unfinished + failed:
+        doc_sources = docs_task.result()
+
+    return ResearchResult(
+        query=query,
+        sources=dedupe(doc_sources + [source for source in web_sources if source.text]),
+        unfinished=unfinished,
+        failed=failed,
+        elapsed=time.monotonic() - started,
+    )
+
+
+def format_research(result: ResearchResult, budget: float) -> str:
+    """Render sources with [D#]/[W#] citation tags and a closing source list."""
+    entries = []
+    citations = []
+    counters = {"doc": 0, "web": 0}
+    for source in result.sources:
+        counters[source.kind] += 1
+        tag = f"{'D' if source.kind == 'doc' else 'W'}{counters[source.kind]}"
+        if source.kind == "doc":
+            entries.append(f"[{tag}] 📄 **Title:** {source.title}\n📂 **Source:** {source.location}\n\n{source.text}")
+        else:
+            entries.append(f"[{tag}] 🌐 **Title:** {source.title}\n🔗 **URL:** {source.location}\n\n{source.text}")
+        citations.append(f"[{tag}] {source.title} — {source.location}")
+
+    notes = []
+    if "documents" in result.unfinished:
+        notes.append(f"The knowledge base search did not finish within {budget:g}s.")
+    elif "documents" in result.failed:
+        notes.append("The knowledge base search failed.")
+    elif not counters["doc"]:
+        notes.append("No relevant documents were found in the knowledge base.")
+    if "web" in result.unfinished:
+        notes.append(f"The web search did not finish within {budget:g}s; web results may be partial.")
+    elif "web" in result.failed:
+        notes.append("The web search failed.")
+    elif not counters["web"]:
+        notes.append("No web results were found.")
+
+    sections = []
+    if notes:
+        sections.append(" ".join(notes))
+    sections.extend(entries)
+    if citations:
+        sections.append("Sources:\n" + "\n".join(citations))
+    return "\n\n---\n\n".join(sections)
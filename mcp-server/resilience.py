@@ -0,0 +1,339 @@
+"""
+Resilience for calls to external services (DuckDuckGo, web pages, Gemini).
+
+Each upstream gets a Dependency: a circuit breaker that fails fast while the
+upstream is down, retries with jittered exponential backoff capped by a retry
+budget, and (for async calls) a hedged second request once the first has
+taken longer than the upstream's recent p95 latency. A deadline caps each
+call's total time across attempts.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, List, Optional, TypeVar
+
+import httpx
+
+
+T = TypeVar("T")
+
+# Seconds a call may take across retries (Dependency.from_env), below the
+# frontend's 30 s MCP client session timeout so fallbacks get served
+DEFAULT_DEADLINE = 20.0
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling the upstream while its breaker is open."""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Transport errors, timeouts, 429 and 5xx are worth retrying; other 4xx are not."""
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status == 429 or status >= 500
+    # programming and validation errors would fail the same way again
+    return not isinstance(error, (ValueError, TypeError, KeyError, AttributeError))
+
+
+class CircuitBreaker:
+    """
+    Classic three-state breaker.
+
+    closed: calls pass; failure_threshold consecutive failures open it.
+    open: calls fail fast until reset_timeout has passed.
+    half_open: one trial call is let through; success closes, failure reopens.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._trial_in_flight = False
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """The half-open trial ended without an outcome (e.g. cancelled); let the next call make it."""
+        with self._lock:
+            if self.state == "half_open":
+                self._trial_in_flight = False
+
+
+class RetryBudget:
+    """
+    Allow retries (and hedges) only up to a fraction of recent requests.
+
+    Over a sliding window, extra attempts may not exceed
+    max(min_retries, ratio * requests), so a failing upstream sees at most
+    (1 + ratio) times its normal load instead of max_attempts times.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_retries: int = 3, window: float = 10.0):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._requests: deque = deque()
+        self._retries: deque = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, now: float):
+        for events in (self._requests, self._retries):
+            while events and now - events[0] > self.window:
+                events.popleft()
+
+    def record_request(self):
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            self._requests.append(now)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            if len(self._retries) >= max(self.min_retries, self.ratio * len(self._requests)):
+                return False
+            self._retries.append(now)
+            return True
+
+
+class LatencyTracker:
+    """Recent successful call latencies, for the hedging delay."""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: deque = deque(maxlen=size)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def p95(self) -> Optional[float]:
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+
+class FallbackCache:
+    """
+    Last good result per key, served when the upstream fails or its breaker
+    is open. Bounded LRU; entries older than max_age are dropped.
+    """
+
+    def __init__(self, max_entries: int = 512, max_age: float = 6 * 3600):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._entries: OrderedDict = OrderedDict()
+
+    def put(self, key, value):
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if time.monotonic() - stored_at > self.max_age:
+            del self._entries[key]
+            return None
+        return value
+
+
+class Dependency:
+    """
+    Resilience policy for one upstream.
+
+    Args:
+        name: Used in errors and logs
+        timeout: Seconds allowed per attempt
+        max_attempts: Attempts per call, including the first
+        deadline: Seconds allowed per call across all attempts and backoff
+            (None: no limit); no retry is started that could not finish in time
+        backoff: Base backoff in seconds; attempt n sleeps uniform(0, backoff * 2**n)
+        hedge: Send a second request when the first is slower than p95
+        breaker: Circuit breaker (default: 5 failures, 30s reset)
+        budget: Retry budget shared by retries and hedges
+    """
+
+    def __init__(
+        self,
+        name: str,
+        timeout: float = 10.0,
+        max_attempts: int = 3,
+        deadline: Optional[float] = None,
+        backoff: float = 0.2,
+        hedge: bool = False,
+        breaker: Optional[CircuitBreaker] = None,
+        budget: Optional[RetryBudget] = None,
+    ):
+        self.name = name
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.deadline = deadline
+        self.backoff = backoff
+        self.hedge = hedge
+        self.breaker = breaker or CircuitBreaker()
+        self.budget = budget or RetryBudget()
+        self.latency = LatencyTracker()
+
+    @classmethod
+    def from_env(cls, name: str, env_prefix: Optional[str] = None, **defaults) -> "Dependency":
+        """
+        Apply <PREFIX>_TIMEOUT, <PREFIX>_MAX_ATTEMPTS, <PREFIX>_DEADLINE and
+        <PREFIX>_HEDGE overrides (prefix defaults to name).
+
+        The deadline defaults to DEFAULT_DEADLINE, so a hanging upstream fails
+        (and its fallback is served) before the MCP client gives up on the tool
+        call; 0 disables it.
+        """
+        prefix = (env_prefix or name).upper()
+        timeout = float(os.getenv(f"{prefix}_TIMEOUT", defaults.pop("timeout", 10.0)))
+        max_attempts = int(os.getenv(f"{prefix}_MAX_ATTEMPTS", defaults.pop("max_attempts", 3)))
+        deadline = float(os.getenv(f"{prefix}_DEADLINE", defaults.pop("deadline", DEFAULT_DEADLINE)))
+        hedge = os.getenv(f"{prefix}_HEDGE", str(defaults.pop("hedge", False))).lower() in ("1", "true", "yes")
+        return cls(name, timeout=timeout, max_attempts=max_attempts, deadline=deadline or None, hedge=hedge,
+                   **defaults)
+
+    def _backoff_delay(self, attempt: int) -> float:
+        return random.uniform(0, self.backoff * (2 ** attempt))
+
+    def _ends_at(self) -> Optional[float]:
+        return None if self.deadline is None else time.monotonic() + self.deadline
+
+    def _attempt_timeout(self, ends_at: Optional[float]) -> float:
+        return self.timeout if ends_at is None else min(self.timeout, ends_at - time.monotonic())
+
+    @staticmethod
+    def _time_left(ends_at: Optional[float], delay: float = 0.0) -> bool:
+        return ends_at is None or time.monotonic() + delay < ends_at
+
+    def _check_breaker(self) -> bool:
+        """Fail fast while the breaker is open; True if this call is the half-open trial."""
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.name} is unavailable (circuit open)")
+        return self.breaker.state == "half_open"
+
+    def _record(self, error: Optional[BaseException], started: float):
+        if error is None:
+            self.latency.record(time.monotonic() - started)
+            self.breaker.record_success()
+        elif is_retryable(error):
+            self.breaker.record_failure()
+        else:
+            # the upstream answered; the request was bad
+            self.breaker.record_success()
+
+    async def _attempt(self, fn: Callable[[], Awaitable[T]], ends_at: Optional[float] = None) -> T:
+        """One attempt, hedged after the p95 delay if enabled and budget allows."""
+        started = time.monotonic()
+        first = asyncio.ensure_future(asyncio.wait_for(fn(), self._attempt_timeout(ends_at)))
+        tasks: List[asyncio.Future] = [first]
+        delay = self.latency.p95() if self.hedge else None
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done and self.budget.try_spend():
+                    tasks.append(asyncio.ensure_future(asyncio.wait_for(fn(), self._attempt_timeout(ends_at))))
+
+            error: Optional[BaseException] = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self._record(None, started)
+                        return task.result()
+                    error = task.exception()
+            assert error is not None
+            self._record(error, started)
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run an async upstream call under the breaker, retry budget, hedging and deadline."""
+        self.budget.record_request()
+        ends_at = self._ends_at()
+        for attempt in range(self.max_attempts):
+            trial = self._check_breaker()
+            try:
+                return await self._attempt(fn, ends_at)
+            except Exception as e:
+                last_attempt = attempt == self.max_attempts - 1
+                delay = self._backoff_delay(attempt)
+                if last_attempt or not is_retryable(e) or not self._time_left(ends_at, delay) \
+                        or not self.budget.try_spend():
+                    raise
+            except BaseException:
+                # cancelled before an outcome was recorded; a stuck trial would keep the breaker half-open forever
+                if trial:
+                    self.breaker.release_trial()
+                raise
+            await asyncio.sleep(delay)
+        raise AssertionError("unreachable")
+
+    def call_sync(self, fn: Callable[[], T]) -> T:
+        """
+        Blocking variant for sync clients: breaker and budgeted retries, no hedging.
+
+        A running attempt cannot be interrupted (the client's own timeout
+        applies), so the deadline only stops further retries.
+        """
+        self.budget.record_request()
+        ends_at = self._ends_at()
+        for attempt in range(self.max_attempts):
+            trial = self._check_breaker()
+            started = time.monotonic()
+            try:
+                result = fn()
+            except Exception as e:
+                self._record(e, started)
+                last_attempt = attempt == self.max_attempts - 1
+                delay = self._backoff_delay(attempt)
+                if last_attempt or not is_retryable(e) or not self._time_left(ends_at, delay) \
+                        or not self.budget.try_spend():
+                    raise
+                time.sleep(delay)
+                continue
+            except BaseException:
+                if trial:
+                    self.breaker.release_trial()
+                raise
+            self._record(None, started)
+            return result
+        raise AssertionError("unreachable")
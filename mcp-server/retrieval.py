@@ -0,0 +1,250 @@
+"""
+Adaptive retrieval for doc_search_tool.
+
+Over-fetches candidates from the vector store, drops those below a cosine
+similarity threshold, re-ranks the rest with maximal marginal relevance
+(MMR) so near-duplicate chunks do not crowd each other out, and stops
+adding chunks once a token budget is reached. Hits can then be expanded to
+their neighboring chunks, looked up by id rather than by another vector
+query.
+"""
+import os
+from dataclasses import dataclass, replace
+from typing import Any, List
+
+import numpy as np
+from langchain_core.documents import Document
+
+
+@dataclass(frozen=True)
+class RetrievalConfig:
+    k: int = 3                    # maximum chunks returned
+    fetch_k: int = 12             # candidates considered for MMR
+    score_threshold: float = 0.0  # minimum cosine similarity, 0 disables
+    mmr_lambda: float = 0.7       # 1.0 = pure relevance, lower = more diverse
+    token_budget: int = 1200      # approximate tokens of chunk text, 0 disables
+    neighbors: int = 0            # adjacent chunks added on each side of a hit
+
+    @classmethod
+    def from_env(cls) -> "RetrievalConfig":
+        """Read overrides from RETRIEVAL_* environment variables."""
+        defaults = cls()
+        return cls(
+            k=int(os.getenv("RETRIEVAL_K", defaults.k)),
+            fetch_k=int(os.getenv("RETRIEVAL_FETCH_K", defaults.fetch_k)),
+            score_threshold=float(os.getenv("RETRIEVAL_SCORE_THRESHOLD", defaults.score_threshold)),
+            mmr_lambda=float(os.getenv("RETRIEVAL_MMR_LAMBDA", defaults.mmr_lambda)),
+            token_budget=int(os.getenv("RETRIEVAL_TOKEN_BUDGET", defaults.token_budget)),
+            neighbors=int(os.getenv("RETRIEVAL_NEIGHBORS", defaults.neighbors)),
+        )
+
+    def with_k(self, k: int) -> "RetrievalConfig":
+        return replace(self, k=k, fetch_k=max(self.fetch_k, k))
+
+
+def chunk_id(doc_id: str, chunk_index: int) -> str:
+    """Vector store id of a chunk, assigned at ingest (see ingest.assign_chunk_positions)."""
+    return f"{doc_id}:{chunk_index}"
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (about four characters per token)."""
+    return len(text) // 4 + 1
+
+
+def _normalise(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def fetch_candidates(vector_store: Any, query_embedding: np.ndarray, fetch_k: int) -> tuple[List[Document], np.ndarray]:
+    """
+    Return the fetch_k nearest chunks and their embeddings.
+
+    Works with both the Chroma store and the memory-mapped SharedIndex.
+    """
+    if hasattr(vector_store, "search_by_vector"):
+        hits = vector_store.search_by_vector(query_embedding, fetch_k)
+        rows = [row for row, _ in hits]
+        docs = [vector_store.document(row) for row in rows]
+        vectors = np.asarray(vector_store.embeddings[rows], dtype=np.float32)
+        return docs, vectors.reshape(len(rows), -1)
+
+    result = vector_store._collection.query(
+        query_embeddings=[query_embedding.tolist()],
+        n_results=fetch_k,
+        include=["documents", "metadatas", "embeddings"],
+    )
+    texts = result["documents"][0] if result["documents"] else []
+    metadatas = result["metadatas"][0] if result["metadatas"] else [{}] * len(texts)
+    docs = [Document(page_content=text, metadata=meta or {}) for text, meta in zip(texts, metadatas)]
+    vectors = np.asarray(result["embeddings"][0] if len(texts) else [], dtype=np.float32)
+    return docs, vectors.reshape(len(texts), -1)
+
+
+def mmr_select(query: np.ndarray, candidates: np.ndarray, k: int, mmr_lambda: float) -> List[int]:
+    """
+    Pick k candidate indices by maximal marginal relevance.
+
+    All vectors must be L2-normalised. The pairwise similarity matrix is
+    computed once; each step is a vectorised update over the candidates.
+    """
+    n = len(candidates)
+    if n == 0 or k <= 0:
+        return []
+    relevance = candidates @ query
+    if mmr_lambda >= 1.0:
+        return list(np.argsort(-relevance)[:k])
+
+    pairwise = candidates @ candidates.T
+    redundancy = np.full(n, -np.inf, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    selected: List[int] = []
+    for _ in range(min(k, n)):
+        penalty = np.where(np.isfinite(redundancy), redundancy, 0.0)
+        scores = mmr_lambda * relevance - (1.0 - mmr_lambda) * penalty
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, pairwise[:, best])
+    return selected
+
+
+def retrieve(vector_store: Any, embedding_function: Any, query: str, config: RetrievalConfig) -> List[Document]:
+    """
+    Return up to config.k relevant, diverse chunks within the token budget.
+
+    An empty list means nothing cleared the score threshold. Each document's
+    metadata gets a "relevance_score" (cosine similarity to the query).
+    """
+    query_vector = _normalise(np.asarray(embedding_function.embed_query(query), dtype=np.float32))
+    docs, vectors = fetch_candidates(vector_store, query_vector, max(config.fetch_k, config.k))
+    if not docs:
+        return []
+
+    vectors = _normalise(vectors)
+    relevance = vectors @ query_vector
+    keep = np.flatnonzero(relevance >= config.score_threshold) if config.score_threshold > 0 else np.arange(len(docs))
+    if len(keep) == 0:
+        return []
+
+    order = mmr_select(query_vector, vectors[keep], config.k, config.mmr_lambda)
+
+    selected: List[Document] = []
+    used_tokens = 0
+    for position in order:
+        index = int(keep[position])
+        doc = docs[index]
+        tokens = estimate_tokens(doc.page_content)
+        if config.token_budget and selected and used_tokens + tokens > config.token_budget:
+            break
+        doc.metadata["relevance_score"] = round(float(relevance[index]), 4)
+        selected.append(doc)
+        used_tokens += tokens
+    return selected
+
+
+def get_by_ids(vector_store: Any, ids: List[str]) -> List[Document]:
+    """Fetch chunks by id from either backend, without touching embeddings."""
+    if hasattr(vector_store, "get_by_ids"):
+        return vector_store.get_by_ids(ids)
+    result = vector_store._collection.get(ids=ids, include=["documents", "metadatas"])
+    return [
+        Document(page_content=text, metadata=meta or {})
+        for text, meta in zip(result["documents"] or [], result["metadatas"] or [])
+    ]
+
+
+def _stitch(pieces: List[Document]) -> str:
+    """Join consecutive chunks, dropping the overlap the splitter duplicated."""
+    text = pieces[0].page_content
+    previous = pieces[0]
+    for piece in pieces[1:]:
+        prev_start = previous.metadata.get("start_index")
+        start = piece.metadata.get("start_index")
+        overlap = 0
+        if prev_start is not None and start is not None:
+            overlap = prev_start + len(previous.page_content) - start
+        if overlap > 0:
+            text += piece.page_content[overlap:]
+        else:
+            text += "\n" + piece.page_content
+        previous = piece
+    return text
+
+
+def expand_neighbors(vector_store: Any, docs: List[Document], window: int,
+                     token_budget: int = 0) -> List[Document]:
+    """
+    Replace each hit with a window of its surrounding chunks.
+
+    Windows from the same document that overlap or touch are merged into one
+    passage, so the same text is never returned twice. Passages keep the rank
+    of their best hit. Chunks ingested without positions are returned as is.
+
+    With a token_budget (0 disables), passages are added in rank order until
+    it is reached; a passage that does not fit falls back to its best hit,
+    and the first hit is always kept, as in retrieve.
+    """
+    if window <= 0 or not docs:
+        return docs
+
+    # (doc_id -> list of [lo, hi, rank, hit]) before merging
+    spans: dict[str, List[list]] = {}
+    passthrough: List[tuple[int, Document]] = []
+    for rank, doc in enumerate(docs):
+        doc_id = doc.metadata.get("doc_id")
+        index = doc.metadata.get("chunk_index")
+        if doc_id is None or index is None:
+            passthrough.append((rank, doc))
+            continue
+        last = int(doc.metadata.get("chunk_count", index + window + 1)) - 1
+        spans.setdefault(doc_id, []).append([max(0, index - window), min(last, index + window), rank, doc])
+
+    merged: List[list] = []
+    for doc_id, doc_spans in spans.items():
+        doc_spans.sort(key=lambda span: span[0])
+        current = doc_spans[0]
+        for span in doc_spans[1:]:
+            if span[0] <= current[1] + 1:
+                current[1] = max(current[1], span[1])
+                if span[2] < current[2]:
+                    current[2], current[3] = span[2], span[3]
+            else:
+                merged.append([doc_id, *current])
+                current = span
+        merged.append([doc_id, *current])
+
+    wanted = [chunk_id(doc_id, i) for doc_id, lo, hi, _, _ in merged for i in range(lo, hi + 1)]
+    by_position = {
+        (chunk.metadata.get("doc_id"), chunk.metadata.get("chunk_index")): chunk
+        for chunk in get_by_ids(vector_store, wanted)
+    }
+
+    passages: List[tuple[int, Document, Document]] = [(rank, doc, doc) for rank, doc in passthrough]
+    for doc_id, lo, hi, rank, hit in merged:
+        pieces = [by_position[(doc_id, i)] for i in range(lo, hi + 1) if (doc_id, i) in by_position]
+        if not pieces:
+            passages.append((rank, hit, hit))
+            continue
+        metadata = dict(hit.metadata)
+        metadata["chunk_range"] = f"{pieces[0].metadata['chunk_index']}-{pieces[-1].metadata['chunk_index']}"
+        passages.append((rank, Document(page_content=_stitch(pieces), metadata=metadata), hit))
+
+    passages.sort(key=lambda passage: passage[0])
+    if not token_budget:
+        return [passage for _, passage, _ in passages]
+
+    selected: List[Document] = []
+    used_tokens = 0
+    for _, passage, hit in passages:
+        tokens = estimate_tokens(passage.page_content)
+        if used_tokens + tokens > token_budget:
+            passage, tokens = hit, estimate_tokens(hit.page_content)
+        if selected and used_tokens + tokens > token_budget:
+            break
+        selected.append(passage)
+        used_tokens += tokens
+    return selected
@@ -1,15 +1,24 @@
+import asyncio
+import contextlib
 import logging
 import os
+import threading
+import weakref
 from datetime import datetime
+from typing import TYPE_CHECKING, Any, Optional
 from mcp.server.fastmcp import FastMCP
-from langchain_chroma import Chroma
-from pydantic import SecretStr
 from dotenv import load_dotenv
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from chromadb.config import Settings
+from starlette.requests import Request
+from starlette.responses import JSONResponse
 
 from utils import DuckDuckGoSearcher, WebContentFetcher
 
+if TYPE_CHECKING:
+    # Heavy imports are deferred to first use so a cold boot only pays for
+    # the MCP stack; see get_embeddings() and get_vector_store().
+    from langchain_core.documents import Document
+    from retrieval import RetrievalConfig
+
 
 
 load_dotenv()
@@ -27,53 +36,363 @@ mcp = FastMCP(
     stateless_http=True
 )
 
-# 1. Load vector store once at server start
-embeddings = GoogleGenerativeAIEmbeddings(
-    model="models/gemini-embedding-001", 
-    google_api_key=SecretStr(GEMINI_API_KEY)
+
+# Snapshot root shared with the frontend; see snapshots.py
+PERSIST_DIR = os.getenv("VECTOR_STORE_DIR", os.path.join("..", "vector_store"))
+COLLECTION_NAME = "study_documents"
+
+NO_RELEVANT_DOCUMENTS = (
+    "No relevant documents found in the knowledge base for this query. "
+    "Use web_search_tool if the user needs outside information."
 )
 
+# Set by serve() in production mode: workers search a memory-mapped export
+# of the store instead of each opening their own Chroma copy.
+SHARED_INDEX = os.getenv("SHARED_INDEX", "").lower() in ("1", "true", "yes")
+
+# How often to check for a newly published snapshot
+SNAPSHOT_POLL_SECONDS = float(os.getenv("SNAPSHOT_POLL_SECONDS", "2"))
+
+# Backoff between warm-up attempts while /ready reports 503
+WARM_UP_RETRY_SECONDS = float(os.getenv("WARM_UP_RETRY_SECONDS", "1"))
+WARM_UP_MAX_RETRY_SECONDS = float(os.getenv("WARM_UP_MAX_RETRY_SECONDS", "30"))
+
+# research_tool: one deadline for the document and web searches together
+RESEARCH_BUDGET_SECONDS = float(os.getenv("RESEARCH_BUDGET_SECONDS", "8"))
+RESEARCH_WEB_PAGES = int(os.getenv("RESEARCH_WEB_PAGES", "2"))
+
+_embeddings: Optional[Any] = None
+_generation: Optional["_Generation"] = None
+# keyword index per open store, i.e. per snapshot generation; dropped with it
+_lexical_indexes: "weakref.WeakKeyDictionary[Any, Any]" = weakref.WeakKeyDictionary()
+_lexical_lock = threading.Lock()
+_init_lock = threading.Lock()
+
+# Warm-up progress reported by /ready
+readiness: dict[str, Any] = {
+    "vector_store": False,
+    "embeddings": False,
+    "snapshot": None,
+    "error": None,
+}
+
+
+def get_embeddings():
+    """
+    Create the Gemini embeddings client on first use.
+
+    Calls go through an EmbeddingBroker so concurrent tool calls share
+    batched upstream requests, under a circuit breaker and retry budget.
+    """
+    global _embeddings
+    if _embeddings is None:
+        with _init_lock:
+            if _embeddings is None:
+                from pydantic import SecretStr
+                from langchain_google_genai import GoogleGenerativeAIEmbeddings
+                from embedding_broker import EmbeddingBroker
+                from resilience import Dependency
+
+                dependency = Dependency.from_env("gemini_embeddings", timeout=10.0)
+                _embeddings = EmbeddingBroker.from_env(GoogleGenerativeAIEmbeddings(
+                    model="models/gemini-embedding-001", 
+                    google_api_key=SecretStr(GEMINI_API_KEY),
+                    request_options={"timeout": dependency.timeout}
+                ), dependency=dependency)
+    return _embeddings
+
+
+class _Generation:
+    """
+    An open snapshot version and its reader lease.
+
+    Tool calls pin the generation they started on, so a reload never closes
+    a store under a running search; a retired generation is closed (and its
+    lease released for garbage collection) once its last user finishes.
+    """
+
+    def __init__(self, lease: Any, store: Any):
+        self.lease = lease
+        self.store = store
+        self.users = 0
+        self.retired = False
+        self._lock = threading.Lock()
+
+    def pin(self):
+        with self._lock:
+            self.users += 1
+
+    def unpin(self):
+        with self._lock:
+            self.users -= 1
+            idle = self.retired and self.users == 0
+        if idle:
+            self.close()
+
+    def retire(self):
+        with self._lock:
+            self.retired = True
+            idle = self.users == 0
+        if idle:
+            self.close()
+
+    def close(self):
+        from snapshots import SnapshotStore, close_chroma
+
+        if not SHARED_INDEX:
+            close_chroma(self.lease.path)
+        self.lease.release()
+        # this may have been the last hold on the version; an upload in
+        # progress collects it itself after publishing
+        try:
+            SnapshotStore(PERSIST_DIR).collect_garbage(blocking=False)
+        except Exception as e:
+            logging.warning(f"Snapshot garbage collection failed: {str(e)}")
+
+
+def _open_chroma(persist_directory: str):
+    from chromadb.config import Settings
+    from langchain_chroma import Chroma
+
+    # same settings as ingest.py and the frontend: Chroma allows one client per directory
+    return Chroma(
+        persist_directory=persist_directory,
+        embedding_function=get_embeddings(),
+        collection_name=COLLECTION_NAME,
+        client_settings=Settings(anonymized_telemetry=False)
+    )
+
+
+def _open_generation() -> _Generation:
+    """Lease the current snapshot and open it, publishing an initial one if there is none."""
+    from snapshots import SnapshotStore, close_chroma
+
+    snapshots = SnapshotStore(PERSIST_DIR)
+    lease = snapshots.acquire()
+    if lease is None:
+        # First start: adopt a pre-snapshot store in the root, or publish an empty one
+        with snapshots.write() as path:
+            _open_chroma(path)
+            close_chroma(path)
+        lease = snapshots.acquire()
+
+    try:
+        if SHARED_INDEX:
+            from shared_index import SharedIndex, ensure_export
+
+            store = SharedIndex(ensure_export(lease.path, _open_chroma), get_embeddings())
+        else:
+            store = _open_chroma(lease.path)
+    except BaseException:
+        lease.release()
+        raise
+    readiness["snapshot"] = lease.version
+    return _Generation(lease, store)
+
+
+def _current_generation() -> _Generation:
+    global _generation
+    if _generation is None:
+        get_embeddings()
+        with _init_lock:
+            if _generation is None:
+                _generation = _open_generation()
+    return _generation
+
+
+def get_vector_store():
+    """
+    Open the current vector store snapshot on first use and reuse it afterwards.
+
+    Returns the memory-mapped SharedIndex when SHARED_INDEX is set,
+    otherwise the Chroma collection. Use vector_store_in_use() to keep the
+    store open across a hot reload.
+    """
+    return _current_generation().store
+
+
+@contextlib.contextmanager
+def vector_store_in_use():
+    """Pin the current snapshot for the duration of a search."""
+    _current_generation()
+    # look up and pin under the lock reload_vector_store swaps under, so a
+    # reload cannot retire (and close) the generation in between
+    with _init_lock:
+        generation = _generation
+        generation.pin()
+    try:
+        yield generation.store
+    finally:
+        generation.unpin()
+
+
+def reload_vector_store() -> bool:
+    """
+    Switch to a newly published snapshot, if any.
+
+    Returns True if the store was reloaded. The previous generation is
+    closed once the searches still using it finish.
+    """
+    global _generation
+    from snapshots import SnapshotStore
+
+    if _generation is None:
+        return False
+    version = SnapshotStore(PERSIST_DIR).current()
+    if version is None or version == _generation.lease.version:
+        return False
+    # opened outside the lock, so searches are not held up while it loads
+    generation = _open_generation()
+    with _init_lock:
+        previous = _generation
+        if generation.lease.version != previous.lease.version:
+            _generation = generation
+    if previous is _generation:
+        # a concurrent reload got there first; the Chroma client is shared by path, so only drop the lease
+        generation.lease.release()
+        return False
+    previous.retire()
+    logging.info(f"Reloaded vector store snapshot {generation.lease.version}")
+    return True
+
+
+async def watch_snapshots():
+    """Poll for published snapshots and hot-reload them."""
+    while True:
+        await asyncio.sleep(SNAPSHOT_POLL_SECONDS)
+        try:
+            await asyncio.to_thread(reload_vector_store)
+        except Exception as e:
+            logging.error(f"Snapshot reload failed: {str(e)}")
+
+
+def warm_up() -> bool:
+    """Open the vector store and run one embedding so the first tool call is fast."""
+    try:
+        vector_store = get_vector_store()
+        if hasattr(vector_store, "warm"):
+            vector_store.warm()
+        readiness["vector_store"] = True
+        get_embeddings().embed_query("warm up")
+        readiness["embeddings"] = True
+        readiness["error"] = None
+        logging.info("Warm-up complete")
+        return True
+    except Exception as e:
+        readiness["error"] = str(e)
+        logging.error(f"Warm-up failed: {str(e)}")
+        return False
+
+
+async def warm_up_until_ready():
+    """Retry warm-up with exponential backoff until it succeeds, so a transient failure does not leave /ready at 503."""
+    delay = WARM_UP_RETRY_SECONDS
+    while not await asyncio.to_thread(warm_up):
+        logging.info(f"Retrying warm-up in {delay:g}s")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, WARM_UP_MAX_RETRY_SECONDS)
+
+
+def get_lexical_index(vector_store: Any):
+    """
+    Keyword index over the store's chunks, built once per open store.
+
+    A store is one immutable snapshot generation, so the index never goes
+    stale. Concurrent fallbacks wait for a single build instead of each
+    indexing the whole collection.
+    """
+    from lexical_index import LexicalIndex
+
+    with _lexical_lock:
+        index = _lexical_indexes.get(vector_store)
+        if index is None:
+            index = _lexical_indexes[vector_store] = LexicalIndex.from_vector_store(vector_store)
+    return index
+
+
+def search_documents(vector_store: Any, query: str, config: Optional["RetrievalConfig"] = None) -> list["Document"]:
+    """
+    Run the retrieval step of doc_search_tool against an open vector store.
+
+    config defaults to RetrievalConfig.from_env(); see retrieval.py. Falls
+    back to keyword search when the query cannot be embedded.
+    """
+    from retrieval import RetrievalConfig, expand_neighbors, retrieve
+
+    config = config or RetrievalConfig.from_env()
+    embedding_function = getattr(vector_store, "embedding_function", None) or vector_store.embeddings
+    try:
+        docs = retrieve(vector_store, embedding_function, query.strip(), config)
+    except Exception as e:
+        # Typically the embeddings breaker is open; keyword search needs no API call
+        logging.warning(f"Vector search unavailable ({str(e)}); falling back to keyword search")
+        docs = get_lexical_index(vector_store).search(query.strip(), config.k)
+    return expand_neighbors(vector_store, docs, config.neighbors, config.token_budget)
+
+
+def format_documents(docs: list["Document"]) -> str:
+    """Render retrieved chunks with their title and source for the agent."""
+    results = []
+    for doc in docs:
+        meta = doc.metadata
+        source = meta.get("source", "unknown source")
+        page_title = meta.get("page_title", "unknown title")
+        # set on Markdown uploads, e.g. "Cells > Mitochondria"
+        section = meta.get("section")
+        
+        entry = (
+            f"📄 **Title:** {page_title}\n"
+            f"📂 **Source:** {source}\n"
+            + (f"📑 **Section:** {section}\n" if section else "")
+            + f"\n{doc.page_content}"
+        )
+        results.append(entry)
+
+    return "\n\n---\n\n".join(results)
+
 
 @mcp.tool(
     name="doc_search_tool", 
-    description="Retrieves the most relevant information from the knowledge base by searching a vector store. It returns the matched content along with metadata (file name and source path)"
+    description="Retrieves the most relevant information from the knowledge base by searching a vector store. It returns the matched content along with metadata (file name and source path), or a 'No relevant documents found' message when nothing in the knowledge base matches"
     )
-def doc_search_tool(query: str) -> str:
+async def doc_search_tool(query: str, max_results: Optional[int] = None, neighbors: Optional[int] = None) -> str:
     """
     Search the vector store for relevant documents based on the user's query.
 
     Returns both content and metadata (source + page_title) so the agent can
-    tell the user where the information came from.
+    tell the user where the information came from. Chunks below the score
+    threshold are dropped, near-duplicates are diversified away and the result
+    stops growing once the token budget is reached.
+
+    Args:
+        query (str): The user's search query.
+        max_results (int, optional): Upper bound on returned chunks (server default: 3).
+        neighbors (int, optional): Adjacent chunks (0-2) to include on each side
+            of every match, merged into one passage, for surrounding context.
     """
     logging.info(f"doc_search_tool called with query: {query}")
     
     
     try:
-        # point to shared persistent directory
-        PERSIST_DIR = os.path.join("..", "vector_store")
-
-        vector_store = Chroma(
-            persist_directory=PERSIST_DIR,
-            embedding_function=embeddings,
-            collection_name="study_documents"
-        )
-        retriever = vector_store.as_retriever(search_kwargs={"k": 3})
-        docs = retriever.invoke(query.strip())
-
-        results = []
-        for doc in docs:
-            meta = doc.metadata
-            source = meta.get("source", "unknown source")
-            page_title = meta.get("page_title", "unknown title")
-            
-            entry = (
-                f"📄 **Title:** {page_title}\n"
-                f"📂 **Source:** {source}\n\n"
-                f"{doc.page_content}"
-            )
-            results.append(entry)
-
-        return "\n\n---\n\n".join(results)
+        from dataclasses import replace
+        from retrieval import RetrievalConfig
+
+        config = RetrievalConfig.from_env()
+        if max_results is not None:
+            config = config.with_k(max(1, min(max_results, 10)))
+        if neighbors is not None:
+            config = replace(config, neighbors=max(0, min(neighbors, 2)))
+
+        def search_blocking() -> list["Document"]:
+            with vector_store_in_use() as vector_store:
+                return search_documents(vector_store, query, config)
+
+        # off the event loop, so concurrent calls overlap and their query
+        # embeddings can be batched by the embedding broker
+        docs = await asyncio.to_thread(search_blocking)
+        if not docs:
+            return NO_RELEVANT_DOCUMENTS
+        return format_documents(docs)
     
     except Exception as e:
         logging.error(f"Error in doc_search_tool: {str(e)}")
@@ -111,6 +430,60 @@ async def web_search_tool(query: str) -> str:
 
 
 
+@mcp.tool(
+    name="research_tool",
+    description="Searches the knowledge base and the web at the same time and returns both, merged and deduplicated, with [D#] (document) and [W#] (web) citation tags. Use it instead of calling doc_search_tool and then web_search_tool when a question may need both."
+    )
+async def research_tool(query: str, max_results: Optional[int] = None) -> str:
+    """
+    Run the document search and the web search/fetch concurrently.
+
+    Both sides share one latency budget (RESEARCH_BUDGET_SECONDS). Whatever
+    has arrived when it runs out is returned, with a note on which side was
+    cut short: web results fall back to their search snippets while pages
+    are still loading.
+
+    Args:
+        query (str): The user's search query.
+        max_results (int, optional): Upper bound on document chunks (server default: 3).
+    """
+    logging.info(f"research_tool called with query: {query}")
+
+    from retrieval import RetrievalConfig
+    from research import format_research, research
+
+    config = RetrievalConfig.from_env()
+    if max_results is not None:
+        config = config.with_k(max(1, min(max_results, 10)))
+
+    def search_docs_blocking(text: str) -> list["Document"]:
+        with vector_store_in_use() as vector_store:
+            return search_documents(vector_store, text, config)
+
+    async def search_docs(text: str) -> list["Document"]:
+        # a cancelled search keeps running in its thread; only its result is dropped
+        return await asyncio.to_thread(search_docs_blocking, text)
+
+    try:
+        result = await research(
+            query,
+            search_docs,
+            searcher.search,
+            fetcher.fetch_and_parse,
+            budget=RESEARCH_BUDGET_SECONDS,
+            web_pages=RESEARCH_WEB_PAGES,
+        )
+        logging.info(f"research_tool finished in {result.elapsed:.2f}s (unfinished: {result.unfinished or 'none'})")
+        if not result.sources and not result.unfinished and not result.failed:
+            return "No relevant documents or web results found for this query."
+        return format_research(result, RESEARCH_BUDGET_SECONDS)
+    except Exception as e:
+        logging.error(f"Error in research_tool: {str(e)}")
+        return "Error: Unable to research this query at this time"
+
+
+
+
 @mcp.prompt(name="prompt-v1")
 def study_mode_prompt_v1() -> str:
     current_date = datetime.now().strftime("%Y-%m-%d")
@@ -167,21 +540,31 @@ Be warm, patient, and plain-spoken; don't use too many exclamation marks or emoj
 
 ### TOOLS AVAILABLE
 
-1. **doc_search_tool(query: str) -> str**
+1. **doc_search_tool(query: str, max_results: int = 3, neighbors: int = 0) -> str**
 
    * **Purpose**: Retrieve relevant information from the knowledge base (vector store).
    * **Output**: Returns matched content plus metadata (file page_title and source path) so you can tell the user where the information came from.
+   * Set `neighbors` to 1 or 2 when you need the text around a match (e.g. for a multi-step explanation) instead of searching again.
+   * If it returns **"No relevant documents found"**, the knowledge base does not cover the question: go straight to `web_search_tool` instead of searching the documents again.
 
 2. **web_search_tool(query: str) -> str**
 
    * **Purpose**: Search the web for fresh or niche information.
    * **Output**: Returns relevant snippets with source links. Use only if the learner's question is out of scope for the knowledge base or if the user explicitly requests a web search.
+
+3. **research_tool(query: str, max_results: int = 3) -> str**
+
+   * **Purpose**: Search the knowledge base and the web at the same time.
+   * **Output**: Returns document and web results together, each tagged for citation ([D1], [W1], ...), followed by a source list.
+   * When a question may need both the user's documents and outside information, call `research_tool` once instead of `doc_search_tool` followed by `web_search_tool`.
+   * If it notes that one side did not finish in time, answer from what was returned; do not call the tools again for the same question.
    
 #### How to use the tool results:
 
 * Summarize first in plain words (1-2 sentences).
 
 * Cite sources clearly (e.g., “Source: prompt_engineering_tutorial — knowledge-base4\\prompt_engineering_tutorial.txt”).
+  With `research_tool`, cite by tag (e.g., “[D1]”, “[W2]”) and list the tagged sources you used.
 
 * Synthesize multiple results into a short explanation.
 
@@ -197,12 +580,104 @@ DO NOT GIVE ANSWERS OR DO HOMEWORK FOR THE USER. If the user asks a math or logi
 
 
 
+@mcp.custom_route("/health", methods=["GET"])
+async def health(request: Request) -> JSONResponse:
+    """Liveness probe: the process is up and serving HTTP."""
+    return JSONResponse({"status": "ok"})
+
+
+@mcp.custom_route("/ready", methods=["GET"])
+async def ready(request: Request) -> JSONResponse:
+    """Readiness probe: 200 once the vector store is open and embeddings are warm."""
+    is_ready = readiness["vector_store"] and readiness["embeddings"]
+    return JSONResponse(
+        {"status": "ready" if is_ready else "warming_up", **readiness},
+        status_code=200 if is_ready else 503,
+    )
+
+
 mcp_app = mcp.streamable_http_app()
+_mcp_lifespan = mcp_app.router.lifespan_context
 
 
-if __name__ == "__main__":
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # Warm up in the background so /health answers while the store loads
+    warm_up_task = asyncio.create_task(warm_up_until_ready())
+    watch_task = asyncio.create_task(watch_snapshots())
+    async with _mcp_lifespan(app):
+        yield
+    watch_task.cancel()
+    warm_up_task.cancel()
+
+
+mcp_app.router.lifespan_context = lifespan
+
+
+def serve(
+    app: str = "server:mcp_app",
+    host: str = "0.0.0.0",
+    port: int = 8000,
+    workers: int = 1,
+    reload: bool = False,
+    graceful_timeout: int = 30,
+    shared_index: Optional[bool] = None,
+):
+    """
+    Run the server under uvicorn.
+
+    With more than one worker (or shared_index=True), workers search a
+    memory-mapped export of the current snapshot that they all share (see
+    shared_index.py); it is written here once before the workers start. On
+    SIGTERM uvicorn stops accepting connections and waits up to
+    graceful_timeout seconds for in-flight tool calls to finish.
+    """
+    global SHARED_INDEX
     import uvicorn
-    print("Starting MCP server...")
-    # Bind to localhost only for security - change to 0.0.0.0 only if needed for external access
-    uvicorn.run("server:mcp_app", host="0.0.0.0", port=8000, reload=True)
 
+    if shared_index is None:
+        shared_index = workers > 1 and not reload
+
+    # Workers are spawned after this point and inherit the environment
+    os.environ["VECTOR_STORE_DIR"] = PERSIST_DIR
+    if shared_index:
+        os.environ["SHARED_INDEX"] = "1"
+        SHARED_INDEX = True
+        generation = _open_generation()
+        logging.info(f"Exported {len(generation.store)} chunks of snapshot {generation.lease.version} to a shared index")
+        generation.close()
+
+    uvicorn.run(
+        app,
+        host=host,
+        port=port,
+        workers=None if reload else workers,
+        reload=reload,
+        timeout_graceful_shutdown=graceful_timeout,
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="StudyMode MCP server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("MCP_WORKERS", "1")),
+                        help="Worker processes (default: $MCP_WORKERS or 1)")
+    parser.add_argument("--reload", action="store_true", help="Reload on code changes (development only)")
+    parser.add_argument("--graceful-timeout", type=int, default=30,
+                        help="Seconds to drain in-flight requests on shutdown")
+    parser.add_argument("--shared-index", action="store_true", default=None,
+                        help="Serve from the memory-mapped index even with one worker")
+    args = parser.parse_args()
+
+    print("Starting MCP server...")
+    serve(
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        reload=args.reload,
+        graceful_timeout=args.graceful_timeout,
+        shared_index=args.shared_index,
+    )
@@ -0,0 +1,161 @@
+"""
+Read-only, memory-mapped copy of the vector store for multi-worker serving.
+
+Chroma loads its HNSW index into every process that opens it, so N uvicorn
+workers would hold N copies. Before the workers start, the serving parent
+exports the collection into flat files; each worker maps them with
+numpy.load(mmap_mode="r"), so the operating system page cache holds a
+single copy shared by all workers. Each snapshot version gets its own
+export in <version>/derived/mmap (see ensure_export()).
+
+Layout of an exported index directory:
+
+    embeddings.npy   float32 [n, dim], L2-normalised rows
+    offsets.npy      int64 [n + 1], byte offsets into texts.bin
+    texts.bin        utf-8 page contents, concatenated
+    metadatas.json   list of metadata dicts, one per row
+    ids.json         vector store id of each row
+"""
+import json
+import os
+import shutil
+import uuid
+from typing import Any, Callable, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+from retrieval import _normalise
+
+
+EMBEDDINGS_FILE = "embeddings.npy"
+OFFSETS_FILE = "offsets.npy"
+TEXTS_FILE = "texts.bin"
+METADATAS_FILE = "metadatas.json"
+IDS_FILE = "ids.json"
+
+
+def export_index(vector_store: Any, directory: str) -> int:
+    """
+    Write every chunk of a Chroma vector store to directory.
+
+    Returns:
+        int: Number of exported chunks
+    """
+    data = vector_store._collection.get(include=["embeddings", "documents", "metadatas"])
+    ids = list(data["ids"] or [])
+    texts = data["documents"] or []
+    metadatas = [meta or {} for meta in (data["metadatas"] or [])]
+    embeddings = np.asarray(data["embeddings"] if len(texts) else [], dtype=np.float32)
+    if embeddings.ndim != 2:
+        embeddings = embeddings.reshape(len(texts), -1)
+
+    encoded = [text.encode("utf-8") for text in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        offsets[1:] = np.cumsum([len(chunk) for chunk in encoded])
+
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, EMBEDDINGS_FILE), _normalise(embeddings).astype(np.float32))
+    np.save(os.path.join(directory, OFFSETS_FILE), offsets)
+    with open(os.path.join(directory, TEXTS_FILE), "wb") as f:
+        f.write(b"".join(encoded))
+    with open(os.path.join(directory, METADATAS_FILE), "w", encoding="utf-8") as f:
+        json.dump(metadatas, f)
+    with open(os.path.join(directory, IDS_FILE), "w", encoding="utf-8") as f:
+        json.dump(ids, f)
+
+    return len(texts)
+
+
+def ensure_export(snapshot_dir: str, open_store: Callable[[str], Any]) -> str:
+    """
+    Return the memory-mapped export of a snapshot, writing it on first use.
+
+    open_store(path) opens the snapshot's Chroma store. The first process to
+    get here exports it under a lock, into a temporary directory that is
+    renamed into place, so concurrent workers never map a partial export.
+    """
+    from snapshots import DERIVED_DIR, close_chroma, exclusive_lock
+
+    derived = os.path.join(snapshot_dir, DERIVED_DIR)
+    directory = os.path.join(derived, "mmap")
+    if os.path.isdir(directory):
+        return directory
+
+    os.makedirs(derived, exist_ok=True)
+    with exclusive_lock(os.path.join(derived, "mmap.lock")):
+        if os.path.isdir(directory):
+            return directory
+        staging = os.path.join(derived, f"mmap.{uuid.uuid4().hex[:8]}")
+        try:
+            export_index(open_store(snapshot_dir), staging)
+            os.rename(staging, directory)
+        finally:
+            close_chroma(snapshot_dir)
+            shutil.rmtree(staging, ignore_errors=True)
+    return directory
+
+
+class SharedIndex:
+    """
+    Brute-force cosine search over a memory-mapped export.
+
+    Exposes similarity_search() like a LangChain vector store so
+    search_documents() in server.py can use either backend.
+    """
+
+    def __init__(self, directory: str, embedding_function: Any):
+        self.directory = directory
+        self.embedding_function = embedding_function
+        self.embeddings = np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode="r")
+        self.offsets = np.load(os.path.join(directory, OFFSETS_FILE), mmap_mode="r")
+        texts_path = os.path.join(directory, TEXTS_FILE)
+        self.texts: Optional[np.memmap] = (
+            np.memmap(texts_path, dtype=np.uint8, mode="r") if os.path.getsize(texts_path) else None
+        )
+        with open(os.path.join(directory, METADATAS_FILE), encoding="utf-8") as f:
+            self.metadatas: List[dict] = json.load(f)
+        with open(os.path.join(directory, IDS_FILE), encoding="utf-8") as f:
+            self.rows_by_id: dict[str, int] = {id_: row for row, id_ in enumerate(json.load(f))}
+
+    def __len__(self) -> int:
+        return len(self.metadatas)
+
+    def text(self, row: int) -> str:
+        if self.texts is None:
+            return ""
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return bytes(self.texts[start:end]).decode("utf-8")
+
+    def document(self, row: int) -> Document:
+        return Document(page_content=self.text(row), metadata=dict(self.metadatas[row]))
+
+    def get_by_ids(self, ids: List[str]) -> List[Document]:
+        """Look chunks up by vector store id; unknown ids are skipped."""
+        return [self.document(self.rows_by_id[id_]) for id_ in ids if id_ in self.rows_by_id]
+
+    def search_by_vector(self, query_embedding: List[float], k: int) -> List[tuple[int, float]]:
+        """Return (row, cosine similarity) pairs for the k best rows."""
+        if len(self) == 0 or k <= 0:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+        scores = self.embeddings @ query
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(row), float(scores[row])) for row in top]
+
+    def similarity_search(self, query: str, k: int = 4) -> List[Document]:
+        query_embedding = self.embedding_function.embed_query(query)
+        return [self.document(row) for row, _ in self.search_by_vector(query_embedding, k)]
+
+    def warm(self):
+        """Fault the mapped pages into the page cache (shared by every worker)."""
+        if len(self):
+            float(np.asarray(self.embeddings).sum())
+        if self.texts is not None:
+            int(self.texts[::4096].sum())
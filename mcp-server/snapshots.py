@@ -0,0 +1,246 @@
+"""
+Versioned, immutable snapshots of the vector store.
+
+Rebuilding or appending to the live Chroma directory lets running readers
+see a half-written index. Instead every write produces a new directory and
+readers follow an atomically swapped pointer:
+
+    <root>/
+        CURRENT              name of the published version (os.replace'd)
+        writer.lock          held by the single writer (flock)
+        versions/
+            <version>/       one Chroma persist directory per version
+                COMPLETE     written last, before the version is published
+                LEASE        readers hold a shared flock while they use it
+                derived/     caches built from the version by readers (e.g.
+                             the memory-mapped export); never copied forward
+
+A writer takes writer.lock, builds the next version in a fresh directory
+(optionally seeded with a copy of the current one), publishes it by
+replacing CURRENT, then deletes every other version that no reader holds.
+Readers also collect after releasing a version, unless a writer is busy.
+Readers hold a shared lock on the version's LEASE file, which is released
+automatically if the process dies, so the garbage collector never removes a
+version that is still open in any process or container sharing the volume.
+
+On platforms without fcntl (Windows) locks are process-local and old
+versions are kept rather than collected.
+
+frontend/snapshots.py is a copy for the upload path; keep them in sync (benchmarks.copies checks).
+"""
+import contextlib
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+
+CURRENT_FILE = "CURRENT"
+WRITER_LOCK_FILE = "writer.lock"
+VERSIONS_DIR = "versions"
+COMPLETE_FILE = "COMPLETE"
+LEASE_FILE = "LEASE"
+DERIVED_DIR = "derived"
+
+# Files a pre-snapshot store kept directly in the root
+LEGACY_STORE_FILE = "chroma.sqlite3"
+
+# flock only excludes separate open files; this covers threads that share one
+_writer_thread_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def exclusive_lock(path: str, blocking: bool = True) -> Iterator[bool]:
+    """Hold an exclusive flock on path (created if missing); yields False if not blocking and already taken."""
+    with open(path, "a+") as handle:
+        if fcntl is not None:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+        yield True
+
+
+def close_chroma(persist_directory: str):
+    """Stop the cached Chroma client for persist_directory so its files are flushed and released."""
+    from chromadb.api.shared_system_client import SharedSystemClient
+
+    system = SharedSystemClient._identifier_to_system.pop(persist_directory, None)
+    if system is not None:
+        system.stop()
+
+
+class Lease:
+    """A reader's hold on one version; the version is not collected while held."""
+
+    def __init__(self, version: str, path: str, handle):
+        self.version = version
+        self.path = path
+        self._handle = handle
+
+    def release(self):
+        if self._handle is not None:
+            self._handle.close()  # closing the file drops the flock
+            self._handle = None
+
+    def __enter__(self) -> "Lease":
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class SnapshotStore:
+    """
+    Versioned snapshot directory rooted at root (see module docstring).
+
+    Args:
+        root: Shared store directory, e.g. ../vector_store
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.versions_dir = os.path.join(root, VERSIONS_DIR)
+
+    def version_path(self, version: str) -> str:
+        return os.path.join(self.versions_dir, version)
+
+    def current(self) -> Optional[str]:
+        """Name of the published version, or None before the first publish."""
+        try:
+            with open(os.path.join(self.root, CURRENT_FILE), encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def has_legacy_store(self) -> bool:
+        """True if the root still holds a pre-snapshot Chroma store."""
+        return os.path.exists(os.path.join(self.root, LEGACY_STORE_FILE))
+
+    def acquire(self, retries: int = 5) -> Optional[Lease]:
+        """
+        Lease the current version for reading.
+
+        Returns None if nothing has been published yet. Retries if the
+        version is collected between reading CURRENT and locking it.
+        """
+        for _ in range(retries):
+            version = self.current()
+            if version is None:
+                return None
+            path = self.version_path(version)
+            try:
+                handle = open(os.path.join(path, LEASE_FILE), "a+")
+            except FileNotFoundError:
+                continue
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_SH)
+            if os.path.exists(os.path.join(path, COMPLETE_FILE)):
+                return Lease(version, path, handle)
+            handle.close()
+        raise RuntimeError(f"Could not lease a vector store snapshot in {self.root}")
+
+    @contextlib.contextmanager
+    def write(self, copy_current: bool = True) -> Iterator[str]:
+        """
+        Build and publish a new version under the single-writer lock.
+
+        Yields the new version's directory. With copy_current it starts as a
+        copy of the current version (or of a legacy store in the root), so
+        the caller can append; otherwise it starts empty. The version is
+        published when the block exits normally and discarded if it raises.
+        Unused old versions are collected afterwards.
+        """
+        with self._writer_lock():
+            version = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+            path = self.version_path(version)
+            current = self.current()
+            if copy_current and current is not None:
+                shutil.copytree(self.version_path(current), path,
+                                ignore=shutil.ignore_patterns(LEASE_FILE, COMPLETE_FILE, DERIVED_DIR))
+            elif copy_current and self.has_legacy_store():
+                shutil.copytree(self.root, path, ignore=shutil.ignore_patterns(
+                    VERSIONS_DIR, CURRENT_FILE, WRITER_LOCK_FILE, f"{CURRENT_FILE}.*"))
+            else:
+                os.makedirs(path)
+
+            try:
+                yield path
+                self._publish(version)
+            except BaseException:
+                shutil.rmtree(path, ignore_errors=True)
+                raise
+            self._collect_garbage()
+
+    def collect_garbage(self, blocking: bool = True) -> List[str]:
+        """
+        Delete versions other than the current one that no reader holds; returns them.
+
+        Without blocking, collects nothing while a writer holds the lock (it
+        collects itself after publishing).
+        """
+        with self._writer_lock(blocking) as locked:
+            return self._collect_garbage() if locked else []
+
+    def _collect_garbage(self) -> List[str]:
+        # the writer lock is held, so no unpublished version is being built
+        if fcntl is None or not os.path.isdir(self.versions_dir):
+            return []
+        current = self.current()
+        removed = []
+        for version in sorted(os.listdir(self.versions_dir)):
+            if version == current:
+                continue
+            path = self.version_path(version)
+            try:
+                handle = open(os.path.join(path, LEASE_FILE), "a+")
+            except FileNotFoundError:
+                continue
+            with handle:
+                try:
+                    fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # still open in some reader
+                # readers that lock after this see no COMPLETE and re-read CURRENT
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(os.path.join(path, COMPLETE_FILE))
+                shutil.rmtree(path, ignore_errors=True)
+            removed.append(version)
+        if removed:
+            print(f"[INFO] Removed unused vector store versions: {', '.join(removed)}")
+        return removed
+
+    @contextlib.contextmanager
+    def _writer_lock(self, blocking: bool = True) -> Iterator[bool]:
+        os.makedirs(self.versions_dir, exist_ok=True)
+        if not _writer_thread_lock.acquire(blocking):
+            yield False
+            return
+        try:
+            with exclusive_lock(os.path.join(self.root, WRITER_LOCK_FILE), blocking) as locked:
+                yield locked
+        finally:
+            _writer_thread_lock.release()
+
+    def _publish(self, version: str):
+        path = self.version_path(version)
+        with open(os.path.join(path, COMPLETE_FILE), "w", encoding="utf-8") as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        pointer = os.path.join(self.root, CURRENT_FILE)
+        staging = f"{pointer}.{uuid.uuid4().hex[:8]}"
+        with open(staging, "w", encoding="utf-8") as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(staging, pointer)
+        print(f"[INFO] Published vector store version {version}")
@@ -1,6 +1,5 @@
 import httpx
-from bs4 import BeautifulSoup, Tag 
-from typing import List, Dict, Optional, Any
+from typing import Awaitable, Callable, Hashable, List, Dict, Optional, Any, TypeVar
 from dataclasses import dataclass
 import urllib.parse
 import sys
@@ -10,24 +9,10 @@ from datetime import datetime, timedelta
 import time
 import re
 
+from resilience import CircuitOpenError, Dependency, FallbackCache
 
-
-import os, glob
-from chromadb.config import Settings
-from dotenv import load_dotenv
-from langchain_community.document_loaders import TextLoader, DirectoryLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_chroma import Chroma
-from pydantic import SecretStr
-
-
-load_dotenv()
-
-gemini_api_key = os.getenv("GEMINI_API_KEY")
-if not gemini_api_key:
-    raise ValueError("GEMINI_API_KEY is not set")
-
+# BeautifulSoup is imported inside the methods that parse HTML so the server
+# does not pay for bs4 until the first web search. Ingestion lives in ingest.py.
 
 
 @dataclass
@@ -59,6 +44,68 @@ class RateLimiter:
         self.requests.append(now)
 
 
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into one in-flight task.
+
+    Every caller awaits the same task and gets its result or exception.
+    Cancelling one caller leaves the others waiting; the task itself is
+    cancelled only when every caller waiting on it has gone away.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, list] = {}  # key -> [task, waiters]
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        call = self._calls.get(key)
+        if call is None:
+            task = asyncio.ensure_future(fn())
+            call = self._calls[key] = [task, 0]
+            task.add_done_callback(lambda done, key=key: self._forget(key, done))
+
+        task = call[0]
+        call[1] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            call[1] -= 1
+            if call[1] == 0 and not task.done():
+                # nobody is waiting any more; later callers start afresh
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+                task.cancel()
+
+    def _forget(self, key: Hashable, task: asyncio.Future):
+        call = self._calls.get(key)
+        if call is not None and call[0] is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # retrieved by the waiters; avoid "exception never retrieved" if none are left
+            task.exception()
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive key for a search query."""
+    return " ".join(query.lower().split())
+
+
+def normalize_url(url: str) -> str:
+    """Key for a URL: lowercase scheme and host, no default port or fragment."""
+    parts = urllib.parse.urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    port = parts.port
+    if port and not ((scheme == "http" and port == 80) or (scheme == "https" and port == 443)):
+        host = f"{host}:{port}"
+    return urllib.parse.urlunsplit((scheme, host, parts.path or "/", parts.query, ""))
+
+
 class DuckDuckGoSearcher:
     BASE_URL = "https://html.duckduckgo.com/html"
     HEADERS = {
@@ -72,6 +119,10 @@ class DuckDuckGoSearcher:
 
     def __init__(self):
         self.rate_limiter = RateLimiter()
+        self.single_flight = SingleFlight()
+        # no hedging by default: duplicate POSTs make bot detection more likely
+        self.dependency = Dependency.from_env("duckduckgo", timeout=10.0)
+        self.cache = FallbackCache()
 
     def format_results_for_llm(self, results: List[SearchResult]) -> str:
         """Format results in a natural language style that's easier for LLMs to process"""
@@ -91,6 +142,17 @@ class DuckDuckGoSearcher:
 
     async def search(
         self, query: str, max_results: int = 10
+    ) -> List[SearchResult]:
+        """
+        Search DuckDuckGo. Concurrent identical searches share one request
+        (and one rate limiter slot).
+        """
+        key = (normalize_query(query), max_results)
+        results = await self.single_flight.do(key, lambda: self._search(query, max_results))
+        return list(results)
+
+    async def _search(
+        self, query: str, max_results: int = 10
     ) -> List[SearchResult]:
         try:
             # Apply rate limiting
@@ -106,19 +168,25 @@ class DuckDuckGoSearcher:
             print(f"Searching DuckDuckGo for: {query}")
             print(f"Using URL: {self.BASE_URL}")
 
-            async with httpx.AsyncClient() as client:
-                try:
-                    response = await client.post(
-                        self.BASE_URL, data=data, headers=self.HEADERS, timeout=30.0
-                    )
-                    response.raise_for_status()
-                    print(f"Request successful. Status code: {response.status_code}")
-                except httpx.ConnectError as e:
-                    print(f"Connection error: {e}")
-                    raise
-                except httpx.TimeoutException as e:
-                    print(f"Timeout error: {e}")
-                    raise
+            async def post() -> httpx.Response:
+                async with httpx.AsyncClient() as client:
+                    try:
+                        response = await client.post(
+                            self.BASE_URL, data=data, headers=self.HEADERS, timeout=self.dependency.timeout
+                        )
+                        response.raise_for_status()
+                        print(f"Request successful. Status code: {response.status_code}")
+                        return response
+                    except httpx.ConnectError as e:
+                        print(f"Connection error: {e}")
+                        raise
+                    except httpx.TimeoutException as e:
+                        print(f"Timeout error: {e}")
+                        raise
+
+            response = await self.dependency.call(post)
+
+            from bs4 import BeautifulSoup, Tag
 
             # Parse HTML response
             soup = BeautifulSoup(response.text, "html.parser")
@@ -173,41 +241,80 @@ class DuckDuckGoSearcher:
                     break
 
             print(f"Successfully found {len(results)} results")
+            self.cache.put((normalize_query(query), max_results), results)
             return results
 
-        except httpx.TimeoutException:
+        except CircuitOpenError as e:
+            print(f"Skipping search: {str(e)}")
+            return self._cached(query, max_results)
+        except (httpx.TimeoutException, asyncio.TimeoutError):
             print("Search request timed out")
-            return []
+            return self._cached(query, max_results)
         except httpx.HTTPError as e:
             print(f"HTTP error occurred: {str(e)}")
-            return []
+            return self._cached(query, max_results)
         except Exception as e:
             print(f"Unexpected error during search: {str(e)}")
             traceback.print_exc(file=sys.stderr)
-            return []
+            return self._cached(query, max_results)
+
+    def _cached(self, query: str, max_results: int) -> List[SearchResult]:
+        """Last good results for this query, or [] if there are none."""
+        results = self.cache.get((normalize_query(query), max_results))
+        if results:
+            print(f"Serving cached results for: {query}")
+        return list(results or [])
 
 
 class WebContentFetcher:
     def __init__(self):
         self.rate_limiter = RateLimiter(requests_per_minute=20)
+        self.single_flight = SingleFlight()
+        # one breaker per host, so a single dead site does not block the others
+        self.dependencies: Dict[str, Dependency] = {}
+        self.cache = FallbackCache()
+
+    def dependency_for(self, url: str) -> Dependency:
+        host = urllib.parse.urlsplit(url).hostname or ""
+        if host not in self.dependencies:
+            if len(self.dependencies) >= 1000:
+                self.dependencies.clear()
+            self.dependencies[host] = Dependency.from_env(
+                f"web_fetch:{host}", env_prefix="web_fetch", timeout=10.0, hedge=True
+            )
+        return self.dependencies[host]
 
     async def fetch_and_parse(self, url: str) -> str:
-        """Fetch and parse content from a webpage"""
+        """
+        Fetch and parse content from a webpage. Concurrent fetches of the same
+        URL share one request.
+        """
+        return await self.single_flight.do(normalize_url(url), lambda: self._fetch_and_parse(url))
+
+    async def _fetch_and_parse(self, url: str) -> str:
         try:
             await self.rate_limiter.acquire()
 
             print(f"Fetching content from: {url}")
 
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    url,
-                    headers={
-                        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-                    },
-                    follow_redirects=True,
-                    timeout=30.0,
-                )
-                response.raise_for_status()
+            dependency = self.dependency_for(url)
+
+            async def get() -> httpx.Response:
+                async with httpx.AsyncClient() as client:
+                    response = await client.get(
+                        url,
+                        headers={
+                            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+                        },
+                        follow_redirects=True,
+                        timeout=dependency.timeout,
+                    )
+                    response.raise_for_status()
+                    return response
+
+            response = await dependency.call(get)
+
+            from bs4 import BeautifulSoup
 
             # Parse the HTML
             soup = BeautifulSoup(response.text, "html.parser")
@@ -232,17 +339,28 @@ class WebContentFetcher:
                 text = text[:6000] + "... [content truncated]"
 
             print(f"Successfully fetched and parsed content ({len(text)} characters)")
+            self.cache.put(normalize_url(url), text)
             return text
 
-        except httpx.TimeoutException:
+        except CircuitOpenError as e:
+            print(f"Skipping fetch of {url}: {str(e)}")
+            return self._cached(url) or "Error: The webpage's server is currently unavailable."
+        except (httpx.TimeoutException, asyncio.TimeoutError):
             print(f"Request timed out for URL: {url}")
-            return "Error: The request timed out while trying to fetch the webpage."
+            return self._cached(url) or "Error: The request timed out while trying to fetch the webpage."
         except httpx.HTTPError as e:
             print(f"HTTP error occurred while fetching {url}: {str(e)}")
-            return f"Error: Could not access the webpage ({str(e)})"
+            return self._cached(url) or f"Error: Could not access the webpage ({str(e)})"
         except Exception as e:
             print(f"Error fetching content from {url}: {str(e)}")
-            return f"Error: An unexpected error occurred while fetching the webpage ({str(e)})"
+            return self._cached(url) or f"Error: An unexpected error occurred while fetching the webpage ({str(e)})"
+
+    def _cached(self, url: str) -> Optional[str]:
+        """Last good parsed text for this URL, if any."""
+        text = self.cache.get(normalize_url(url))
+        if text:
+            print(f"Serving cached content for: {url}")
+        return text
         
         
         
@@ -277,47 +395,3 @@ async def fetch_content(url: str) -> str:
         url: The webpage URL to fetch content from
     """
     return await fetcher.fetch_and_parse(url)
-
-
-
-
-def build_vector_store(input_dir: str = "knowledge-base/"):
-    # load docs
-    documents = []
-    folders = glob.glob(input_dir)
-    for folder in folders:
-        docs_loader = DirectoryLoader(folder, glob="**/*.txt", loader_cls=TextLoader, loader_kwargs={"encoding": "utf-8"})
-        docs_folder = docs_loader.load()
-        for doc in docs_folder:
-            file_name = os.path.basename(doc.metadata["source"])
-            doc.metadata["page_title"] = os.path.splitext(file_name)[0]
-            documents.append(doc)
-
-    print(f"[INFO] Loaded {len(documents)} documents")
-
-    # split
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=900, chunk_overlap=100)
-    chunks = text_splitter.split_documents(documents)
-
-    embeddings = GoogleGenerativeAIEmbeddings(
-        model="models/gemini-embedding-001",
-        google_api_key=gemini_api_key
-    )
-
-    ds_name = os.path.join("..", "shared_data", "vector_store")
-    
-    # Create the shared_data directory if it doesn't exist
-    os.makedirs(os.path.dirname(ds_name), exist_ok=True)
-    
-    if os.path.exists(ds_name):
-        import shutil
-        shutil.rmtree(ds_name)
-        print(f"[INFO] Removed old vector store at {ds_name}")
-
-    vector_store = Chroma.from_documents(
-        documents=chunks,
-        embedding=embeddings,
-        persist_directory=ds_name,
-        client_settings=Settings(anonymized_telemetry=False)
-    )
-    print(f"Vector store created with {vector_store._collection.count()} chunks")